@@ -0,0 +1,177 @@
+"""
+Nearest-neighbour index selection (FAISS) for embedding artifacts.
+
+Picks Flat, IVF-Flat, HNSW or IVF-PQ from the vector count and a
+latency/recall target, trains it, and configures its search parameters.
+All indexes use inner product on L2-normalized vectors (= cosine).
+
+| vectors         | recall   | balanced | latency |
+|-----------------|----------|----------|---------|
+| < flat max      | Flat     | Flat     | Flat    |
+| < 1M            | HNSW     | HNSW     | HNSW    |
+| < 5M            | IVF-Flat | IVF-Flat | IVF-PQ  |
+| larger          | IVF-Flat | IVF-PQ   | IVF-PQ  |
+
+HNSW cannot delete vectors, so indexes that need remove_ids (fact-checks)
+use IVF instead. Flat indexes are memory-mapped when read back; trained
+indexes are persisted with their training and loaded into memory.
+
+Environment variables:
+- ANN_TARGET: recall | balanced | latency (default balanced)
+- ANN_FLAT_MAX_VECTORS: brute force up to this many vectors (default 20000)
+- ANN_NPROBE, ANN_EF_SEARCH: override the per-target search parameters
+"""
+import math
+import os
+from typing import Optional
+
+import numpy as np
+import faiss
+
+
+ANN_TARGET = os.getenv("ANN_TARGET", "balanced")
+FLAT_MAX_VECTORS = int(os.getenv("ANN_FLAT_MAX_VECTORS", "20000"))
+
+INDEX_KINDS = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+# Search-time parameters per target: share of IVF lists probed, HNSW efSearch
+SEARCH_PARAMS = {
+    "recall": {"nprobe_fraction": 1 / 4, "ef_search": 128},
+    "balanced": {"nprobe_fraction": 1 / 8, "ef_search": 64},
+    "latency": {"nprobe_fraction": 1 / 32, "ef_search": 32},
+}
+
+HNSW_M = 32
+PQ_BITS = 8
+MAX_TRAINING_VECTORS = 200_000
+
+# Smallest corpora that can be trained (FAISS wants >= 39 points per centroid)
+MIN_IVF_VECTORS = 39 * 16
+MIN_PQ_VECTORS = 39 * (1 << PQ_BITS)
+
+
+def choose_index_kind(n_vectors: int, target: str = ANN_TARGET, removable: bool = False) -> str:
+    """
+    Choose an index type for a corpus.
+
+    Args:
+        n_vectors: Number of vectors to index
+        target: "recall", "balanced" or "latency"
+        removable: The index must support remove_ids (excludes HNSW)
+
+    Returns:
+        One of INDEX_KINDS
+    """
+    if n_vectors < FLAT_MAX_VECTORS:
+        return "flat"
+    if n_vectors < 1_000_000 and not removable:
+        return "hnsw"
+    if n_vectors < MIN_IVF_VECTORS:
+        return "flat"
+    if target == "recall" or n_vectors < MIN_PQ_VECTORS:
+        return "ivf_flat"
+    if target == "latency" or n_vectors >= 5_000_000:
+        return "ivf_pq"
+    return "ivf_flat"
+
+
+def nlist_for(n_vectors: int) -> int:
+    """Number of IVF lists: ~4·sqrt(n), with at least 39 training points per list."""
+    nlist = int(4 * math.sqrt(n_vectors))
+    return max(1, min(nlist, n_vectors // 39, 65536))
+
+
+def pq_subquantizers(dim: int) -> int:
+    """Largest divisor of dim giving sub-vectors of at least 8 dimensions."""
+    for m in range(dim // 8, 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def build_index(vectors: np.ndarray, kind: str = "flat", dtype: str = "float32", ids: Optional[np.ndarray] = None):
+    """
+    Build (and train if needed) an inner-product index over normalized vectors.
+
+    Args:
+        vectors: (n, dim) L2-normalized vectors
+        kind: One of INDEX_KINDS ("auto" picks with choose_index_kind)
+        dtype: "float16" stores flat vectors as fp16
+        ids: Optional int64 ids (default: row numbers)
+
+    Returns:
+        FAISS index, configured for ANN_TARGET
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n, dim = vectors.shape
+    if kind == "auto":
+        kind = choose_index_kind(n, removable=ids is not None)
+
+    # Too few vectors to train (IVF needs 39/list, PQ 2^bits per codebook)
+    if kind in ("ivf_flat", "ivf_pq") and n < MIN_IVF_VECTORS:
+        kind = "flat"
+    if kind == "ivf_pq" and n < MIN_PQ_VECTORS:
+        kind = "ivf_flat"
+
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = 80
+    elif kind in ("ivf_flat", "ivf_pq"):
+        nlist = nlist_for(n)
+        quantizer = faiss.IndexFlatIP(dim)
+        if kind == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_subquantizers(dim), PQ_BITS, faiss.METRIC_INNER_PRODUCT)
+        training = vectors
+        if n > MAX_TRAINING_VECTORS:
+            rng = np.random.default_rng(0)
+            training = vectors[rng.choice(n, MAX_TRAINING_VECTORS, replace=False)]
+        index.train(training)
+    elif dtype == "float16":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+    else:
+        index = faiss.IndexFlatIP(dim)
+
+    if ids is not None:
+        if kind in ("ivf_flat", "ivf_pq"):
+            index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+        else:
+            index = faiss.IndexIDMap2(index)
+            index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+    else:
+        index.add(vectors)
+
+    configure_index(index)
+    return index
+
+
+def index_kind(index) -> str:
+    """Kind of a (possibly IDMap-wrapped) index."""
+    base = faiss.downcast_index(index.index) if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) else index
+    if isinstance(base, faiss.IndexHNSWFlat):
+        return "hnsw"
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(base, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def configure_index(index, target: str = ANN_TARGET):
+    """Set nprobe / efSearch for the latency/recall target (env overrides win)."""
+    params = SEARCH_PARAMS.get(target, SEARCH_PARAMS["balanced"])
+    base = faiss.downcast_index(index.index) if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) else index
+    if isinstance(base, faiss.IndexIVF):
+        nprobe = int(os.getenv("ANN_NPROBE", "0")) or max(8, int(base.nlist * params["nprobe_fraction"]))
+        base.nprobe = min(nprobe, base.nlist)
+    elif isinstance(base, faiss.IndexHNSWFlat):
+        base.hnsw.efSearch = int(os.getenv("ANN_EF_SEARCH", "0")) or params["ef_search"]
+
+
+def read_index(path, kind: str = "flat"):
+    """Read a persisted index: flat ones memory-mapped read-only, trained ones in memory."""
+    flags = (faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY) if kind == "flat" else 0
+    index = faiss.read_index(str(path), flags)
+    configure_index(index)
+    return index
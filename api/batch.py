@@ -0,0 +1,667 @@
+"""
+Batch analysis jobs (POST /analyze/batch).
+
+Input is JSONL/NDJSON, one record per line:
+    {"id": "post-1", "text": "...", "language": "fr", "platform": "twitter"}
+(a bare JSON string is taken as the text; id defaults to the record number).
+
+Records are processed in chunks of BATCH_CHUNK_SIZE:
+- embedding retrieval for the whole chunk in one vectorized encoder + FAISS
+  call (DIMADetector.find_similar_techniques_batch)
+- LLM analysis with one of two backends:
+  - online: BATCH_CONCURRENCY threads calling the model gateway, whose
+    concurrency cap and RPM/TPM buckets set the pace
+  - openai_batch: the chunk is submitted to the OpenAI Batch API (half
+    price, results within 24h) and polled; long texts (map-reduce) still go
+    through the online path
+Results are appended to output.jsonl as they complete, one line per record:
+    {"index": 0, "id": "post-1", "status": "ok", "analysis": {...}, "llm_usage": {...}}
+    {"index": 1, "id": "post-2", "status": "error", "error": "..."}
+checkpoint.json (job state, next chunk, output offset) is rewritten after
+every chunk. A job stopped by a restart or a model outage is continued with
+POST /analyze/batch/{job_id}/resume: processing restarts at the checkpoint
+and skips the records already in the output (a pending Batch API submission
+is polled again rather than resubmitted).
+
+With several server workers, the worker processing a job holds an flock on
+run.lock in the job directory (released by the OS if the process dies).
+Other workers read the job status from the checkpoint on every request; a
+"queued"/"running" checkpoint is reported as "interrupted" only when no
+process holds the lock, and a resume is refused while one does.
+
+Environment variables:
+- BATCH_ENABLED: enable the batch endpoints (default false; they also
+  require the x-admin-token header, see ADMIN_TOKEN in main.py)
+- BATCH_DIR: job directory (default <tmp>/infoverif-batch)
+- BATCH_CHUNK_SIZE: records per chunk / per Batch API submission (default 256)
+- BATCH_CONCURRENCY: online worker threads (default half of LLM_MAX_CONCURRENCY,
+  leaving gateway slots to interactive requests)
+- BATCH_MAX_RECORDS: max records per job (default 100000)
+- BATCH_MAX_INPUT_MB: max size of a job's JSONL input (default 256; larger
+  uploads are rejected with 413)
+- BATCH_MAX_RUNNING: jobs processed at the same time (default 1)
+- BATCH_POLL_INTERVAL: Batch API polling interval in seconds (default 30)
+- BATCH_PRICE_FACTOR: Batch API price relative to online calls (default 0.5)
+"""
+import contextvars
+import fcntl
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional
+
+import deep
+from llm_gateway import DEFAULT_MODEL, BudgetExceededError, ModelUnavailableError, get_gateway
+from metrics import stage
+from token_budget import get_request_usage, record_usage, start_request_usage
+from tracing import get_logger, set_request_id
+
+
+BATCH_ENABLED = os.getenv("BATCH_ENABLED", "false").lower() == "true"
+BATCH_DIR = os.getenv("BATCH_DIR", os.path.join(tempfile.gettempdir(), "infoverif-batch"))
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "256"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", str(max(1, int(os.getenv("LLM_MAX_CONCURRENCY", "8")) // 2))))
+BATCH_MAX_RECORDS = int(os.getenv("BATCH_MAX_RECORDS", "100000"))
+BATCH_MAX_INPUT_BYTES = int(os.getenv("BATCH_MAX_INPUT_MB", "256")) * 1024 * 1024
+BATCH_MAX_RUNNING = int(os.getenv("BATCH_MAX_RUNNING", "1"))
+BATCH_POLL_INTERVAL = float(os.getenv("BATCH_POLL_INTERVAL", "30"))
+BATCH_PRICE_FACTOR = float(os.getenv("BATCH_PRICE_FACTOR", "0.5"))
+
+BACKENDS = ("online", "openai_batch")
+LANGUAGES = ("fr", "en")
+
+# OpenAI batch statuses after which polling stops
+_TERMINAL_BATCH_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+_JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+logger = get_logger("batch")
+
+
+class BatchJob:
+    """One batch job: input/output files and progress (persisted in checkpoint.json)."""
+
+    _FIELDS = (
+        "job_id", "backend", "language", "platform", "status", "total", "processed", "succeeded",
+        "failed", "degraded", "next_index", "chunk_offset", "output_offset", "pending_batch_id", "usage",
+        "created_at", "started_at", "finished_at", "error",
+    )
+
+    def __init__(self, job_id: str, backend: str = "online", language: str = "fr", platform: str = "text"):
+        self.job_id = job_id
+        self.backend = backend
+        self.language = language
+        self.platform = platform
+        self.status = "created"
+        self.total = 0
+        self.processed = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.degraded = 0
+        self.next_index = 0  # First record of the current chunk (all earlier records are in the output)
+        self.chunk_offset = 0  # Output size when the current chunk started
+        self.output_offset = 0  # Output size covered by the counters
+        self.pending_batch_id: Optional[str] = None
+        self.usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self._run_processed = 0  # Records written by the current run (throughput)
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self) -> str:
+        return os.path.join(BATCH_DIR, self.job_id)
+
+    @property
+    def input_path(self) -> str:
+        return os.path.join(self.directory, "input.jsonl")
+
+    @property
+    def output_path(self) -> str:
+        return os.path.join(self.directory, "output.jsonl")
+
+    @property
+    def checkpoint_path(self) -> str:
+        return os.path.join(self.directory, "checkpoint.json")
+
+    @property
+    def run_lock_path(self) -> str:
+        return os.path.join(self.directory, "run.lock")
+
+    def to_dict(self) -> Dict:
+        """Public job status."""
+        with self._lock:
+            data = {field: getattr(self, field) for field in self._FIELDS}
+            data["usage"] = dict(self.usage, cost_usd=round(self.usage["cost_usd"], 6))
+        data["progress"] = round(self.processed / self.total, 4) if self.total else 0.0
+        if self.status == "running" and self.started_at:
+            elapsed = time.time() - self.started_at
+            data["records_per_second"] = round(self._run_processed / elapsed, 2) if elapsed > 0 else 0.0
+        return data
+
+    def save(self):
+        """Write the checkpoint atomically."""
+        data = self.to_dict()
+        temp_path = self.checkpoint_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({field: data[field] for field in self._FIELDS}, f)
+        os.replace(temp_path, self.checkpoint_path)
+
+    @classmethod
+    def load(cls, job_id: str) -> Optional["BatchJob"]:
+        """Load a job from its checkpoint (None if unknown)."""
+        path = os.path.join(BATCH_DIR, job_id, "checkpoint.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        job = cls(job_id)
+        job._apply(data)
+        return job
+
+    def reload(self) -> bool:
+        """Refresh the fields from the checkpoint (False if it cannot be read)."""
+        current = BatchJob.load(self.job_id)
+        if current is None:
+            return False
+        self._apply({field: getattr(current, field) for field in self._FIELDS})
+        return True
+
+    def _apply(self, data: Dict):
+        for field in self._FIELDS:
+            if field in data:
+                setattr(self, field, data[field])
+
+    def add_usage(self, usage: Optional[Dict]):
+        if not usage:
+            return
+        with self._lock:
+            for key in self.usage:
+                self.usage[key] += usage.get(key, 0)
+
+
+# Jobs owned by this process: the threads processing them and their run locks
+_jobs: Dict[str, BatchJob] = {}
+_threads: Dict[str, threading.Thread] = {}
+_run_locks: Dict[str, object] = {}
+_jobs_lock = threading.Lock()
+_run_slots = threading.BoundedSemaphore(max(1, BATCH_MAX_RUNNING))
+
+
+def create_job(backend: str = "online", language: str = "fr", platform: str = "text") -> BatchJob:
+    """
+    Create an empty job (the caller writes job.input_path, then calls prepare_input and start_job).
+
+    Raises:
+        ValueError: Unknown backend
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}' (expected one of {', '.join(BACKENDS)})")
+    job = BatchJob(uuid.uuid4().hex, backend, language if language in LANGUAGES else "fr", platform or "text")
+    os.makedirs(job.directory, exist_ok=True)
+    job.save()
+    return job
+
+
+def prepare_input(job: BatchJob) -> int:
+    """
+    Count the input records (non-empty lines) and store the total.
+
+    Raises:
+        ValueError: Empty input or more than BATCH_MAX_RECORDS records
+    """
+    total = 0
+    with open(job.input_path, "rb") as f:
+        for line in f:
+            if line.strip():
+                total += 1
+    if total == 0:
+        raise ValueError("Empty batch: expected one JSON record per line")
+    if total > BATCH_MAX_RECORDS:
+        raise ValueError(f"Too many records: {total} (max {BATCH_MAX_RECORDS})")
+    job.total = total
+    job.save()
+    return total
+
+
+def discard_job(job: BatchJob):
+    """Remove a job that was never started (invalid input)."""
+    with _jobs_lock:
+        _jobs.pop(job.job_id, None)
+    for path in (job.input_path, job.output_path, job.checkpoint_path, job.run_lock_path):
+        if os.path.exists(path):
+            os.remove(path)
+    try:
+        os.rmdir(job.directory)
+    except OSError:
+        pass
+
+
+def _acquire_run_lock(job: BatchJob) -> bool:
+    """Take the job's run lock for this process (False if another process holds it); call under _jobs_lock."""
+    lock_file = open(job.run_lock_path, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return False
+    _run_locks[job.job_id] = lock_file
+    return True
+
+
+def _release_run_lock(job_id: str):
+    with _jobs_lock:
+        lock_file = _run_locks.pop(job_id, None)
+        _jobs.pop(job_id, None)
+        _threads.pop(job_id, None)
+    if lock_file is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+
+def _locked_by_other_process(job: BatchJob) -> bool:
+    """Whether a live process (another server worker) holds the job's run lock."""
+    try:
+        lock_file = open(job.run_lock_path, "a")
+    except OSError:
+        return False
+    with lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return False
+
+
+def get_job(job_id: str) -> Optional[BatchJob]:
+    """
+    Job by ID: the live object when this process owns it, else a fresh read
+    of its checkpoint (possibly written by another worker).
+    """
+    if not _JOB_ID_RE.match(job_id or ""):
+        return None
+    with _jobs_lock:
+        if job_id in _run_locks:
+            return _jobs[job_id]
+    job = BatchJob.load(job_id)
+    if job is None:
+        return None
+    if job.status in ("queued", "running") and not _locked_by_other_process(job):
+        job.status = "interrupted"  # Checkpointed by a process that is gone
+    return job
+
+
+def is_running(job_id: str) -> bool:
+    with _jobs_lock:
+        thread = _threads.get(job_id)
+    return thread is not None and thread.is_alive()
+
+
+def start_job(job: BatchJob):
+    """
+    Process a job in a background thread (waits for a free slot when BATCH_MAX_RUNNING jobs run).
+
+    Raises:
+        ValueError: The job is already being processed (here or by another worker) or is complete
+    """
+    with _jobs_lock:
+        if job.job_id in _run_locks:
+            raise ValueError("Job is already running")
+        if not _acquire_run_lock(job):
+            raise ValueError("Job is already running in another worker")
+    # The checkpoint may have moved since the job was read (another worker ran it meanwhile)
+    if not job.reload():
+        _release_run_lock(job.job_id)
+        raise ValueError("Job checkpoint is missing or unreadable")
+    if job.status == "completed":
+        _release_run_lock(job.job_id)
+        raise ValueError("Job is already complete")
+    job.status = "queued"
+    job.error = None
+    job.save()
+    thread = threading.Thread(target=_run, args=(job,), name=f"batch-{job.job_id[:8]}", daemon=True)
+    with _jobs_lock:
+        _jobs[job.job_id] = job
+        _threads[job.job_id] = thread
+    thread.start()
+
+
+def _run(job: BatchJob):
+    """Job thread: process remaining chunks, then record the final status."""
+    with _run_slots:
+        set_request_id(f"batch-{job.job_id[:12]}")
+        job.status = "running"
+        job.started_at = time.time()
+        job.finished_at = None
+        job._run_processed = 0
+        job.save()
+        logger.info("📦 Batch job started", job_id=job.job_id, backend=job.backend, total=job.total, resume_at=job.next_index)
+        try:
+            _process(job)
+            job.status = "completed"
+        except ModelUnavailableError as e:
+            job.status = "failed"
+            job.error = f"Model unavailable, resume the job later: {e}"
+        except Exception as e:
+            job.status = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+        finally:
+            job.finished_at = time.time()
+            job.save()
+            _release_run_lock(job.job_id)
+            logger.info(
+                "📦 Batch job finished", job_id=job.job_id, status=job.status, processed=job.processed,
+                failed=job.failed, error=job.error
+            )
+
+
+# ---------------------------------------------------------------------------
+# Processing
+# ---------------------------------------------------------------------------
+
+def _process(job: BatchJob):
+    done = _recover_output(job)
+    with open(job.output_path, "ab") as output:
+        try:
+            for chunk in _read_chunks(job, BATCH_CHUNK_SIZE):
+                pending = [record for record in chunk if record["index"] not in done]
+                if pending:
+                    _process_chunk(job, pending, output)
+                job.next_index = chunk[-1]["index"] + 1
+                job.chunk_offset = job.output_offset = output.tell()
+                job.pending_batch_id = None
+                job.save()
+        finally:
+            job.output_offset = output.tell()  # Every line written so far is counted
+
+
+def _recover_output(job: BatchJob) -> set:
+    """
+    Indices of the current chunk's records already in the output (skipped on resume).
+
+    Lines past output_offset (process killed mid-chunk) are added to the
+    counters; a partial last line is truncated.
+    """
+    done = set()
+    if not os.path.exists(job.output_path):
+        return done
+    with open(job.output_path, "rb+") as f:
+        f.seek(min(job.chunk_offset, os.path.getsize(job.output_path)))
+        start = f.tell()
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(start + end)
+    position = start
+    for line in data[:end].splitlines(keepends=True):
+        counted = position < job.output_offset
+        position += len(line)
+        try:
+            result = json.loads(line)
+        except ValueError:
+            continue
+        done.add(result.get("index"))
+        if not counted:
+            _count_result(job, result, this_run=False)
+            job.add_usage(result.get("llm_usage"))
+    job.output_offset = start + end
+    return done
+
+
+def _parse_record(line: str, index: int, job: BatchJob) -> Dict:
+    """Input line → record (or a record with 'error' for invalid lines)."""
+    try:
+        value = json.loads(line)
+    except ValueError as e:
+        return {"index": index, "id": index, "error": f"Invalid JSON: {e}"}
+    if isinstance(value, str):
+        value = {"text": value}
+    if not isinstance(value, dict):
+        return {"index": index, "id": index, "error": "Expected a JSON object or string"}
+    record_id = value.get("id", index)
+    text = value.get("text")
+    if not isinstance(text, str) or not text.strip():
+        return {"index": index, "id": record_id, "error": "Missing or empty 'text'"}
+    language = value.get("language")
+    return {
+        "index": index,
+        "id": record_id,
+        "text": text,
+        "language": language if language in LANGUAGES else job.language,
+        "platform": value.get("platform") or job.platform,
+    }
+
+
+def _read_chunks(job: BatchJob, size: int) -> Iterator[List[Dict]]:
+    """Records from job.next_index on, in chunks of `size`."""
+    chunk: List[Dict] = []
+    index = 0
+    with open(job.input_path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if index >= job.next_index:
+                chunk.append(_parse_record(line, index, job))
+                if len(chunk) >= size:
+                    yield chunk
+                    chunk = []
+            index += 1
+    if chunk:
+        yield chunk
+
+
+def _count_result(job: BatchJob, result: Dict, this_run: bool = True):
+    with job._lock:
+        job.processed += 1
+        job._run_processed += int(this_run)
+        if result.get("status") == "ok":
+            job.succeeded += 1
+            if (result.get("analysis") or {}).get("output_mode") == "embedding_only":
+                job.degraded += 1
+        else:
+            job.failed += 1
+
+
+def _write_result(job: BatchJob, output, result: Dict):
+    """Append one result line (flushed, so it survives a crash) and update the counters."""
+    data = (json.dumps(result, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+    with job._lock:
+        output.write(data)
+        output.flush()
+    _count_result(job, result)
+    job.add_usage(result.get("llm_usage"))
+
+
+def _process_chunk(job: BatchJob, records: List[Dict], output):
+    for record in records:
+        if "error" in record:
+            _write_result(job, output, {"index": record["index"], "id": record["id"], "status": "error", "error": record["error"]})
+    valid = [record for record in records if "error" not in record]
+    if not valid:
+        return
+    hints = _retrieve_hints([record["text"] for record in valid])
+    if job.backend == "openai_batch":
+        _analyze_offline(job, valid, hints, output)
+    else:
+        _analyze_online(job, valid, hints, output)
+
+
+def _retrieve_hints(texts: List[str]) -> List[Optional[List[Dict]]]:
+    """
+    Embedding hints for all texts in one vectorized call.
+
+    None entries (DIMA/embeddings unavailable, search failure) let the
+    analysis run its own search or go without hints.
+    """
+    if not deep.DIMA_ENABLED:
+        return [None] * len(texts)
+    detector = deep.get_detector()
+    if not detector.is_embeddings_enabled():
+        return [None] * len(texts)
+    try:
+        with stage("embedding_search", records=len(texts)) as span:
+            results = detector.find_similar_techniques_batch(
+                [text[:deep.EMBEDDING_QUERY_CHARS] for text in texts],
+                top_k=deep.EMBEDDINGS_TOP_K,
+                min_similarity=deep.EMBEDDINGS_MIN_SIMILARITY
+            )
+            span.set(hints=sum(len(result) for result in results))
+        return results
+    except Exception as e:
+        logger.warning("⚠️  Batch embedding search failed, falling back to per-record search", error=str(e))
+        return [None] * len(texts)
+
+
+def _analyze_record(record: Dict, hints: Optional[List[Dict]]) -> Dict:
+    """Analyze one record online (runs in its own usage context, so request budgets apply per record)."""
+    start_request_usage()
+    analysis = deep.analyze_text(
+        record["text"], record["platform"], language=record["language"],
+        similar_techniques=hints, allow_fallback=False
+    )
+    return {"index": record["index"], "id": record["id"], "status": "ok", "analysis": analysis, "llm_usage": get_request_usage()}
+
+
+def _analyze_online(job: BatchJob, records: List[Dict], hints: List[Optional[List[Dict]]], output):
+    """
+    Analyze records through the model gateway on BATCH_CONCURRENCY threads.
+
+    A model outage stops the chunk: records not written yet are retried when
+    the job is resumed.
+    """
+    outage: Optional[Exception] = None
+    with ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix="batch-worker") as pool:
+        futures = {
+            pool.submit(contextvars.copy_context().run, _analyze_record, record, record_hints): record
+            for record, record_hints in zip(records, hints)
+        }
+        for future in as_completed(futures):
+            record = futures[future]
+            if future.cancelled():
+                continue  # Stopped by an outage: not written, so retried on resume
+            try:
+                result = future.result()
+            except BudgetExceededError as e:
+                result = {"index": record["index"], "id": record["id"], "status": "error", "error": str(e)}
+            except ModelUnavailableError as e:
+                if outage is None:
+                    outage = e
+                    for pending in futures:
+                        pending.cancel()
+                continue
+            except Exception as e:
+                result = {"index": record["index"], "id": record["id"], "status": "error", "error": f"{type(e).__name__}: {e}"}
+            _write_result(job, output, result)
+    if outage is not None:
+        raise outage
+
+
+def _analyze_offline(job: BatchJob, records: List[Dict], hints: List[Optional[List[Dict]]], output):
+    """Analyze records with one OpenAI Batch API submission (long texts go online)."""
+    online = [
+        (record, record_hints) for record, record_hints in zip(records, hints)
+        if deep.MAPREDUCE_ENABLED and len(record["text"]) > deep.MAX_CONTENT_CHARS
+    ]
+    if online:
+        _analyze_online(job, [record for record, _ in online], [record_hints for _, record_hints in online], output)
+    online_indices = {record["index"] for record, _ in online}
+
+    prepared: Dict[str, tuple] = {}
+    requests = []
+    for record, record_hints in zip(records, hints):
+        if record["index"] in online_indices:
+            continue
+        metadata = deep.text_metadata(record["text"], record["platform"])
+        analysis_request = deep.prepare_analysis(record["text"], metadata, language=record["language"], similar_techniques=record_hints)
+        custom_id = str(record["index"])
+        prepared[custom_id] = (record, metadata, analysis_request)
+        requests.append({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": DEFAULT_MODEL,
+                "messages": analysis_request["messages"],
+                "response_format": analysis_request["response_format"],
+                "temperature": 0,
+            },
+        })
+    if not requests:
+        return
+
+    results = _run_openai_batch(job, requests)
+    for custom_id, (record, metadata, analysis_request) in prepared.items():
+        result = {"index": record["index"], "id": record["id"]}
+        outcome = results.get(custom_id)
+        if outcome is None or "error" in outcome:
+            result.update(status="error", error=(outcome or {}).get("error", "Missing from the batch output"))
+        else:
+            body = outcome["body"]
+            model = body.get("model") or DEFAULT_MODEL
+            usage = body.get("usage") or {}
+            cost = record_usage("batch", model, usage, price_factor=BATCH_PRICE_FACTOR)
+            try:
+                analysis = deep.finalize_analysis(analysis_request, body["choices"][0]["message"]["content"], model)
+                deep.attach_text_input(analysis, metadata, record["text"])
+                result.update(status="ok", analysis=analysis)
+            except Exception as e:
+                result.update(status="error", error=f"{type(e).__name__}: {e}")
+            result["llm_usage"] = {
+                "calls": 1,
+                "prompt_tokens": int(usage.get("prompt_tokens", 0)),
+                "completion_tokens": int(usage.get("completion_tokens", 0)),
+                "cost_usd": round(cost, 6),
+            }
+        _write_result(job, output, result)
+
+
+def _run_openai_batch(job: BatchJob, requests: List[Dict]) -> Dict[str, Dict]:
+    """
+    Submit (or re-attach to) the chunk's OpenAI batch, wait for it, and collect results.
+
+    Returns:
+        custom_id → {"body": chat completion} or {"error": message}
+    """
+    gateway = get_gateway()
+    batch_id = job.pending_batch_id
+    if batch_id is None:
+        batch = gateway.submit_batch(requests, metadata={"job_id": job.job_id, "first_index": requests[0]["custom_id"]})
+        batch_id = job.pending_batch_id = batch["id"]
+        job.save()
+        logger.info("📤 Submitted OpenAI batch", job_id=job.job_id, batch_id=batch_id, requests=len(requests))
+    else:
+        batch = gateway.get_batch(batch_id)
+        logger.info("🔁 Re-attached to OpenAI batch", job_id=job.job_id, batch_id=batch_id, status=batch.get("status"))
+
+    while batch.get("status") not in _TERMINAL_BATCH_STATUSES:
+        time.sleep(BATCH_POLL_INTERVAL)
+        batch = gateway.get_batch(batch_id)
+    if batch["status"] != "completed":
+        job.pending_batch_id = None  # Resubmitted on resume
+        raise RuntimeError(f"OpenAI batch {batch_id} ended with status '{batch['status']}'")
+
+    results: Dict[str, Dict] = {}
+    for file_id in (batch.get("output_file_id"), batch.get("error_file_id")):
+        if not file_id:
+            continue
+        for line in gateway.get_file_content(file_id).splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            response = item.get("response") or {}
+            if response.get("status_code") == 200:
+                results[item["custom_id"]] = {"body": response.get("body") or {}}
+            else:
+                error = item.get("error") or (response.get("body") or {}).get("error") or {}
+                results[item["custom_id"]] = {"error": error.get("message", "Batch request failed")}
+    return results
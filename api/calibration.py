@@ -0,0 +1,223 @@
+"""
+Per-technique similarity calibration (thresholds.json next to the embedding artifact).
+
+Raw cosine similarities are not comparable across techniques: some technique
+vectors score high on nearly any text. Calibration measures each technique's
+score distribution on a background corpus (mean/std) and picks, from the
+annotated examples, the z-score cutoff that best separates its examples from
+everything else. At query time similarities are z-normalized per technique and
+filtered against these cutoffs in one vectorized pass.
+
+Built offline by scripts/calibrate_dima_thresholds.py. The file records the
+artifact build and the text hash of each technique it was computed on; after
+a taxonomy edit and an incremental rebuild, entries of techniques whose text
+changed are dropped (default cutoff) until the script is run again.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from tracing import get_logger
+
+
+THRESHOLDS_FILE = "thresholds.json"
+THRESHOLDS_VERSION = 1
+
+DEFAULT_Z = float(os.getenv("DIMA_CALIBRATION_DEFAULT_Z", "2.0"))
+MIN_Z = 1.0
+MAX_Z = 6.0
+
+logger = get_logger("calibration")
+
+
+def calibrate(
+    technique_vectors: np.ndarray,
+    codes: List[str],
+    example_vectors: np.ndarray,
+    example_codes: List[str],
+    background_vectors: np.ndarray,
+    default_z: float = DEFAULT_Z
+) -> Dict:
+    """
+    Compute per-technique background statistics and z-score cutoffs.
+
+    Args:
+        technique_vectors: (n_techniques, dim) normalized technique vectors
+        codes: DIMA code of each technique row
+        example_vectors: (n_examples, dim) normalized annotated example sentences
+        example_codes: DIMA code of each example row
+        background_vectors: (n_background, dim) normalized unrelated texts
+
+    Returns:
+        Calibration dict (codes, mean, std, z_threshold, per-technique F1)
+    """
+    technique_vectors = np.asarray(technique_vectors, dtype="float32")
+    example_codes_array = np.array(example_codes, dtype=object)
+
+    # Scores of every technique on every example / background text
+    example_scores = example_vectors @ technique_vectors.T        # (n_examples, n_techniques)
+    background_scores = background_vectors @ technique_vectors.T  # (n_background, n_techniques)
+
+    mean = np.empty(len(codes), dtype="float32")
+    std = np.empty(len(codes), dtype="float32")
+    z_threshold = np.full(len(codes), default_z, dtype="float32")
+    f1 = np.full(len(codes), np.nan, dtype="float32")
+
+    for row, code in enumerate(codes):
+        positive = example_codes_array == code
+        # Background for this technique: unrelated texts + other techniques' examples
+        negatives = np.concatenate([background_scores[:, row], example_scores[~positive, row]])
+        mean[row] = negatives.mean()
+        std[row] = max(float(negatives.std()), 1e-3)
+
+        if positive.sum() == 0:
+            continue
+
+        z_positive = (example_scores[positive, row] - mean[row]) / std[row]
+        z_negative = (negatives - mean[row]) / std[row]
+
+        # F1 of every candidate cutoff (positives' own z-scores), vectorized
+        candidates = np.unique(z_positive)
+        true_positive = (z_positive[None, :] >= candidates[:, None]).sum(axis=1)
+        false_positive = (z_negative[None, :] >= candidates[:, None]).sum(axis=1)
+        precision = true_positive / np.maximum(true_positive + false_positive, 1)
+        recall = true_positive / len(z_positive)
+        scores = 2 * precision * recall / np.maximum(precision + recall, 1e-9)
+
+        best = int(np.argmax(scores))
+        z_threshold[row] = float(np.clip(candidates[best], MIN_Z, MAX_Z))
+        f1[row] = float(scores[best])
+
+    return {
+        "codes": list(codes),
+        "mean": mean.tolist(),
+        "std": std.tolist(),
+        "z_threshold": z_threshold.tolist(),
+        "f1": [None if np.isnan(value) else round(float(value), 4) for value in f1],
+        "default_z": default_z,
+    }
+
+
+def write_thresholds(artifact_dir: Path, calibration: Dict, model_name: str, manifest: Dict, background_size: int):
+    """Write thresholds.json atomically next to an embedding artifact (manifest: the artifact calibrated)."""
+    text_hashes = dict(zip(manifest["codes"], manifest.get("text_hashes") or []))
+    data = dict(
+        calibration,
+        version=THRESHOLDS_VERSION,
+        model=model_name,
+        build_id=manifest["build_id"],
+        text_hashes=[text_hashes.get(code) for code in calibration["codes"]],
+        background_size=background_size,
+    )
+    path = Path(artifact_dir) / THRESHOLDS_FILE
+    tmp_path = path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+class Calibration:
+    """Per-row calibration arrays aligned with a detector's row_codes."""
+
+    def __init__(self, mean: np.ndarray, std: np.ndarray, z_threshold: np.ndarray, calibrated_rows: int):
+        self.mean = mean
+        self.std = std
+        self.z_threshold = z_threshold
+        self.calibrated_rows = calibrated_rows
+
+    @classmethod
+    def load(cls, artifact_dir: Path, row_codes: List[str], model_name: str, manifest: Optional[Dict] = None) -> Optional["Calibration"]:
+        """
+        Load thresholds.json for an artifact, aligned to row_codes.
+
+        Techniques missing from the file (added after calibration) or whose
+        text changed since (hash differs from the artifact manifest) get the
+        median background statistics and the default cutoff.
+
+        Args:
+            artifact_dir: Embedding artifact directory
+            row_codes: DIMA code of each artifact row
+            model_name: Encoder model of the artifact
+            manifest: Artifact manifest (build_id, text_hashes) to check the file against
+
+        Returns:
+            Calibration, or None if absent, built for another model, or built
+            for another artifact without per-technique hashes to check
+        """
+        path = Path(artifact_dir) / THRESHOLDS_FILE
+        if not path.exists():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != THRESHOLDS_VERSION or data.get("model") != model_name:
+            logger.warning("⚠️  Ignoring thresholds built for another model", path=str(path), model=data.get("model"), version=data.get("version"))
+            return None
+
+        by_code = {code: row for row, code in enumerate(data["codes"])}
+        if manifest is not None and data.get("build_id") != manifest.get("build_id"):
+            calibrated_hashes = data.get("text_hashes")
+            current_hashes = dict(zip(manifest["codes"], manifest.get("text_hashes") or []))
+            if not calibrated_hashes or not current_hashes:
+                logger.warning(
+                    "⚠️  Ignoring thresholds calibrated on another artifact build", path=str(path),
+                    calibrated_build=data.get("build_id"), current_build=manifest.get("build_id")
+                )
+                return None
+            stale = [
+                code for code, digest in zip(data["codes"], calibrated_hashes)
+                if current_hashes.get(code) != digest
+            ]
+            added = [code for code in row_codes if code not in by_code]
+            for code in stale:
+                del by_code[code]
+            logger.warning(
+                "⚠️  Thresholds calibrated on another artifact build; changed and new techniques use the "
+                "default cutoff (re-run scripts/calibrate_dima_thresholds.py)", path=str(path),
+                calibrated_build=data.get("build_id"), current_build=manifest.get("build_id"),
+                changed=len(stale), added=len(added)
+            )
+        mean_all = np.array(data["mean"], dtype="float32")
+        std_all = np.array(data["std"], dtype="float32")
+        z_all = np.array(data["z_threshold"], dtype="float32")
+
+        rows = np.array([by_code.get(code, -1) for code in row_codes], dtype="int64")
+        known = rows >= 0
+        mean = np.full(len(row_codes), np.median(mean_all), dtype="float32")
+        std = np.full(len(row_codes), np.median(std_all), dtype="float32")
+        z_threshold = np.full(len(row_codes), data.get("default_z", DEFAULT_Z), dtype="float32")
+        mean[known] = mean_all[rows[known]]
+        std[known] = std_all[rows[known]]
+        z_threshold[known] = z_all[rows[known]]
+        return cls(mean, std, z_threshold, int(known.sum()))
+
+    def z_score(self, row: int, similarity: float) -> float:
+        """Z-normalized similarity of one technique row (e.g. an example kNN vote)."""
+        return float((similarity - self.mean[row]) / self.std[row])
+
+    def apply(self, similarities: np.ndarray, indices: np.ndarray, top_k: int):
+        """
+        Z-normalize search results per technique, drop those under their cutoff
+        and keep the top_k by z-score.
+
+        Args:
+            similarities: (n_queries, k) raw cosine similarities
+            indices: (n_queries, k) row numbers (-1 = no result)
+            top_k: Results to keep per query
+
+        Returns:
+            (similarities, indices, z_scores), each (n_queries, <= top_k);
+            rejected entries have index -1
+        """
+        valid = indices >= 0
+        rows = np.where(valid, indices, 0)
+        z = (similarities - self.mean[rows]) / self.std[rows]
+        z = np.where(valid & (z >= self.z_threshold[rows]), z, -np.inf)
+
+        order = np.argsort(-z, axis=1)[:, :top_k]
+        z = np.take_along_axis(z, order, axis=1)
+        similarities = np.take_along_axis(similarities, order, axis=1)
+        indices = np.where(np.isfinite(z), np.take_along_axis(indices, order, axis=1), -1)
+        return similarities, indices, z
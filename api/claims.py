@@ -1,6 +1,6 @@
 """Claims extraction from transcribed and OCR text."""
 import re
-from typing import List, Dict
+from typing import Dict, Iterable, Iterator, List, Set
 
 
 # Sensational keywords
@@ -21,6 +21,7 @@ NUMBER_PATTERNS = [
     r'\d+\s*k',  # thousands
     r'\d+\s*M',  # millions shorthand
 ]
+NUMBER_RES = [re.compile(pattern, re.IGNORECASE) for pattern in NUMBER_PATTERNS]
 
 
 def extract_claims(asr_segments: List[Dict], ocr_samples: List[Dict]) -> List[Dict]:
@@ -39,16 +40,17 @@ def extract_claims(asr_segments: List[Dict], ocr_samples: List[Dict]) -> List[Di
     # Extract from ASR
     for seg in asr_segments:
         text = seg["text"]
-        if contains_numbers(text) or contains_sensational_language(text):
+        if is_claim_candidate(text):
             claims.append({
                 "ts": seg["start"],
+                "end": seg.get("end"),
                 "text": text
             })
     
     # Extract from OCR
     for sample in ocr_samples:
         text = sample["text"]
-        if contains_numbers(text) or contains_sensational_language(text):
+        if is_claim_candidate(text):
             claims.append({
                 "ts": sample["ts"],
                 "text": text
@@ -60,12 +62,37 @@ def extract_claims(asr_segments: List[Dict], ocr_samples: List[Dict]) -> List[Di
     return claims[:10]  # Return top 10 claims
 
 
+def iter_claims(asr_segments: Iterable[Dict]) -> Iterator[Dict]:
+    """
+    Extract claims from ASR segments as they arrive (e.g. while a long file is
+    still being transcribed), deduplicated on the fly.
+    
+    Args:
+        asr_segments: ASR segments in media order ({"start", "end", "text"})
+    
+    Yields:
+        Claims with start/end timestamps and text
+    """
+    seen_texts: Set[str] = set()
+    for seg in asr_segments:
+        text = seg["text"].strip()
+        if not is_claim_candidate(text):
+            continue
+        text_key = text[:50]
+        if is_duplicate(text_key, seen_texts):
+            continue
+        seen_texts.add(text_key)
+        yield {"ts": seg["start"], "end": seg.get("end"), "text": text}
+
+
+def is_claim_candidate(text: str) -> bool:
+    """Check if text looks like a checkable claim (numbers or sensational language)."""
+    return contains_numbers(text) or contains_sensational_language(text)
+
+
 def contains_numbers(text: str) -> bool:
     """Check if text contains number patterns."""
-    for pattern in NUMBER_PATTERNS:
-        if re.search(pattern, text, re.IGNORECASE):
-            return True
-    return False
+    return any(pattern.search(text) for pattern in NUMBER_RES)
 
 
 def contains_sensational_language(text: str) -> bool:
@@ -89,16 +116,14 @@ def deduplicate_claims(claims: List[Dict]) -> List[Dict]:
     for claim in sorted(claims, key=lambda x: x["ts"]):
         text_key = claim["text"][:50]  # Use first 50 chars as key
         
-        # Check if similar claim exists in recent window
-        found_duplicate = False
-        for seen in seen_texts:
-            if text_key in seen or seen in text_key:
-                found_duplicate = True
-                break
-        
-        if not found_duplicate:
+        if not is_duplicate(text_key, seen_texts):
             result.append(claim)
             seen_texts.add(text_key)
     
     return result
 
+
+def is_duplicate(text_key: str, seen_texts: Set[str]) -> bool:
+    """Check if a claim key contains (or is contained in) an already seen one."""
+    return any(text_key in seen or seen in text_key for seen in seen_texts)
+
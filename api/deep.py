@@ -3,22 +3,59 @@ import os
 import json
 import base64
 import tempfile
+import time
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 import ffmpeg
-from openai import OpenAI
 import yt_dlp
+from pydantic import ValidationError
+
+from tracing import get_logger, start_span
+
+logger = get_logger("deep")
 
 # DIMA semantic layer imports
 try:
     from dima_detector import get_detector
-    from dima_prompts import build_dima_aware_prompt, build_hybrid_prompt
+    from dima_prompts import build_hybrid_prompt, select_prompt_tier
+    from models.analysis import CompactAnalysis, build_compact_response_format
     DIMA_ENABLED = True
-except ImportError:
-    print("⚠️  DIMA modules not available, using legacy prompts")
+except ImportError as e:
+    logger.warning("⚠️  DIMA modules not available, using legacy prompts", error=str(e))
     DIMA_ENABLED = False
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from llm_gateway import DEFAULT_MODEL, ModelUnavailableError, get_gateway
+
+from factcheck import match_claims
+from mapreduce import SegmentCache, analyze_segments, merge_segment_analyses, split_into_segments
+from near_duplicate import NEAR_DUPLICATE_ENABLED, get_near_duplicate_index
+from metrics import record_stage, stage
+from platform_meta import DESCRIPTION_MAX_CHARS, metadata_from_info, remember_ytdlp_info
+from claims import iter_claims
+from transcription import TranscriptTimeline, attach_media_offsets, iter_transcript_segments
+from token_budget import count_message_tokens, count_tokens, fit_prompt
+# Compact structured outputs (codes/quotes/enums, explanations rendered locally)
+COMPACT_OUTPUT_ENABLED = os.getenv("DIMA_COMPACT_OUTPUT", "true").lower() == "true"
+
+# Semantic fact-check matching for extracted claims
+FACTCHECK_MATCHING_ENABLED = os.getenv("FACTCHECK_MATCHING_ENABLED", "true").lower() == "true"
+
+# Embedding hints: query prefix length, number of hints and minimum similarity
+EMBEDDING_QUERY_CHARS = 2000
+EMBEDDINGS_TOP_K = int(os.getenv("DIMA_EMBEDDINGS_TOP_K", "5"))
+EMBEDDINGS_MIN_SIMILARITY = float(os.getenv("DIMA_EMBEDDINGS_MIN_SIMILARITY", "0.3"))
+
+# Content longer than this is analyzed with map-reduce over segments
+MAX_CONTENT_CHARS = int(os.getenv("DIMA_MAX_CONTENT_CHARS", "8000"))
+MAPREDUCE_ENABLED = os.getenv("MAPREDUCE_ENABLED", "true").lower() == "true"
+MAPREDUCE_CONCURRENCY = int(os.getenv("MAPREDUCE_CONCURRENCY", "4"))
+MAPREDUCE_MAX_SEGMENTS = int(os.getenv("MAPREDUCE_MAX_SEGMENTS", "16"))
+MAPREDUCE_OVERLAP = int(os.getenv("MAPREDUCE_OVERLAP", "300"))
+
+# Timed claim candidates (numbers, sensational language) returned with video analyses
+TRANSCRIPT_CLAIMS_MAX = 20
+
+_segment_cache = SegmentCache(capacity=int(os.getenv("MAPREDUCE_CACHE_SIZE", "512")))
 
 
 ANALYSIS_PROMPT = """Tu es un expert en manipulation médiatique, analyse de propagande et détection de désinformation.
@@ -119,13 +156,15 @@ def extract_audio_from_file(video_path: str) -> str:
     output_path = str(Path(tmpdir) / 'audio.mp3')
     
     try:
-        (
-            ffmpeg
-            .input(video_path)
-            .output(output_path, acodec='libmp3lame', ar='16000', ac=1)
-            .overwrite_output()
-            .run(quiet=True, capture_stderr=True)
-        )
+        with stage("ffmpeg", input_bytes=os.path.getsize(video_path)) as span:
+            (
+                ffmpeg
+                .input(video_path)
+                .output(output_path, acodec='libmp3lame', ar='16000', ac=1)
+                .overwrite_output()
+                .run(quiet=True, capture_stderr=True)
+            )
+            span.set(output_bytes=os.path.getsize(output_path))
         return output_path
     except ffmpeg.Error as e:
         raise Exception(f"FFmpeg error: {e.stderr.decode()}")
@@ -141,6 +180,23 @@ def download_audio_from_url(url: str) -> str:
     Returns:
         Path to downloaded audio file (MP3)
     
+    Raises:
+        Exception: If download fails
+    """
+    return download_audio_with_info(url)[0]
+
+
+def download_audio_with_info(url: str) -> Tuple[str, Dict]:
+    """
+    Download audio from video URL, also returning the yt-dlp info dict
+    (title, description, uploader, duration) extracted along the way.
+    
+    Args:
+        url: Video URL from any supported platform
+    
+    Returns:
+        (path to downloaded audio file, yt-dlp info dict)
+    
     Raises:
         Exception: If download fails
     """
@@ -167,8 +223,10 @@ def download_audio_from_url(url: str) -> str:
     
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            print(f"📥 Downloading audio from: {url}")
-            info = ydl.extract_info(url, download=True)
+            logger.info("📥 Downloading audio", url=url)
+            with stage("download", url=url) as download_span:
+                info = ydl.extract_info(url, download=True)
+                download_span.set(extractor=info.get('extractor'), audio_seconds=info.get('duration'))
             
             # Get the final audio file path
             # yt-dlp with FFmpegExtractAudio creates the file, we need to find it
@@ -202,8 +260,10 @@ def download_audio_from_url(url: str) -> str:
                 temp_files = [f for f in os.listdir(temp_dir) if video_id in f]
                 raise Exception(f"Audio file not found after download. Expected one of: {possible_paths}. Found in temp: {temp_files}")
             
-            print(f"✅ Audio downloaded: {audio_path} ({os.path.getsize(audio_path) / 1024 / 1024:.2f} MB)")
-            return audio_path
+            audio_bytes = os.path.getsize(audio_path)
+            download_span.set(bytes=audio_bytes)
+            logger.info("✅ Audio downloaded", path=audio_path, mb=round(audio_bytes / 1024 / 1024, 2))
+            return audio_path, info
             
     except Exception as e:
         raise Exception(f"yt-dlp download failed: {str(e)}")
@@ -211,16 +271,30 @@ def download_audio_from_url(url: str) -> str:
 
 def transcribe_audio(audio_path: str) -> str:
     """Transcribe audio using OpenAI Whisper API."""
-    with open(audio_path, 'rb') as audio_file:
-        transcript = client.audio.transcriptions.create(
-            model="whisper-1",
-            file=audio_file,
-            response_format="text"
-        )
-    return transcript
+    return transcribe_timed(audio_path)[0].text
+
 
+def transcribe_timed(audio_path: str) -> Tuple[TranscriptTimeline, List[Dict]]:
+    """
+    Transcribe audio with segment timestamps, extracting claim candidates
+    while segments arrive (long files are transcribed in chunks).
+    
+    Args:
+        audio_path: Audio file
+    
+    Returns:
+        (timeline of the transcript, claims with media timestamps)
+    """
+    timeline = TranscriptTimeline()
+    stored = (timeline.add(segment) for segment in iter_transcript_segments(audio_path))
+    claims = []
+    for claim in iter_claims(segment for segment in stored if segment):
+        logger.debug("🔎 Claim candidate", ts=claim["ts"], chars=len(claim["text"]))
+        claims.append(claim)
+    return timeline, claims
 
-def analyze_with_gpt4(transcript: str, metadata: Dict, use_dima: bool = True, use_embeddings: bool = True, language: str = "fr") -> Dict:
+
+def analyze_with_gpt4(transcript: str, metadata: Dict, use_dima: bool = True, use_embeddings: bool = True, language: str = "fr", detector=None, similar_techniques: Optional[List[Dict]] = None, allow_fallback: bool = True) -> Dict:
     """
     Analyze content using OpenAI GPT-4 with JSON mode (M2.2: Hybrid with embeddings).
     
@@ -229,99 +303,206 @@ def analyze_with_gpt4(transcript: str, metadata: Dict, use_dima: bool = True, us
         metadata: Metadata dictionary (title, description, platform, url)
         use_dima: Use DIMA-aware prompts (default: True)
         use_embeddings: Use embedding similarity hints (default: True, M2.2)
+        detector: DIMADetector pinned for this request (default: current instance)
+        similar_techniques: Precomputed embedding hints (skips the search; batch jobs
+            retrieve hints for many records in one vectorized call)
+        allow_fallback: Return an embedding-only report when the model is
+            unavailable (batch jobs disable it and retry later instead)
     
     Returns:
         Analysis dictionary with scores, techniques, claims, summary
     """
-    similar_techniques = []
-    
-    # Step 1: Semantic similarity search (M2.2)
-    if use_embeddings and use_dima and DIMA_ENABLED:
-        try:
-            detector = get_detector()
-            if detector.is_embeddings_enabled():
-                # Use first 2000 chars for similarity search (performance)
-                similar_techniques = detector.find_similar_techniques(
-                    transcript[:2000],
-                    top_k=int(os.getenv("DIMA_EMBEDDINGS_TOP_K", "5")),
-                    min_similarity=float(os.getenv("DIMA_EMBEDDINGS_MIN_SIMILARITY", "0.3"))
-                )
-                if similar_techniques:
-                    print(f"🔍 Embedding similarity: {[t['code'] for t in similar_techniques]}")
-        except Exception as e:
-            print(f"⚠️  Embedding similarity failed: {e}")
-            # Continue without embeddings
+    # Pin one taxonomy version for the whole request (hot reloads swap the global detector)
+    if detector is None and use_dima and DIMA_ENABLED:
+        detector = get_detector()
+    
+    # Long content: map-reduce over segments instead of truncating
+    if MAPREDUCE_ENABLED and len(transcript) > MAX_CONTENT_CHARS:
+        return analyze_long_transcript(transcript, metadata, use_dima, use_embeddings, language, detector=detector, allow_fallback=allow_fallback)
+    
+    prepared = prepare_analysis(transcript, metadata, use_dima, use_embeddings, language, detector, similar_techniques)
+    prompt_budget = prepared["prompt_budget"]
+    
+    # Step 3: Call OpenAI API (via model gateway)
+    try:
+        with stage("llm_call", prompt_chars=prepared["prompt_chars"], prompt_tokens_estimated=prompt_budget["prompt_tokens"], trimmed=prompt_budget["trimmed"], tier=prepared["tier"], compact=prepared["compact"]) as span:
+            response, model_used = get_gateway().chat_completion_hedged(
+                endpoint="analysis",
+                model=DEFAULT_MODEL,
+                messages=prepared["messages"],
+                response_format=prepared["response_format"],
+                temperature=0
+            )
+            usage = getattr(response, "usage", None)
+            span.set(
+                model=model_used,
+                prompt_tokens=getattr(usage, "prompt_tokens", None),
+                completion_tokens=getattr(usage, "completion_tokens", None)
+            )
+    except ModelUnavailableError as e:
+        if not prepared["similar_techniques"] or not allow_fallback:
+            raise
+        logger.warning("⚠️  LLM unavailable, falling back to embedding-only report", error=str(e))
+        return build_fallback_report(prepared)
+
+    return finalize_analysis(prepared, response.choices[0].message.content, model_used)
+
+
+def prepare_analysis(transcript: str, metadata: Dict, use_dima: bool = True, use_embeddings: bool = True, language: str = "fr", detector=None, similar_techniques: Optional[List[Dict]] = None) -> Dict:
+    """
+    Build the model request of an analysis (embedding retrieval + prompt) without calling the model.
+    
+    Used by analyze_with_gpt4 (online call) and by batch jobs (OpenAI Batch API requests);
+    finalize_analysis turns the model answer into the report.
+    
+    Args:
+        transcript: Text content to analyze (at most MAX_CONTENT_CHARS are sent)
+        metadata: Metadata dictionary (title, description, platform, url)
+        use_dima: Use DIMA-aware prompts
+        use_embeddings: Use embedding similarity hints
+        language: Language code ("fr" or "en")
+        detector: DIMADetector pinned for this request (default: current instance)
+        similar_techniques: Precomputed embedding hints (skips the search)
+    
+    Returns:
+        Prepared request: messages, response_format, prompt tier and budget, plus
+        the context finalize_analysis needs (hints, detector, transcript, language)
+    """
+    if detector is None and use_dima and DIMA_ENABLED:
+        detector = get_detector()
+    
+    # Step 1: Semantic similarity search (M2.2), unless precomputed (batch jobs)
+    if similar_techniques is None:
+        similar_techniques = []
+        if use_embeddings and use_dima and DIMA_ENABLED:
+            try:
+                if detector.is_embeddings_enabled():
+                    # Use first EMBEDDING_QUERY_CHARS chars for similarity search (performance)
+                    with stage("embedding_search") as span:
+                        similar_techniques = detector.find_similar_techniques(
+                            transcript[:EMBEDDING_QUERY_CHARS],
+                            top_k=EMBEDDINGS_TOP_K,
+                            min_similarity=EMBEDDINGS_MIN_SIMILARITY
+                        )
+                        span.set(hints=len(similar_techniques))
+                    if similar_techniques:
+                        logger.info("🔍 Embedding similarity", codes=[t['code'] for t in similar_techniques])
+            except Exception as e:
+                logger.warning("⚠️  Embedding similarity failed", error=str(e))
+                # Continue without embeddings
     
     # Step 2: Choose prompt strategy
+    prompt_started = time.perf_counter()
+    compact = use_dima and DIMA_ENABLED and COMPACT_OUTPUT_ENABLED
+    response_format = {"type": "json_object"}
+    tier, tier_reason = "legacy", "legacy_prompt"
     if use_dima and DIMA_ENABLED:
-        # Use hybrid prompt with embedding hints if available
+        # Hybrid prompt with embedding hints if available (standard DIMA prompt otherwise)
         if use_embeddings and similar_techniques:
-            prompt = build_hybrid_prompt(transcript[:8000], metadata, similar_techniques, language=language)
             if language == "en":
                 system_msg = "You are an expert in media analysis using the DIMA taxonomy (M82 Project). You MUST respond ONLY in valid JSON, in English. Cite the exact DIMA CODES (e.g., TE-58) for each technique. PRIORITIZE techniques suggested by semantic analysis."
             else:
                 system_msg = "Tu es un expert en analyse médiatique utilisant la taxonomie DIMA (M82 Project). Tu DOIS répondre UNIQUEMENT en JSON valide, en français. Cite les CODES DIMA exacts (ex: TE-58) pour chaque technique. PRIORISE les techniques suggérées par l'analyse sémantique."
         else:
-            # Standard DIMA prompt (no embedding hints)
-            prompt = build_dima_aware_prompt(transcript[:8000], metadata, language=language)
             if language == "en":
                 system_msg = "You are an expert in media analysis using the DIMA taxonomy (M82 Project). You MUST respond ONLY in valid JSON, in English. Cite the exact DIMA CODES (e.g., TE-58) for each technique."
             else:
                 system_msg = "Tu es un expert en analyse médiatique utilisant la taxonomie DIMA (M82 Project). Tu DOIS répondre UNIQUEMENT en JSON valide, en français. Cite les CODES DIMA exacts (ex: TE-58) pour chaque technique."
+        hints = similar_techniques if use_embeddings else None
+        # Compact tier: retrieved techniques only; full taxonomy on weak or flat retrieval
+        tier, tier_reason = select_prompt_tier(hints)
+        logger.debug("🧭 Prompt tier", tier=tier, reason=tier_reason)
+        
+        def build_prompt(content: str, include_few_shot: bool, max_hints: int) -> str:
+            return build_hybrid_prompt(
+                content, metadata, hints, language=language, compact=compact, detector=detector,
+                include_few_shot=include_few_shot, max_hints=max_hints, tier=tier
+            )
+        
+        if compact:
+            allowed_codes = [tech['code'] for tech in hints] if tier == "compact" else detector.get_codes()
+            response_format = build_compact_response_format(allowed_codes)
     else:
         # Legacy prompt (backward compatibility)
-        prompt = ANALYSIS_PROMPT.format(
-            title=metadata.get('title', 'N/A'),
-            description=metadata.get('description', 'N/A'),
-            platform=metadata.get('platform', 'unknown'),
-            transcript=transcript[:8000]
-        )
+        def build_prompt(content: str, include_few_shot: bool, max_hints: int) -> str:
+            return ANALYSIS_PROMPT.format(
+                title=metadata.get('title', 'N/A'),
+                description=metadata.get('description', 'N/A'),
+                platform=metadata.get('platform', 'unknown'),
+                transcript=content
+            )
+        
         if language == "en":
             system_msg = "You are an expert in media analysis. You MUST respond ONLY in valid JSON, in English. No markdown, no code blocks, no explanations outside the JSON."
         else:
             system_msg = "Tu es un expert en analyse médiatique. Tu DOIS répondre UNIQUEMENT en JSON valide, en français. Pas de markdown, pas de blocs de code, pas d'explications hors du JSON."
 
-    # Step 3: Call OpenAI API
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
+    # Fit the token budget (few-shot, then hints, then content are trimmed);
+    # the system message and the structured-output schema count towards it
+    reserved_tokens = count_message_tokens([{"role": "system", "content": system_msg}], DEFAULT_MODEL)
+    if response_format.get("type") == "json_schema":
+        reserved_tokens += count_tokens(json.dumps(response_format["json_schema"]), DEFAULT_MODEL)
+    prompt, prompt_budget = fit_prompt(
+        build_prompt, transcript[:MAX_CONTENT_CHARS], reserved_tokens, model=DEFAULT_MODEL,
+        max_hints=len(similar_techniques or [])
+    )
+
+    record_stage("prompt_build", time.perf_counter() - prompt_started)
+    
+    return {
+        "messages": [
             {"role": "system", "content": system_msg},
             {"role": "user", "content": prompt}
         ],
-        response_format={"type": "json_object"},
-        temperature=0
-    )
+        "response_format": response_format,
+        "compact": compact,
+        "tier": tier,
+        "tier_reason": tier_reason,
+        "prompt_budget": prompt_budget,
+        "prompt_chars": len(prompt),
+        "similar_techniques": similar_techniques,
+        "detector": detector,
+        "transcript": transcript,
+        "language": language,
+    }
 
-    content = response.choices[0].message.content
-    if not content:
-        raise ValueError("OpenAI returned empty content")
-    
-    # Aggressively clean the response
-    content = content.strip()
-    
-    # Remove markdown code blocks if present
-    if content.startswith("```"):
-        lines = content.split('\n')
-        if lines[0].startswith("```"):
-            lines = lines[1:]
-        if lines and lines[-1].strip() == "```":
-            lines = lines[:-1]
-        content = '\n'.join(lines).strip()
+
+def build_fallback_report(prepared: Dict) -> Dict:
+    """Embedding-only report for a prepared analysis whose model call failed (requires hints)."""
+    detector = prepared["detector"]
+    report = build_embedding_only_report(prepared["similar_techniques"], language=prepared["language"], detector=detector)
+    report["taxonomy_version"] = detector.taxonomy_version
+    return report
+
+
+def finalize_analysis(prepared: Dict, content: Optional[str], model_used: str) -> Dict:
+    """
+    Turn a model answer into the analysis report (parsing, defaults, embedding enrichment, fact-checks).
     
-    # Find the first { and last } to extract just the JSON object
-    first_brace = content.find('{')
-    last_brace = content.rfind('}')
+    Args:
+        prepared: Output of prepare_analysis
+        content: Message content returned by the model
+        model_used: Model that answered
     
-    if first_brace == -1 or last_brace == -1:
-        raise ValueError(f"No JSON object found in response. Content: {content[:500]}")
+    Returns:
+        Analysis dictionary with scores, techniques, claims, summary
+    """
+    transcript = prepared["transcript"]
+    language = prepared["language"]
+    detector = prepared["detector"]
+    compact = prepared["compact"]
+    similar_techniques = prepared["similar_techniques"]
+    prompt_budget = prepared["prompt_budget"]
+    tier, tier_reason = prepared["tier"], prepared["tier_reason"]
     
-    content = content[first_brace:last_brace+1]
+    if not content:
+        raise ValueError("OpenAI returned empty content")
     
-    try:
-        parsed = json.loads(content)
-    except json.JSONDecodeError as e:
-        # Log the actual content for debugging
-        raise ValueError(f"JSON parse error: {str(e)}. Cleaned response: {content[:500]}")
+    with stage("json_parse"):
+        if compact:
+            parsed = parse_compact_analysis(content, transcript, language=language, detector=detector)
+        else:
+            parsed = parse_json_content(content)
     
     # Validate and set defaults for required fields
     parsed.setdefault("propaganda_score", 0)
@@ -331,6 +512,12 @@ def analyze_with_gpt4(transcript: str, metadata: Dict, use_dima: bool = True, us
     parsed.setdefault("techniques", [])
     parsed.setdefault("claims", [])
     parsed.setdefault("summary", "")
+    parsed["model_used"] = model_used
+    if detector is not None:
+        parsed["taxonomy_version"] = detector.taxonomy_version
+    parsed["prompt_tier"] = {"tier": tier, "reason": tier_reason, "prompt_tokens": prompt_budget["prompt_tokens"]}
+    if prompt_budget["trimmed"]:
+        parsed["prompt_trimmed"] = prompt_budget["trimmed"]
     
     # Validate techniques structure (accept DIMA fields if present)
     techniques = parsed.get("techniques", [])
@@ -348,31 +535,270 @@ def analyze_with_gpt4(transcript: str, metadata: Dict, use_dima: bool = True, us
         parsed["embedding_hints"] = similar_techniques
         
         # Enrich techniques with high-confidence embeddings not detected by GPT
-        # (only add if GPT missed them and similarity > 0.5)
+        # (per-technique calibrated cutoffs when available, see detector.classify_hint)
         gpt_codes = {tech.get("dima_code", "") for tech in parsed["techniques"]}
         
         for emb_tech in similar_techniques:
             code = emb_tech.get("code", "")
             similarity = emb_tech.get("similarity", 0)
+            severity = detector.classify_hint(emb_tech)
             
-            # Add if: not already detected by GPT AND high similarity
-            if code and code not in gpt_codes and similarity >= 0.5:
+            # Add if: not already detected by GPT AND high confidence
+            if code and code not in gpt_codes and severity:
                 # Create technique entry from embedding
                 enriched_technique = {
                     "dima_code": code,
                     "dima_family": emb_tech.get("family", ""),
                     "name": emb_tech.get("name", ""),
                     "evidence": "(Détecté par analyse sémantique - correspondance thématique forte)",
-                    "severity": "medium" if similarity >= 0.6 else "low",
+                    "severity": severity,
                     "explanation": f"Technique détectée par similarité sémantique (score: {similarity:.2f}). Le contenu présente des marqueurs linguistiques correspondant à cette technique de manipulation.",
                     "source": "embedding"  # Mark as embedding-detected
                 }
                 parsed["techniques"].append(enriched_technique)
-                print(f"✨ Enriched with embedding technique: {code} (similarity: {similarity:.2f})")
+                logger.info("✨ Enriched with embedding technique", code=code, similarity=round(similarity, 2))
     
+    attach_factcheck_matches(parsed)
     return parsed
 
 
+def attach_factcheck_matches(analysis: Dict, top_k: int = 3) -> None:
+    """Attach semantic fact-check matches to each claim of an analysis (in place)."""
+    if not FACTCHECK_MATCHING_ENABLED or not analysis.get("claims"):
+        return
+    claims = analysis["claims"]
+    texts = [claim.get("claim", "") for claim in claims]
+    with stage("factcheck_match"):
+        all_matches = match_claims(texts, top_k=top_k)
+    for claim, matches in zip(claims, all_matches):
+        claim["factchecks"] = matches
+
+
+def analyze_long_transcript(transcript: str, metadata: Dict, use_dima: bool = True, use_embeddings: bool = True, language: str = "fr", detector=None, allow_fallback: bool = True) -> Dict:
+    """
+    Analyze long content with map-reduce instead of truncating it.
+    
+    Segments are analyzed concurrently (MAPREDUCE_CONCURRENCY) and cached by
+    content hash, then merged (techniques/claims deduplicated, scores aggregated).
+    
+    Args:
+        transcript: Full text content
+        metadata: Metadata dictionary (title, description, platform, url)
+        use_dima: Use DIMA-aware prompts
+        use_embeddings: Use embedding similarity hints
+        language: Language code ("fr" or "en")
+        detector: DIMADetector pinned for this request (all segments use it)
+        allow_fallback: Allow embedding-only segment reports when the model is unavailable
+    
+    Returns:
+        Merged analysis dictionary (with per-segment breakdown in "segments")
+    """
+    segments = split_into_segments(transcript, MAX_CONTENT_CHARS, overlap=MAPREDUCE_OVERLAP)
+    if len(segments) > MAPREDUCE_MAX_SEGMENTS:
+        logger.warning("⚠️  Content too long, analyzing first segments only", analyzed=MAPREDUCE_MAX_SEGMENTS, total=len(segments))
+        segments = segments[:MAPREDUCE_MAX_SEGMENTS]
+    logger.info("✂️  Map-reduce analysis", segments=len(segments), max_chars=MAX_CONTENT_CHARS)
+    
+    def analyze_segment(segment: Dict) -> Dict:
+        segment_metadata = dict(metadata, segment=f"{segment['index'] + 1}/{len(segments)}")
+        with start_span("segment", index=segment['index'], chars=len(segment['text'])):
+            return analyze_with_gpt4(segment['text'], segment_metadata, use_dima, use_embeddings, language, detector=detector, allow_fallback=allow_fallback)
+    
+    taxonomy_version = detector.taxonomy_version if detector is not None else "legacy"
+    variant = f"{DEFAULT_MODEL}|dima={use_dima}|emb={use_embeddings}|compact={COMPACT_OUTPUT_ENABLED}|{taxonomy_version}"
+    analyses = analyze_segments(
+        segments,
+        analyze_segment,
+        max_workers=MAPREDUCE_CONCURRENCY,
+        cache=_segment_cache,
+        cache_variant=variant,
+        language=language
+    )
+    merged = merge_segment_analyses(segments, analyses)
+    if detector is not None:
+        merged["taxonomy_version"] = taxonomy_version
+    return merged
+
+
+def parse_json_content(content: str) -> Dict:
+    """
+    Parse a free-form JSON answer (legacy/verbose mode).
+    
+    Strips markdown fences and anything outside the outermost JSON object.
+    """
+    # Aggressively clean the response
+    content = content.strip()
+    
+    # Remove markdown code blocks if present
+    if content.startswith("```"):
+        lines = content.split('\n')
+        if lines[0].startswith("```"):
+            lines = lines[1:]
+        if lines and lines[-1].strip() == "```":
+            lines = lines[:-1]
+        content = '\n'.join(lines).strip()
+    
+    # Find the first { and last } to extract just the JSON object
+    first_brace = content.find('{')
+    last_brace = content.rfind('}')
+    
+    if first_brace == -1 or last_brace == -1:
+        raise ValueError(f"No JSON object found in response. Content: {content[:500]}")
+    
+    content = content[first_brace:last_brace+1]
+    
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError as e:
+        # Log the actual content for debugging
+        raise ValueError(f"JSON parse error: {str(e)}. Cleaned response: {content[:500]}")
+
+
+def parse_compact_analysis(content: str, transcript: str, language: str = "fr", detector=None) -> Dict:
+    """
+    Validate a compact structured-output answer and expand it to the report format.
+    
+    Explanations and claim reasoning are rendered locally from DIMA taxonomy
+    templates; evidence quotes are located in the transcript to provide spans.
+    
+    Args:
+        content: Raw JSON returned by the model (strict schema)
+        transcript: Analyzed content (for evidence span lookup)
+        language: Language code ("fr" or "en")
+        detector: DIMADetector pinned for the request (default: current instance)
+    
+    Returns:
+        Analysis dictionary (same shape as the verbose mode)
+    """
+    try:
+        compact = CompactAnalysis.model_validate_json(content)
+    except ValidationError as e:
+        raise ValueError(f"Compact analysis validation error: {str(e)[:500]}")
+    
+    detector = detector or get_detector()
+    
+    techniques = []
+    for tech in compact.techniques:
+        technique = detector.get_technique(tech.code)
+        if not technique:
+            continue
+        quote = tech.quote.strip()
+        start = transcript.find(quote) if quote else -1
+        techniques.append({
+            "dima_code": tech.code,
+            "dima_family": technique['family'],
+            "name": technique['name_en'] if language == "en" else technique['name_fr'],
+            "evidence": quote,
+            "evidence_span": [start, start + len(quote)] if start >= 0 else None,
+            "severity": tech.severity,
+            "explanation": detector.render_technique_explanation(tech.code, tech.severity, quote, language),
+            "contextual_impact": tech.impact.strip() or None
+        })
+    
+    claims = [
+        {
+            "claim": claim.text,
+            "confidence": claim.verdict,
+            "issues": [detector.render_claim_issue(issue, language) for issue in claim.issues],
+            "reasoning": detector.render_claim_reasoning(claim.verdict, claim.issues, language)
+        }
+        for claim in compact.claims
+    ]
+    
+    return {
+        "propaganda_score": compact.scores.propaganda,
+        "conspiracy_score": compact.scores.conspiracy,
+        "misinfo_score": compact.scores.misinfo,
+        "overall_risk": compact.scores.overall,
+        "techniques": techniques,
+        "claims": claims,
+        "summary": compact.summary,
+        "content_summary": compact.content_summary.strip() or None,
+        "technique_interactions": (compact.interactions or "").strip() or None,
+        "output_mode": "compact"
+    }
+
+
+def build_embedding_only_report(similar_techniques: List[Dict], language: str = "fr", detector=None) -> Dict:
+    """
+    Build a degraded report from embedding hints only (LLM unavailable).
+    
+    Scores are derived from hint similarity weighted by the DIMA
+    I_p / N_s / F_f weights of each technique.
+    
+    Args:
+        similar_techniques: Embedding hints from find_similar_techniques
+        language: Language code ("fr" or "en")
+        detector: DIMADetector pinned for the request (default: current instance)
+    
+    Returns:
+        Analysis dictionary (same shape as the GPT report, flagged as degraded)
+    """
+    detector = detector or get_detector()
+    scores = {"I_p": 0.0, "N_s": 0.0, "F_f": 0.0}
+    techniques = []
+    
+    for hint in similar_techniques:
+        technique = detector.get_technique(hint.get("code", ""))
+        if not technique:
+            continue
+        similarity = hint.get("similarity", 0)
+        for key in scores:
+            scores[key] = max(scores[key], similarity * technique[f"weight_{key}"])
+        severity = detector.classify_hint(hint) or "low"
+        techniques.append({
+            "dima_code": technique['code'],
+            "dima_family": technique['family'],
+            "name": technique['name_en'] if language == "en" else technique['name_fr'],
+            "evidence": "",
+            "severity": severity,
+            "explanation": detector.render_technique_explanation(technique['code'], severity, language=language),
+            "source": "embedding"
+        })
+    
+    propaganda, conspiracy, misinfo = (int(round(scores[k] * 100)) for k in ("I_p", "N_s", "F_f"))
+    if language == "en":
+        summary = "Degraded analysis: the language model is temporarily unavailable. Techniques below come from semantic similarity only."
+    else:
+        summary = "Analyse dégradée : le modèle de langage est temporairement indisponible. Les techniques ci-dessous proviennent uniquement de la similarité sémantique."
+    
+    return {
+        "propaganda_score": propaganda,
+        "conspiracy_score": conspiracy,
+        "misinfo_score": misinfo,
+        "overall_risk": max(propaganda, conspiracy, misinfo),
+        "techniques": techniques,
+        "claims": [],
+        "summary": summary,
+        "embedding_hints": similar_techniques,
+        "output_mode": "embedding_only",
+        "model_used": "embedding-only",
+        "degraded": True
+    }
+
+
+def attach_timed_results(analysis: Dict, timeline: TranscriptTimeline, timed_claims: List[Dict]):
+    """Add media offsets to techniques/claims and the timed claim candidates (in place)."""
+    attach_media_offsets(analysis, timeline)
+    analysis['transcript_claims'] = timed_claims[:TRANSCRIPT_CLAIMS_MAX]
+    if timeline.duration is not None:
+        analysis['media_duration'] = timeline.duration
+
+
+def apply_video_metadata(metadata: Dict, fields: Dict):
+    """Replace the placeholder title/description with the video's own (when known)."""
+    if fields.get('title'):
+        metadata['title'] = fields['title']
+    description = fields.get('description')
+    if description:
+        if len(description) > DESCRIPTION_MAX_CHARS:
+            description = description[:DESCRIPTION_MAX_CHARS].rstrip() + '…'
+        metadata['description'] = description
+    for key in ('author', 'duration'):
+        if fields.get(key):
+            metadata[key] = fields[key]
+
+
 def analyze_url(url: str, platform: str = "unknown", post_text: str = None) -> Dict:
     """
     Full analysis pipeline for video URL (Twitter, YouTube, TikTok, etc.).
@@ -395,22 +821,25 @@ def analyze_url(url: str, platform: str = "unknown", post_text: str = None) -> D
     
     audio_path = None
     try:
-        # Download audio from URL (yt-dlp)
-        audio_path = download_audio_from_url(url)
+        # Download audio from URL (yt-dlp); its info gives the real title/description
+        audio_path, info = download_audio_with_info(url)
+        remember_ytdlp_info(url, info)
+        apply_video_metadata(metadata, metadata_from_info(info))
         
-        # Transcribe with Whisper
-        print(f"🎤 Transcribing audio with Whisper...")
-        audio_transcript = transcribe_audio(audio_path)
-        print(f"✅ Transcription complete: {len(audio_transcript)} characters")
+        # Transcribe with Whisper (timed segments)
+        logger.info("🎤 Transcribing audio with Whisper")
+        timeline, timed_claims = transcribe_timed(audio_path)
+        audio_transcript = timeline.text
+        logger.info("✅ Transcription complete", chars=len(audio_transcript), segments=len(timeline.segments))
         
         # CRITICAL FIX: Handle empty/music-only transcripts
         if len(audio_transcript.strip()) < 10:
-            print("⚠️  Audio transcript is empty or music-only (< 10 chars)")
+            logger.warning("⚠️  Audio transcript is empty or music-only (< 10 chars)")
             audio_transcript = "[Audio sans paroles détectées - musique de fond uniquement]"
         
         # MULTIMODAL FUSION: Combine post text + audio transcript if both available
         if post_text and len(post_text.strip()) > 5:
-            print(f"📝 Fusing post text ({len(post_text)} chars) + audio transcript ({len(audio_transcript)} chars)")
+            logger.info("📝 Fusing post text + audio transcript", post_chars=len(post_text), transcript_chars=len(audio_transcript))
             transcript = f"""TEXTE DU POST:
 {post_text}
 
@@ -427,6 +856,7 @@ TRANSCRIPTION AUDIO:
         
         # Analyze with GPT-4 + DIMA
         analysis = analyze_with_gpt4(transcript, metadata)
+        attach_timed_results(analysis, timeline, timed_claims)
         analysis['input'] = metadata
         analysis['transcript_excerpt'] = transcript[:500] + '...' if len(transcript) > 500 else transcript
         
@@ -435,7 +865,7 @@ TRANSCRIPTION AUDIO:
         # Cleanup temp audio file
         if audio_path and os.path.exists(audio_path):
             os.remove(audio_path)
-            print(f"🗑️  Cleaned up: {audio_path}")
+            logger.debug("🗑️  Cleaned up", path=audio_path)
 
 
 def analyze_file(file_path: str, platform: str = "unknown", language: str = "fr") -> Dict:
@@ -451,11 +881,13 @@ def analyze_file(file_path: str, platform: str = "unknown", language: str = "fr"
     audio_path = extract_audio_from_file(file_path)
     
     try:
-        # Transcribe with Whisper
-        transcript = transcribe_audio(audio_path)
+        # Transcribe with Whisper (timed segments)
+        timeline, timed_claims = transcribe_timed(audio_path)
+        transcript = timeline.text
         
         # Analyze with GPT-4
         analysis = analyze_with_gpt4(transcript, metadata, language=language)
+        attach_timed_results(analysis, timeline, timed_claims)
         analysis['input'] = metadata
         analysis['transcript_excerpt'] = transcript[:500] + '...' if len(transcript) > 500 else transcript
         
@@ -466,21 +898,46 @@ def analyze_file(file_path: str, platform: str = "unknown", language: str = "fr"
             os.remove(audio_path)
 
 
-def analyze_text(text: str, platform: str = "text", language: str = "fr") -> Dict:
-    """Analyze plain text directly with GPT-4 using the same schema."""
-    metadata = {
+def text_metadata(text: str, platform: str = "text") -> Dict:
+    """Metadata of a submitted text (shared by /analyze-text and batch jobs)."""
+    return {
         'platform': platform,
         'title': 'Submitted text',
         'description': (text[:200] + '...') if len(text) > 200 else text,
         'url': None,
     }
-    transcript = text
-    analysis = analyze_with_gpt4(transcript, metadata, language=language)
+
+
+def attach_text_input(analysis: Dict, metadata: Dict, transcript: str) -> Dict:
+    """Add the input metadata and transcript excerpt to an analysis (in place)."""
     analysis['input'] = metadata
     analysis['transcript_excerpt'] = transcript[:500] + '...' if len(transcript) > 500 else transcript
     return analysis
 
 
+def analyze_text(text: str, platform: str = "text", language: str = "fr", similar_techniques: Optional[List[Dict]] = None, allow_fallback: bool = True) -> Dict:
+    """Analyze plain text directly with GPT-4 using the same schema (precomputed hints skip the embedding search)."""
+    metadata = text_metadata(text, platform)
+    transcript = text
+    
+    # Lightly edited copy of a recent submission: reuse its analysis (same
+    # platform, taxonomy version and model only, so a hot reload invalidates it)
+    if NEAR_DUPLICATE_ENABLED:
+        detector = get_detector() if DIMA_ENABLED else None
+        taxonomy_version = detector.taxonomy_version if detector is not None else "legacy"
+        variant = f"{platform}|{taxonomy_version}|{DEFAULT_MODEL}"
+        analysis = get_near_duplicate_index().lookup(text, language, variant)
+        if analysis is not None:
+            logger.info("♻️  Near-duplicate submission, reusing analysis", similarity=analysis['near_duplicate']['similarity'])
+        else:
+            analysis = analyze_with_gpt4(transcript, metadata, language=language, detector=detector, similar_techniques=similar_techniques, allow_fallback=allow_fallback)
+            if analysis.get("output_mode") != "embedding_only" and not analysis.get("degraded"):  # Don't pin degraded reports
+                get_near_duplicate_index().add(text, language, analysis, variant)
+    else:
+        analysis = analyze_with_gpt4(transcript, metadata, language=language, similar_techniques=similar_techniques, allow_fallback=allow_fallback)
+    return attach_text_input(analysis, metadata, transcript)
+
+
 def analyze_image(image_bytes: bytes, platform: str = "image", language: str = "fr") -> Dict:
     """Extract text-like content from a screenshot using OpenAI vision, then analyze with GPT-4."""
     # Encode image to base64 for inline message
@@ -492,20 +949,22 @@ def analyze_image(image_bytes: bytes, platform: str = "image", language: str = "
         "Return plain text only."
     )
 
-    vision = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "You extract text from images."},
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": extract_prompt},
-                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64}"}}
-                ]
-            }
-        ],
-        temperature=0
-    )
+    with stage("vision_call"):
+        vision = get_gateway().chat_completion(
+            endpoint="vision",
+            model=DEFAULT_MODEL,
+            messages=[
+                {"role": "system", "content": "You extract text from images."},
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": extract_prompt},
+                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64}"}}
+                    ]
+                }
+            ],
+            temperature=0
+        )
     extracted = vision.choices[0].message.content or ""
 
     metadata = {
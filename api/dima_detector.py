@@ -5,9 +5,16 @@ Loads DIMA taxonomy and provides utilities for DIMA-aware analysis.
 import csv
 import json
 import os
+import re
+import threading
+import time
+import unicodedata
 from pathlib import Path
 from typing import Dict, List, Optional
 
+from metrics import stage
+from tracing import get_logger
+
 # M2.2: Semantic Embeddings (optional imports)
 EMBEDDINGS_AVAILABLE = False
 _numpy_ok = False
@@ -43,10 +50,112 @@ else:
     print(f"⚠️  Embedding libraries incomplete: numpy={_numpy_ok}, faiss={_faiss_ok}, transformers={_transformers_ok}")
 
 
+# Local explanation templates (compact structured-output mode): the LLM returns
+# codes/quotes/enums only and the human-readable text is rendered from the taxonomy.
+SEVERITY_LABELS = {
+    "fr": {"high": "forte", "medium": "modérée", "low": "faible"},
+    "en": {"high": "high", "medium": "medium", "low": "low"},
+}
+
+TECHNIQUE_EXPLANATION_TEMPLATES = {
+    "fr": "Technique « {name} » (famille {family}), intensité {severity}. Marqueurs caractéristiques : {features}.",
+    "en": "Technique \"{name}\" ({family} family), {severity} intensity. Characteristic markers: {features}.",
+}
+
+TECHNIQUE_EVIDENCE_TEMPLATES = {
+    "fr": " Repérée dans l'extrait : « {evidence} ».",
+    "en": " Found in: \"{evidence}\".",
+}
+
+CLAIM_ISSUE_LABELS = {
+    "fr": {
+        "unsourced": "affirmation non sourcée",
+        "out_of_context": "information hors contexte",
+        "misleading_statistics": "statistique trompeuse",
+        "correlation_causation": "confusion corrélation/causalité",
+        "omission": "omission d'informations cruciales",
+        "false_equivalence": "fausse équivalence",
+        "exaggeration": "exagération",
+        "unfalsifiable": "affirmation infalsifiable",
+        "logical_fallacy": "sophisme logique",
+    },
+    "en": {
+        "unsourced": "unsourced claim",
+        "out_of_context": "information out of context",
+        "misleading_statistics": "misleading statistic",
+        "correlation_causation": "correlation/causation confusion",
+        "omission": "omission of crucial information",
+        "false_equivalence": "false equivalence",
+        "exaggeration": "exaggeration",
+        "unfalsifiable": "unfalsifiable claim",
+        "logical_fallacy": "logical fallacy",
+    },
+}
+
+CLAIM_VERDICT_TEMPLATES = {
+    "fr": {
+        "supported": "Affirmation cohérente avec les éléments disponibles.",
+        "unsupported": "Affirmation non étayée par le contenu.",
+        "misleading": "Affirmation trompeuse ou présentée de manière biaisée.",
+    },
+    "en": {
+        "supported": "Claim consistent with the available evidence.",
+        "unsupported": "Claim not supported by the content.",
+        "misleading": "Misleading or biased claim.",
+    },
+}
+
+CLAIM_ISSUES_TEMPLATES = {
+    "fr": " Problèmes relevés : {issues}.",
+    "en": " Issues found: {issues}.",
+}
+
+_NAME_TOKEN_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_technique_name(name: str) -> str:
+    """Normalize a technique name for lookups (lowercase, no accents/punctuation)."""
+    decomposed = unicodedata.normalize("NFKD", name.lower())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(_NAME_TOKEN_RE.split(stripped)).strip()
+
+
+# M2.2: Embedding artifact settings
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "paraphrase-multilingual-MiniLM-L12-v2").removeprefix("sentence-transformers/")
+EMBEDDINGS_ARTIFACT_DIR = Path(os.getenv("DIMA_EMBEDDINGS_DIR", str(Path(__file__).parent.parent / "data" / "dima_embeddings")))  # One subdirectory per model
+EMBEDDINGS_DTYPE = os.getenv("DIMA_EMBEDDINGS_DTYPE", "float32")  # float32 or float16
+
+# Example-level kNN (votes from annotated example sentences, fused with technique vectors)
+EXAMPLE_KNN_ENABLED = os.getenv("DIMA_EXAMPLE_KNN_ENABLED", "true").lower() == "true"
+
+# Query embedding cache (entries; 0 disables)
+QUERY_CACHE_SIZE = int(os.getenv("DIMA_QUERY_CACHE_SIZE", "1024"))
+
+logger = get_logger("dima_detector")
+
+# Hot reloads are rejected when the technique count drops by more than this fraction
+RELOAD_MAX_TECHNIQUE_DROP = float(os.getenv("DIMA_RELOAD_MAX_TECHNIQUE_DROP", "0.1"))
+
+# Hint confidence cutoffs: z-scores when the artifact is calibrated
+# (scripts/calibrate_dima_thresholds.py), raw cosine similarity otherwise
+ENRICH_MIN_Z = float(os.getenv("DIMA_ENRICH_MIN_Z", "3.0"))
+ENRICH_MEDIUM_Z = float(os.getenv("DIMA_ENRICH_MEDIUM_Z", "4.0"))
+ENRICH_MIN_SIMILARITY = float(os.getenv("DIMA_ENRICH_MIN_SIMILARITY", "0.5"))
+ENRICH_MEDIUM_SIMILARITY = float(os.getenv("DIMA_ENRICH_MEDIUM_SIMILARITY", "0.6"))
+
+
 class DIMADetector:
     """DIMA taxonomy loader and helper utilities."""
     
-    def __init__(self, csv_path: str = None, examples_dir: str = None, enable_embeddings: bool = True):
+    def __init__(
+        self,
+        csv_path: str = None,
+        examples_dir: str = None,
+        enable_embeddings: bool = True,
+        version: int = 1,
+        previous: Optional["DIMADetector"] = None,
+        strict: bool = False
+    ):
         """
         Initialize DIMA detector with taxonomy and examples.
         
@@ -54,6 +163,11 @@ class DIMADetector:
             csv_path: Path to DIMA_Full_Mapping.csv (default: ../docs/DIMA_Full_Mapping.csv)
             examples_dir: Path to examples directory (default: ../data/dima_examples/)
             enable_embeddings: Load semantic embeddings if available (default: True)
+            version: Reload counter (1 for the detector loaded at startup)
+            previous: Detector being replaced by a hot reload (its encoder is reused)
+            strict: Raise on an unreadable or malformed taxonomy, or on a technique
+                count drop beyond RELOAD_MAX_TECHNIQUE_DROP from `previous`,
+                instead of continuing with the rows read so far (hot reloads)
         """
         if csv_path is None:
             # Default: relative to api/ directory
@@ -68,19 +182,44 @@ class DIMADetector:
         self.examples_dir = Path(examples_dir)
         self.taxonomy: Dict[str, Dict] = {}
         self.families: Dict[str, List[str]] = {}
+        self.examples: Dict[str, List[Dict]] = {}
+        self.version = version
+        self.strict = strict
+        self.source_fingerprint = taxonomy_fingerprint(self.csv_path, self.examples_dir)
+        
+        # Prompt parts derived from this taxonomy (filled by dima_prompts)
+        self.prompt_cache: Dict[str, str] = {}
         
         # M2.2: Embeddings support
         self.embeddings_enabled = enable_embeddings and EMBEDDINGS_AVAILABLE
         self.embeddings: Optional[np.ndarray] = None
         self.faiss_index = None
         self.encoder_model = None
+        self.row_codes: List[str] = []
+        self.artifact_dir: Optional[Path] = None
+        self.example_index = None
+        self.calibration = None
+        self.query_cache = None
+        
+        # Lookup index (built once at load time, see _build_lookup_index / _build_row_index)
+        self.code_to_row: Dict[str, int] = {}
+        self.family_masks: Dict[str, "np.ndarray"] = {}
+        self._row_meta: List[tuple] = []
+        self._name_to_code: Dict[str, str] = {}
+        self._name_entries: List[tuple] = []
+        self._token_index: Dict[str, List[int]] = {}
+        self._name_lookup_cache: Dict[str, Optional[str]] = {}
         
         # Load taxonomy at initialization
         self._load_taxonomy()
+        if strict and previous is not None:
+            self._check_technique_count(previous)
+        self._load_examples()
+        self._build_lookup_index()
         
         # Load embeddings if enabled
         if self.embeddings_enabled:
-            self._load_embeddings()
+            self._load_embeddings(previous)
     
     def _load_taxonomy(self):
         """Load DIMA taxonomy from CSV file."""
@@ -112,12 +251,75 @@ class DIMADetector:
             print(f"✅ DIMA taxonomy loaded: {len(self.taxonomy)} techniques, {len(self.families)} families")
         
         except FileNotFoundError:
+            if self.strict:
+                raise
             print(f"⚠️  DIMA taxonomy CSV not found at {self.csv_path}")
             # Continue with empty taxonomy (graceful degradation)
         
         except Exception as e:
+            if self.strict:
+                raise ValueError(f"malformed DIMA taxonomy {self.csv_path}: {e}") from e
             print(f"⚠️  Error loading DIMA taxonomy: {e}")
     
+    def _check_technique_count(self, previous: "DIMADetector"):
+        """Raise ValueError if the taxonomy lost more techniques than a hot reload allows."""
+        minimum = len(previous.taxonomy) * (1 - RELOAD_MAX_TECHNIQUE_DROP)
+        if not self.taxonomy or len(self.taxonomy) < minimum:
+            raise ValueError(
+                f"taxonomy shrank from {len(previous.taxonomy)} to {len(self.taxonomy)} techniques "
+                f"(more than DIMA_RELOAD_MAX_TECHNIQUE_DROP={RELOAD_MAX_TECHNIQUE_DROP})"
+            )
+    
+    def _load_examples(self):
+        """Load few-shot example files (TE-XX_*.json) for all techniques."""
+        for code in self.taxonomy:
+            example_files = sorted(self.examples_dir.glob(f"{code}_*.json"))
+            if not example_files:
+                continue
+            try:
+                with open(example_files[0], 'r', encoding='utf-8') as f:
+                    self.examples[code] = json.load(f).get('examples', [])
+            except Exception as e:
+                print(f"⚠️  Error loading examples for {code}: {e}")
+    
+    @property
+    def taxonomy_version(self) -> str:
+        """Version label reported in x-taxonomy-version (reload counter appended after a hot reload)."""
+        label = f"DIMA-M2.2-{len(self.taxonomy)}"
+        return label if self.version == 1 else f"{label}-r{self.version}"
+    
+    def _build_lookup_index(self):
+        """
+        Build name lookup structures (taxonomy CSV order is preserved).
+        
+        - _name_to_code: normalized FR/EN name → code (first technique wins)
+        - _name_entries: (code, normalized FR, normalized EN) for substring matching
+        - _token_index: name token → positions in _name_entries
+        """
+        self._name_to_code = {}
+        self._name_entries = []
+        self._token_index = {}
+        self._name_lookup_cache = {}
+        
+        for position, (code, tech) in enumerate(self.taxonomy.items()):
+            name_fr = normalize_technique_name(tech['name_fr'])
+            name_en = normalize_technique_name(tech['name_en'])
+            self._name_to_code.setdefault(name_fr, code)
+            self._name_to_code.setdefault(name_en, code)
+            self._name_entries.append((code, name_fr, name_en))
+            for token in set(name_fr.split()) | set(name_en.split()):
+                self._token_index.setdefault(token, []).append(position)
+    
+    def _build_row_index(self):
+        """Build row-level structures for the embedding index (row i ↔ row_codes[i])."""
+        self.code_to_row = {code: row for row, code in enumerate(self.row_codes)}
+        self._row_meta = [
+            (code, self.taxonomy[code]['name_fr'], self.taxonomy[code]['family'])
+            for code in self.row_codes
+        ]
+        row_families = np.array([family for _, _, family in self._row_meta], dtype=object)
+        self.family_masks = {family: row_families == family for family in self.families}
+    
     def get_technique(self, code: str) -> Optional[Dict]:
         """
         Get technique details by DIMA code.
@@ -169,36 +371,19 @@ class DIMADetector:
         """
         examples = []
         
-        # Map technique code to example file
-        # e.g., TE-01 -> TE-01_appel_emotion_examples.json
         technique = self.get_technique(technique_code)
         if not technique:
             return examples
         
-        # Try to find example file
-        # Pattern: TE-XX_*.json
-        example_files = list(self.examples_dir.glob(f"{technique_code}_*.json"))
-        
-        if not example_files:
-            return examples
-        
-        try:
-            with open(example_files[0], 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                technique_examples = data.get('examples', [])
-                
-                # Return up to n examples
-                for example in technique_examples[:n]:
-                    examples.append({
-                        'id': example.get('id'),
-                        'content_fr': example.get('content_fr', ''),
-                        'evidence_span': example.get('evidence_span', ''),
-                        'explanation': example.get('annotation_notes', ''),
-                        'scores': example.get('infoverif_scores', {})
-                    })
-        
-        except Exception as e:
-            print(f"⚠️  Error loading examples for {technique_code}: {e}")
+        # Return up to n examples (loaded at init from TE-XX_*.json)
+        for example in self.examples.get(technique_code, [])[:n]:
+            examples.append({
+                'id': example.get('id'),
+                'content_fr': example.get('content_fr', ''),
+                'evidence_span': example.get('evidence_span', ''),
+                'explanation': example.get('annotation_notes', ''),
+                'scores': example.get('infoverif_scores', {})
+            })
         
         return examples
     
@@ -214,6 +399,10 @@ class DIMADetector:
         Returns:
             Compact taxonomy string (~3000-3500 tokens)
         """
+        cached = self.prompt_cache.get("taxonomy")
+        if cached is not None:
+            return cached
+        
         lines = []
         lines.append("TAXONOMIE DIMA COMPLÈTE (130 techniques de manipulation):")
         lines.append("")
@@ -244,79 +433,155 @@ class DIMADetector:
             
             lines.append("")
         
-        return "\n".join(lines)
+        self.prompt_cache["taxonomy"] = "\n".join(lines)
+        return self.prompt_cache["taxonomy"]
     
     def map_technique_name_to_code(self, name: str) -> Optional[str]:
         """
         Reverse lookup: Find DIMA code by technique name (fuzzy match).
         
+        Tries, in order: exact normalized name (FR or EN), substring of a
+        technique name (taxonomy order), then best token overlap.
+        
         Args:
             name: Technique name (French or English)
         
         Returns:
             DIMA code or None if not found
         """
-        name_lower = name.lower().strip()
+        key = normalize_technique_name(name)
+        if not key:
+            return None
+        
+        if key in self._name_lookup_cache:
+            return self._name_lookup_cache[key]
         
         # Exact match first
-        for code, tech in self.taxonomy.items():
-            if tech['name_fr'].lower() == name_lower:
-                return code
-            if tech['name_en'].lower() == name_lower:
-                return code
+        code = self._name_to_code.get(key)
         
         # Fuzzy match (contains)
-        for code, tech in self.taxonomy.items():
-            if name_lower in tech['name_fr'].lower():
-                return code
-            if name_lower in tech['name_en'].lower():
-                return code
+        if code is None:
+            for entry_code, name_fr, name_en in self._name_entries:
+                if key in name_fr or key in name_en:
+                    code = entry_code
+                    break
         
-        return None
+        # Token overlap (e.g. reordered words, extra qualifiers)
+        if code is None:
+            tokens = set(key.split())
+            counts: Dict[int, int] = {}
+            for token in tokens:
+                for position in self._token_index.get(token, ()):
+                    counts[position] = counts.get(position, 0) + 1
+            if counts:
+                position, overlap = max(counts.items(), key=lambda item: (item[1], -item[0]))
+                if overlap * 2 > len(tokens):
+                    code = self._name_entries[position][0]
+        
+        if len(self._name_lookup_cache) < 10000:
+            self._name_lookup_cache[key] = code
+        return code
     
-    def _load_embeddings(self):
+    
+    def get_codes(self) -> List[str]:
+        """Get all DIMA codes (taxonomy CSV order)."""
+        return list(self.taxonomy.keys())
+    
+    def render_technique_explanation(self, code: str, severity: str = "medium", evidence: str = "", language: str = "fr") -> str:
+        """
+        Render a human-readable explanation for a detected technique from taxonomy templates.
+        
+        Args:
+            code: DIMA code (e.g., "TE-58")
+            severity: high/medium/low
+            evidence: Quote from the analyzed content (optional)
+            language: Language code ("fr" or "en")
+        
+        Returns:
+            Explanation string (empty if code unknown)
+        """
+        technique = self.get_technique(code)
+        if not technique:
+            return ""
+        
+        lang = "en" if language == "en" else "fr"
+        explanation = TECHNIQUE_EXPLANATION_TEMPLATES[lang].format(
+            name=technique['name_en'] if lang == "en" else technique['name_fr'],
+            family=technique['family'],
+            severity=SEVERITY_LABELS[lang].get(severity, severity),
+            features=technique['semantic_features']
+        )
+        if evidence:
+            explanation += TECHNIQUE_EVIDENCE_TEMPLATES[lang].format(evidence=evidence)
+        return explanation
+    
+    def render_claim_issue(self, issue: str, language: str = "fr") -> str:
+        """Render a claim issue code (e.g., "unsourced") as a readable label."""
+        lang = "en" if language == "en" else "fr"
+        return CLAIM_ISSUE_LABELS[lang].get(issue, issue)
+    
+    def render_claim_reasoning(self, verdict: str, issues: List[str], language: str = "fr") -> str:
+        """Render the reasoning for a claim verdict from its issue codes."""
+        lang = "en" if language == "en" else "fr"
+        reasoning = CLAIM_VERDICT_TEMPLATES[lang].get(verdict, "")
+        if issues:
+            labels = ", ".join(self.render_claim_issue(issue, lang) for issue in issues)
+            reasoning += CLAIM_ISSUES_TEMPLATES[lang].format(issues=labels)
+        return reasoning.strip()
+
+    def _load_embeddings(self, previous: Optional["DIMADetector"] = None):
         """
-        Load precomputed embeddings and build FAISS index (M2.2).
+        Load the versioned embedding artifact and its FAISS index (M2.2).
         
-        Tries to load from data/dima_embeddings.npy. If not found, generates them
-        on-the-fly using sentence-transformers.
+        Loads data/dima_embeddings/<model>/ (memory-mapped, shared across workers). If it
+        is missing or stale (model, taxonomy CSV hash or codes changed), the
+        artifact is rebuilt on-the-fly using sentence-transformers; only
+        techniques whose text changed are re-encoded.
+        
+        Args:
+            previous: Detector being replaced (its encoder model is reused)
         """
         if not EMBEDDINGS_AVAILABLE:
             print("⚠️  Embeddings disabled: sentence-transformers not installed")
             return
         
-        base_dir = Path(__file__).parent.parent
-        embeddings_path = base_dir / "data" / "dima_embeddings.npy"
+        from embedding_store import ArtifactMismatch, file_sha256, load_artifact, model_artifact_dir
+        
+        self.artifact_dir = model_artifact_dir(EMBEDDINGS_ARTIFACT_DIR, EMBEDDING_MODEL_NAME)
         
         try:
-            # Try to load precomputed embeddings
-            if embeddings_path.exists():
-                print(f"🔄 Loading precomputed embeddings from {embeddings_path}...")
-                self.embeddings = np.load(embeddings_path).astype('float32')
-                print(f"✅ Loaded embeddings: shape={self.embeddings.shape}")
+            # Load encoder model for runtime queries (also used for rebuilds)
+            if previous is not None and previous.encoder_model is not None:
+                self.encoder_model = previous.encoder_model
+                self.query_cache = previous.query_cache  # Same encoder: cached vectors stay valid
             else:
-                # Generate embeddings on-the-fly (first run)
-                print("⚠️  Precomputed embeddings not found, generating on-the-fly...")
-                print("   This will download ~470MB model on first run...")
-                self._generate_embeddings()
+                self.encoder_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+                print(f"✅ Encoder model loaded: {EMBEDDING_MODEL_NAME}")
+            if self.query_cache is None:
+                from embedding_cache import QueryEmbeddingCache
+                self.query_cache = QueryEmbeddingCache(QUERY_CACHE_SIZE)
             
-            # Validate embeddings
-            if self.embeddings is None or len(self.embeddings) != len(self.taxonomy):
-                raise ValueError(f"Embeddings count mismatch: {len(self.embeddings)} vs {len(self.taxonomy)}")
+            csv_sha256 = file_sha256(self.csv_path)
+            try:
+                print(f"🔄 Loading embedding artifact from {self.artifact_dir}...")
+                vectors, index, manifest = load_artifact(self.artifact_dir, self.taxonomy.keys(), EMBEDDING_MODEL_NAME, csv_sha256)
+            except ArtifactMismatch as e:
+                # Never serve vectors that may be mislabelled: rebuild
+                print(f"⚠️  Embedding artifact unusable ({e}), rebuilding...")
+                self._generate_embeddings(csv_sha256)
+                vectors, index, manifest = load_artifact(self.artifact_dir, self.taxonomy.keys(), EMBEDDING_MODEL_NAME, csv_sha256)
             
-            # Build FAISS index for fast similarity search
-            dimension = self.embeddings.shape[1]  # Should be 384
-            self.faiss_index = faiss.IndexFlatIP(dimension)  # Inner product (cosine similarity)
+            self.embeddings = vectors
+            self.faiss_index = index
+            self.row_codes = list(manifest['codes'])  # Row i of the index is row_codes[i]
+            self._build_row_index()
             
-            # Normalize embeddings for cosine similarity
-            faiss.normalize_L2(self.embeddings)
-            self.faiss_index.add(self.embeddings)
+            print(f"✅ FAISS index loaded: {len(self.row_codes)} vectors, dim={manifest['dim']}, dtype={manifest['dtype']} (build {manifest['build_id']})")
             
-            # Load encoder model for runtime queries
-            self.encoder_model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+            self._load_calibration(manifest)
             
-            print(f"✅ FAISS index built: {len(self.embeddings)} vectors, dim={dimension}")
-            print(f"✅ Encoder model loaded: paraphrase-multilingual-MiniLM-L12-v2")
+            if EXAMPLE_KNN_ENABLED:
+                self._load_example_index()
         
         except Exception as e:
             print(f"⚠️  Could not load embeddings: {e}")
@@ -324,37 +589,85 @@ class DIMADetector:
             self.embeddings = None
             self.faiss_index = None
             self.encoder_model = None
+            self.row_codes = []
+            self.code_to_row = {}
+            self.family_masks = {}
+            self._row_meta = []
+            self.example_index = None
+            self.calibration = None
+            self.query_cache = None
+    
+    def _load_calibration(self, manifest: Dict):
+        """Load per-technique similarity thresholds (thresholds.json), if calibrated for this artifact."""
+        try:
+            from calibration import Calibration
+            self.calibration = Calibration.load(self.artifact_dir, self.row_codes, EMBEDDING_MODEL_NAME, manifest)
+            if self.calibration is not None:
+                print(f"✅ Similarity calibration loaded: {self.calibration.calibrated_rows}/{len(self.row_codes)} techniques")
+        except Exception as e:
+            print(f"⚠️  Could not load similarity calibration: {e}")
+            self.calibration = None
     
-    def _generate_embeddings(self):
-        """Generate embeddings on-the-fly if precomputed file not found."""
-        print("🔄 Generating embeddings for 130 techniques...")
-        
-        # Load model
-        model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-        
-        # Build texts from taxonomy (same format as precompute script)
-        texts = []
-        for code in sorted(self.taxonomy.keys()):  # Ensure consistent order
-            tech = self.taxonomy[code]
-            text = (
-                f"{tech['name_fr']}. "
-                f"{tech['semantic_features']}. "
-                f"Exemples: {tech['example_keywords']}"
+    def _load_example_index(self):
+        """Load (or build) the kNN index over annotated example sentences."""
+        try:
+            from example_index import ExampleIndex
+            self.example_index = ExampleIndex.load_or_build(
+                self.examples,
+                self.encoder_model,
+                EMBEDDING_MODEL_NAME,
+                self.artifact_dir / "examples",
+                EMBEDDINGS_DTYPE
             )
-            texts.append(text)
+            if self.example_index is not None:
+                print(f"✅ Example kNN index loaded: {len(self.example_index)} sentences")
+        except Exception as e:
+            print(f"⚠️  Could not load example index: {e}")
+            self.example_index = None
+    
+    def _generate_embeddings(self, csv_sha256: str):
+        """Write a new embedding artifact (only new or changed techniques are encoded)."""
+        from embedding_store import build_artifact
         
-        # Encode
-        embeddings = model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
-        self.embeddings = embeddings.astype('float32')
+        print(f"🔄 Updating embeddings for {len(self.taxonomy)} techniques...")
+        manifest = build_artifact(
+            self.taxonomy,
+            self.encoder_model,
+            EMBEDDING_MODEL_NAME,
+            csv_sha256,
+            artifact_dir=self.artifact_dir,
+            dtype=EMBEDDINGS_DTYPE
+        )
+        print(f"✅ Generated and saved embeddings: {len(manifest['codes'])}x{manifest['dim']} ({manifest['dtype']}, {manifest['encoded']} re-encoded)")
+    
+    def encode_queries(self, texts: List[str]) -> "np.ndarray":
+        """
+        Embed query texts (L2-normalized), reusing cached vectors for repeated content.
+        
+        Args:
+            texts: Query texts
         
-        # Save for future runs
-        embeddings_path = Path(__file__).parent.parent / "data" / "dima_embeddings.npy"
-        embeddings_path.parent.mkdir(exist_ok=True)
-        np.save(embeddings_path, self.embeddings)
+        Returns:
+            (len(texts), dim) float32 array
+        """
+        def encode(batch: List[str]) -> "np.ndarray":
+            with stage("embedding_encode"):
+                return self.encoder_model.encode(batch, convert_to_numpy=True).astype('float32')
         
-        print(f"✅ Generated and saved embeddings: {self.embeddings.shape}")
+        if self.query_cache is None:
+            query_embeddings = encode(list(texts))
+            faiss.normalize_L2(query_embeddings)
+            return query_embeddings
+        return self.query_cache.encode(list(texts), encode)
     
-    def find_similar_techniques(self, text: str, top_k: int = 5, min_similarity: float = 0.3) -> List[Dict]:
+    def find_similar_techniques(
+        self,
+        text: str,
+        top_k: int = 5,
+        min_similarity: float = 0.3,
+        families: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None
+    ) -> List[Dict]:
         """
         Find most similar DIMA techniques using semantic embeddings (M2.2).
         
@@ -362,74 +675,371 @@ class DIMADetector:
             text: Content to analyze
             top_k: Number of similar techniques to return (default: 5)
             min_similarity: Minimum similarity threshold 0-1 (default: 0.3)
+            families: Restrict candidates to these DIMA families (optional)
+            exclude: DIMA codes to leave out of the candidates (optional)
         
         Returns:
             List of dicts with code, name, family, similarity, rank
         """
-        if self.faiss_index is None or self.encoder_model is None:
-            return []
+        return self.find_similar_techniques_batch([text], top_k, min_similarity, families, exclude)[0]
+    
+    def find_similar_techniques_batch(
+        self,
+        texts: List[str],
+        top_k: int = 5,
+        min_similarity: float = 0.3,
+        families: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None
+    ) -> List[List[Dict]]:
+        """
+        Batch version of find_similar_techniques (one encoder call for all texts).
+        
+        When the artifact is calibrated, similarities are z-normalized per
+        technique and only hints above their technique's cutoff are kept
+        (ranked by z-score, with a 'z_score' field).
+        
+        Returns:
+            One result list per input text
+        """
+        if self.faiss_index is None or self.encoder_model is None or not texts:
+            return [[] for _ in texts]
         
         try:
-            # Encode query text
-            query_embedding = self.encoder_model.encode([text], convert_to_numpy=True).astype('float32')
+            query_embeddings = self.encode_queries(texts)
             
-            # Normalize for cosine similarity
-            faiss.normalize_L2(query_embedding)
+            # Calibrated: over-fetch, then keep the top_k that pass their own cutoff
+            search_k = top_k
+            if self.calibration is not None:
+                search_k = min(len(self.row_codes), max(4 * top_k, 32))
             
-            # Search FAISS index (returns cosine similarity scores)
-            similarities, indices = self.faiss_index.search(query_embedding, top_k)
+            candidate_mask = self._candidate_mask(families, exclude)
+            with stage("faiss_search"):
+                if candidate_mask is None:
+                    # Search FAISS index (returns cosine similarity scores)
+                    similarities, indices = self.faiss_index.search(query_embeddings, search_k)
+                else:
+                    similarities, indices = self._masked_search(query_embeddings, candidate_mask, search_k)
+                
+                z_scores = None
+                if self.calibration is not None:
+                    similarities, indices, z_scores = self.calibration.apply(similarities, indices, top_k)
             
-            # Build results
-            results = []
-            codes_list = sorted(self.taxonomy.keys())  # Same order as embeddings
+            results = [
+                self._build_results(similarities[row], indices[row], min_similarity, None if z_scores is None else z_scores[row])
+                for row in range(len(similarities))
+            ]
             
-            for rank, (similarity, idx) in enumerate(zip(similarities[0], indices[0]), 1):
-                if idx >= len(codes_list):
+            # Fuse example-level kNN votes (same query vectors, no extra encoding)
+            if self.example_index is not None:
+                allowed_codes = None
+                if candidate_mask is not None:
+                    allowed_codes = {self.row_codes[row] for row in np.flatnonzero(candidate_mask)}
+                with stage("example_knn"):
+                    votes = self.example_index.vote(query_embeddings, min_similarity=min_similarity, allowed_codes=allowed_codes)
+                results = [self._fuse_votes(query_results, query_votes, top_k) for query_results, query_votes in zip(results, votes)]
+            
+            return results
+        
+        except Exception as e:
+            logger.warning("⚠️  Similarity search failed", error=str(e))
+            return [[] for _ in texts]
+    
+    def _fuse_votes(self, results: List[Dict], votes: Dict[str, Dict], top_k: int) -> List[Dict]:
+        """
+        Merge technique-vector results with example kNN votes (best score wins), re-ranked.
+        
+        When calibrated, vote similarities are z-normalized with their
+        technique's statistics, votes under the technique's cutoff are dropped
+        and the fused list is ranked by z-score (raw similarity otherwise).
+        """
+        if not votes:
+            return results
+        
+        by_code = {result['code']: result for result in results}
+        for code, vote in votes.items():
+            z_score = None
+            if self.calibration is not None:
+                row = self.code_to_row.get(code)
+                if row is None:
                     continue
-                
-                # Filter by minimum similarity
-                if similarity < min_similarity:
+                z_score = self.calibration.z_score(row, vote['similarity'])
+                if z_score < self.calibration.z_threshold[row]:
                     continue
-                
-                code = codes_list[idx]
-                technique = self.taxonomy[code]
-                
-                results.append({
+            result = by_code.get(code)
+            if result is None:
+                technique = self.taxonomy.get(code)
+                if technique is None:
+                    continue
+                result = by_code[code] = {
                     'code': code,
                     'name': technique['name_fr'],
                     'family': technique['family'],
-                    'similarity': float(similarity),
-                    'rank': rank
-                })
-            
-            return results
+                    'similarity': vote['similarity'],
+                }
+            else:
+                result['similarity'] = max(result['similarity'], vote['similarity'])
+            if z_score is not None:
+                result['z_score'] = round(max(result.get('z_score', z_score), z_score), 2)
+            result['example_votes'] = vote['votes']
         
-        except Exception as e:
-            print(f"⚠️  Error in similarity search: {e}")
-            return []
+        rank_key = 'z_score' if self.calibration is not None else 'similarity'
+        fused = sorted(by_code.values(), key=lambda result: result[rank_key], reverse=True)[:top_k]
+        for rank, result in enumerate(fused, 1):
+            result['rank'] = rank
+        return fused
+    
+    def _candidate_mask(self, families: Optional[List[str]], exclude: Optional[List[str]]) -> Optional["np.ndarray"]:
+        """Boolean row mask for family/exclusion filters (None = all rows)."""
+        if not families and not exclude:
+            return None
+        
+        if families:
+            mask = np.zeros(len(self.row_codes), dtype=bool)
+            for family in families:
+                family_mask = self.family_masks.get(family)
+                if family_mask is not None:
+                    mask |= family_mask
+        else:
+            mask = np.ones(len(self.row_codes), dtype=bool)
+        
+        for code in exclude or ():
+            row = self.code_to_row.get(code)
+            if row is not None:
+                mask[row] = False
+        return mask
+    
+    def _masked_search(self, query_embeddings: "np.ndarray", mask: "np.ndarray", top_k: int):
+        """Exact top-k over the allowed rows only (only those rows are read and converted to float32)."""
+        rows = np.flatnonzero(mask)
+        k = min(top_k, len(rows))
+        if k == 0:
+            empty = np.empty((len(query_embeddings), 0))
+            return empty, empty.astype('int64')
+        
+        scores = query_embeddings @ np.asarray(self.embeddings[rows], dtype='float32').T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top_scores, order, axis=1), rows[np.take_along_axis(top, order, axis=1)]
+    
+    def _build_results(
+        self,
+        similarities: "np.ndarray",
+        indices: "np.ndarray",
+        min_similarity: float,
+        z_scores: Optional["np.ndarray"] = None
+    ) -> List[Dict]:
+        """Turn one row of search output into result dicts (rank = position in the search output)."""
+        keep = np.flatnonzero((indices >= 0) & (indices < len(self._row_meta)) & (similarities >= min_similarity))
+        results = []
+        for position in keep.tolist():
+            code, name, family = self._row_meta[indices[position]]
+            result = {
+                'code': code,
+                'name': name,
+                'family': family,
+                'similarity': float(similarities[position]),
+                'rank': position + 1
+            }
+            if z_scores is not None:
+                result['z_score'] = round(float(z_scores[position]), 2)
+            results.append(result)
+        return results
+    
+    def classify_hint(self, hint: Dict) -> Optional[str]:
+        """
+        Confidence of an embedding hint for report enrichment.
+        
+        Uses the calibrated z-score when present (per-technique cutoffs),
+        raw cosine similarity otherwise.
+        
+        Args:
+            hint: Result dict from find_similar_techniques
+        
+        Returns:
+            "medium", "low", or None if too weak to report on its own
+        """
+        z_score = hint.get('z_score')
+        if z_score is not None:
+            minimum, medium, score = ENRICH_MIN_Z, ENRICH_MEDIUM_Z, z_score
+        else:
+            minimum, medium, score = ENRICH_MIN_SIMILARITY, ENRICH_MEDIUM_SIMILARITY, hint.get('similarity', 0)
+        if score >= medium:
+            return "medium"
+        if score >= minimum:
+            return "low"
+        return None
     
     def is_embeddings_enabled(self) -> bool:
         """Check if embeddings are loaded and ready."""
         return self.faiss_index is not None and self.encoder_model is not None
 
 
-# Global singleton instance (loaded at FastAPI startup)
+def taxonomy_fingerprint(csv_path, examples_dir) -> tuple:
+    """Cheap change detector for the taxonomy sources (mtime + size of the CSV and example files)."""
+    paths = [Path(csv_path)]
+    examples_dir = Path(examples_dir)
+    if examples_dir.is_dir():
+        paths.extend(sorted(examples_dir.glob("*.json")))
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = path.stat()
+            fingerprint.append((path.name, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            fingerprint.append((path.name, None, None))
+    return tuple(fingerprint)
+
+
+# Global singleton instance (loaded at FastAPI startup, replaced by hot reloads)
 _detector_instance: Optional[DIMADetector] = None
+_detector_lock = threading.Lock()
+_reload_lock = threading.Lock()
+_reload_status: Dict = {"state": "idle", "version": None, "error": None, "duration_ms": None}
 
 
 def get_detector() -> DIMADetector:
     """
     Get global DIMA detector instance (singleton pattern).
     
+    Callers that use the detector several times per request should keep the
+    returned instance for the whole request: a hot reload swaps the global
+    instance but never mutates a published one.
+    
     Returns:
         DIMADetector instance
     """
     global _detector_instance
     if _detector_instance is None:
-        _detector_instance = DIMADetector()
+        with _detector_lock:
+            if _detector_instance is None:
+                _detector_instance = DIMADetector()
     return _detector_instance
 
 
+def reload_detector() -> DIMADetector:
+    """
+    Rebuild the taxonomy, examples, embeddings and prompt prefixes, then swap.
+    
+    The new detector is fully built (embeddings re-encoded only for changed
+    techniques, prompt prefixes warmed) before it replaces the current one;
+    requests that already hold the old instance finish on it. A malformed
+    taxonomy, an unexpected drop in technique count or embeddings lost since
+    the current detector keep the current detector live.
+    
+    Returns:
+        The new detector (or the current one if a reload is already running)
+    """
+    global _detector_instance
+    if not _reload_lock.acquire(blocking=False):
+        return get_detector()
+    
+    started = time.time()
+    try:
+        current = get_detector()
+        _reload_status.update(state="reloading", error=None)
+        print(f"🔄 Reloading DIMA taxonomy (v{current.version} → v{current.version + 1})...")
+        
+        detector = DIMADetector(
+            csv_path=current.csv_path,
+            examples_dir=str(current.examples_dir),
+            enable_embeddings=current.embeddings_enabled,
+            version=current.version + 1,
+            previous=current,
+            strict=True
+        )
+        if current.is_embeddings_enabled() and not detector.is_embeddings_enabled():
+            raise ValueError("embeddings failed to load for the new taxonomy")
+        
+        from dima_prompts import warm_prompt_cache
+        warm_prompt_cache(detector)
+        
+        with _detector_lock:
+            _detector_instance = detector
+        
+        duration_ms = int((time.time() - started) * 1000)
+        _reload_status.update(state="idle", version=detector.version, duration_ms=duration_ms)
+        print(f"✅ DIMA taxonomy v{detector.version} live ({len(detector.taxonomy)} techniques, {duration_ms}ms)")
+        return detector
+    
+    except Exception as e:
+        _reload_status.update(state="failed", error=str(e)[:200])
+        print(f"⚠️  DIMA taxonomy reload failed, keeping v{get_detector().version}: {e}")
+        raise
+    
+    finally:
+        _reload_lock.release()
+
+
+def reload_detector_async() -> bool:
+    """
+    Start a hot reload in a background thread.
+    
+    Returns:
+        False if a reload is already running
+    """
+    if _reload_lock.locked():
+        return False
+    
+    def run():
+        try:
+            reload_detector()
+        except Exception:
+            pass  # Already logged and recorded in the reload status
+    
+    threading.Thread(target=run, name="dima-reload", daemon=True).start()
+    return True
+
+
+def get_reload_status() -> Dict:
+    """Current version and state of the last hot reload."""
+    status = dict(_reload_status)
+    if _detector_instance is not None:
+        status["version"] = _detector_instance.version
+        status["taxonomy_version"] = _detector_instance.taxonomy_version
+    return status
+
+
+def start_taxonomy_watcher(interval: float) -> threading.Thread:
+    """
+    Poll the taxonomy CSV and example files, hot-reloading when they change.
+    
+    Each worker process runs its own watcher, so a file change reaches every
+    worker (the admin endpoint only reloads the worker that served it). A
+    change is reloaded once the files have stayed the same for one more poll,
+    so a file still being written is not loaded.
+    
+    Args:
+        interval: Polling interval in seconds
+    """
+    def watch():
+        failed_fingerprint = None
+        changed_fingerprint = None  # Seen at the previous poll (reloaded once it stays the same)
+        while True:
+            time.sleep(interval)
+            try:
+                current = get_detector()
+                fingerprint = taxonomy_fingerprint(current.csv_path, current.examples_dir)
+                if fingerprint == current.source_fingerprint or fingerprint == failed_fingerprint:
+                    changed_fingerprint = None
+                    continue
+                if fingerprint != changed_fingerprint:
+                    changed_fingerprint = fingerprint  # Still being written? Check again next poll
+                    continue
+                changed_fingerprint = None
+                print("🔄 DIMA taxonomy files changed on disk")
+                try:
+                    reload_detector()
+                except Exception:
+                    failed_fingerprint = fingerprint  # Retry only after the next edit
+            except Exception:
+                pass
+    
+    thread = threading.Thread(target=watch, name="dima-watcher", daemon=True)
+    thread.start()
+    return thread
+
+
 def load_dima_taxonomy() -> Dict[str, Dict]:
     """
     Load DIMA taxonomy (convenience function).
@@ -1,12 +1,64 @@
 """
 DIMA-Aware Prompt Engineering
 Builds enhanced prompts with full DIMA taxonomy context and few-shot examples.
+
+Prompt tiers (DIMA_PROMPT_TIER):
+- full: the whole 130-technique taxonomy, few-shot examples and embedding hints
+- compact: only the techniques retrieved by the embedding search, with their
+  family and definition (no full taxonomy, no generic few-shot examples)
+- auto (default): compact when retrieval is confident, full otherwise (see
+  select_prompt_tier)
 """
-from typing import Dict, List, Optional
+import os
+from typing import Dict, List, Optional, Tuple
 from dima_detector import get_detector
 
+# Maximum content chars per prompt (longer content is map-reduced by deep.py)
+MAX_CONTENT_CHARS = int(os.getenv("DIMA_MAX_CONTENT_CHARS", "8000"))
+
+# Prompt tier selection (auto mode escalates to the full taxonomy on weak or flat retrieval)
+PROMPT_TIER = os.getenv("DIMA_PROMPT_TIER", "auto").lower()
+TIER_MIN_CANDIDATES = int(os.getenv("DIMA_TIER_MIN_CANDIDATES", "3"))
+TIER_MIN_TOP_SIMILARITY = float(os.getenv("DIMA_TIER_MIN_TOP_SIMILARITY", "0.45"))
+TIER_MIN_SPREAD = float(os.getenv("DIMA_TIER_MIN_SPREAD", "0.05"))
+
+
+def select_prompt_tier(similar_techniques: Optional[List[Dict]], tier: str = PROMPT_TIER) -> Tuple[str, str]:
+    """
+    Choose the prompt tier for an analysis.
+
+    In auto mode the compact tier is used only when retrieval looks reliable:
+    enough candidates, a strong best match, and a similarity spread (best -
+    last candidate) showing the ranking separates the candidates. A flat
+    top-k means relevant techniques likely sit just below the cutoff, so the
+    prompt escalates to the full taxonomy.
+
+    Args:
+        similar_techniques: Embedding hints (ranked, with 'similarity')
+        tier: "full", "compact" or "auto"
 
-def build_dima_aware_prompt(content: str, metadata: Dict, language: str = "fr") -> str:
+    Returns:
+        (tier used, reason)
+    """
+    candidates = similar_techniques or []
+    if tier == "full":
+        return "full", "configured"
+    if not candidates:
+        return "full", "no_candidates"
+    if tier == "compact":
+        return "compact", "configured"
+
+    similarities = [tech.get("similarity", 0.0) for tech in candidates]
+    if len(candidates) < TIER_MIN_CANDIDATES:
+        return "full", "few_candidates"
+    if similarities[0] < TIER_MIN_TOP_SIMILARITY:
+        return "full", "low_similarity"
+    if similarities[0] - similarities[-1] < TIER_MIN_SPREAD:
+        return "full", "flat_similarity"
+    return "compact", "confident_retrieval"
+
+
+def build_dima_aware_prompt(content: str, metadata: Dict, language: str = "fr", compact: bool = False, detector=None) -> str:
     """
     Build DIMA-aware analysis prompt with full taxonomy context (M2.1).
     
@@ -16,14 +68,16 @@ def build_dima_aware_prompt(content: str, metadata: Dict, language: str = "fr")
         content: Text content to analyze
         metadata: Metadata dictionary
         language: Language code ("fr" or "en")
+        compact: Ask for the compact structured-output format
+        detector: DIMADetector to use (default: current global instance)
     
     Returns:
         Complete prompt string
     """
-    return build_hybrid_prompt(content, metadata, similar_techniques=None, language=language)
+    return build_hybrid_prompt(content, metadata, similar_techniques=None, language=language, compact=compact, detector=detector)
 
 
-def build_hybrid_prompt(content: str, metadata: Dict, similar_techniques: List[Dict] = None, language: str = "fr") -> str:
+def build_hybrid_prompt(content: str, metadata: Dict, similar_techniques: List[Dict] = None, language: str = "fr", compact: bool = False, detector=None, include_few_shot: bool = True, max_hints: int = 5, tier: str = "full") -> str:
     """
     Build hybrid prompt with DIMA taxonomy + embedding similarity hints (M2.2).
     
@@ -32,21 +86,30 @@ def build_hybrid_prompt(content: str, metadata: Dict, similar_techniques: List[D
         metadata: Metadata dictionary (title, description, platform, url)
         similar_techniques: Top-K similar techniques from embeddings (optional)
         language: Language code ("fr" or "en")
+        compact: Ask for the compact structured-output format (codes, quotes, enums)
+        detector: DIMADetector to use (default: current global instance); pass
+            the instance pinned for the request so a hot reload cannot mix versions
+        include_few_shot: Include the few-shot examples (dropped first to fit the token budget)
+        max_hints: Maximum embedding hints to list (0 = no hints section)
+        tier: "full" (whole taxonomy) or "compact" (retrieved techniques only,
+            see select_prompt_tier); compact requires similar_techniques
     
     Returns:
         Enhanced prompt with semantic similarity hints
     """
-    detector = get_detector()
+    detector = detector or get_detector()
     
-    # Get compact taxonomy string
-    taxonomy_context = detector.build_compact_taxonomy_string()
-    
-    # Get few-shot examples
-    few_shot_examples = _build_few_shot_section(language)
+    if tier == "compact" and similar_techniques:
+        # Retrieved candidates with definitions replace the taxonomy, few-shot and hints sections
+        taxonomy_context = _build_candidate_section(similar_techniques, language, detector)
+        few_shot_examples = ""
+    else:
+        taxonomy_context = detector.build_compact_taxonomy_string()
+        few_shot_examples = _build_few_shot_section(language, detector) if include_few_shot else ""
     
     # Build embedding hints section if available
     embedding_hints = ""
-    if similar_techniques and len(similar_techniques) > 0:
+    if similar_techniques and max_hints > 0 and tier != "compact":
         if language == "en":
             embedding_hints = "\n🔍 SEMANTICALLY SIMILAR TECHNIQUES (detected by embedding analysis):\n"
             embedding_hints += "These techniques have strong semantic similarity with the analyzed content.\n"
@@ -56,7 +119,7 @@ def build_hybrid_prompt(content: str, metadata: Dict, similar_techniques: List[D
             embedding_hints += "Ces techniques ont une forte similarité sémantique avec le contenu analysé.\n"
             embedding_hints += "PRIORISE leur détection si le contenu correspond:\n\n"
         
-        for tech in similar_techniques[:5]:  # Top 5
+        for tech in similar_techniques[:max_hints]:
             if language == "en":
                 tech_name = tech.get('name_en', tech.get('name', ''))
             else:
@@ -78,15 +141,63 @@ def build_hybrid_prompt(content: str, metadata: Dict, similar_techniques: List[D
         taxonomy_context=taxonomy_context,
         embedding_hints=embedding_hints,
         few_shot_examples=few_shot_examples,
+        output_format=_get_output_format(language, compact),
         title=metadata.get('title', 'N/A'),
         description=metadata.get('description', 'N/A'),
         platform=metadata.get('platform', 'unknown'),
-        content=content[:8000]
+        content=content[:MAX_CONTENT_CHARS]
     )
     
     return prompt
 
 
+def _build_candidate_section(similar_techniques: List[Dict], language: str = "fr", detector=None) -> str:
+    """
+    Build the compact-tier taxonomy section: retrieved techniques grouped by
+    family, each with its definition (semantic features) and keywords.
+    
+    Args:
+        similar_techniques: Embedding hints (ranked, with 'code' and 'similarity')
+        language: Language code ("fr" or "en")
+        detector: DIMADetector to use (default: current global instance)
+    
+    Returns:
+        Candidate techniques section
+    """
+    detector = detector or get_detector()
+    if language == "en":
+        lines = [
+            "CANDIDATE DIMA TECHNIQUES (selected by semantic search among the 130 techniques):",
+            "Only cite the codes below.",
+            ""
+        ]
+    else:
+        lines = [
+            "TECHNIQUES DIMA CANDIDATES (sélectionnées par recherche sémantique parmi les 130 techniques) :",
+            "Cite uniquement les codes ci-dessous.",
+            ""
+        ]
+    
+    by_family: Dict[str, List[str]] = {}
+    for tech in similar_techniques:
+        technique = detector.get_technique(tech.get("code", ""))
+        if not technique:
+            continue
+        name = technique['name_en'] if language == "en" else technique['name_fr']
+        line = f"- {technique['code']}: {name} — {technique['semantic_features']}"
+        if technique.get('example_keywords'):
+            keywords = technique['example_keywords'].replace(",", ", ")
+            line += f" ({'keywords' if language == 'en' else 'mots-clés'}: {keywords})"
+        line += f" [sim {tech.get('similarity', 0.0):.2f}]"
+        by_family.setdefault(technique['family'], []).append(line)
+    
+    for family, family_lines in by_family.items():
+        lines.append(f"{'FAMILY' if language == 'en' else 'FAMILLE'} {family.upper()}:")
+        lines.extend(family_lines)
+        lines.append("")
+    return "\n".join(lines)
+
+
 def _get_prompt_template(language: str = "fr") -> str:
     """Get language-specific prompt template."""
     if language == "en":
@@ -128,43 +239,7 @@ Analyze this content to identify:
    - Omission of crucial information
    - False equivalences (TE-56)
 
-FOR EACH DETECTED TECHNIQUE:
-- Cite the exact DIMA CODE (e.g., TE-58)
-- Indicate the DIMA FAMILY (e.g., "Diversion")
-- Provide the NAME in English (e.g., "Conspiracy theory")
-- Extract an exact QUOTATION as evidence
-- Assess SEVERITY: high/medium/low
-- Provide a detailed EXPLANATION (2-3 sentences)
-
-RESPOND ONLY IN VALID JSON in this exact format (in English):
-{{
-  "propaganda_score": 0-100,
-  "conspiracy_score": 0-100,
-  "misinfo_score": 0-100,
-  "overall_risk": 0-100,
-  "content_summary": "Objective summary of the analyzed content in 2-3 sentences (WHO says WHAT, HOW, IN WHAT CONTEXT)",
-  "techniques": [
-    {{
-      "dima_code": "TE-XX",
-      "dima_family": "Family name",
-      "name": "Technique name in English",
-      "evidence": "Exact quotation from the content that illustrates this technique",
-      "severity": "high/medium/low",
-      "explanation": "Detailed explanation of how this technique is used (2-3 sentences)",
-      "contextual_impact": "Why this technique is particularly effective/dangerous IN THIS SPECIFIC CONTEXT (1-2 sentences)"
-    }}
-  ],
-  "technique_interactions": "If multiple techniques reinforce each other, explain their synergies (e.g., fear + scapegoating = double manipulation). Otherwise: null",
-  "claims": [
-    {{
-      "claim": "Textual claim extracted from the content",
-      "confidence": "supported/unsupported/misleading",
-      "issues": ["issue 1", "issue 2"],
-      "reasoning": "Explanation of the judgment on this claim"
-    }}
-  ],
-  "summary": "Detailed analysis in 3-4 sentences: summary of identified techniques, risk level, and potential impact on the audience"
-}}
+{output_format}
 
 METADATA:
 Title: {title}
@@ -213,7 +288,68 @@ Analyse ce contenu pour identifier :
    - Omission d'informations cruciales
    - Fausses équivalences (TE-56)
 
-POUR CHAQUE TECHNIQUE DÉTECTÉE:
+{output_format}
+
+MÉTADONNÉES :
+Titre : {title}
+Description : {description}
+Plateforme : {platform}
+
+CONTENU À ANALYSER :
+{content}
+"""
+
+
+def _get_output_format(language: str = "fr", compact: bool = False) -> str:
+    """
+    Get the output format section of the prompt.
+
+    The verbose format asks for free-text explanations per technique/claim.
+    The compact format (structured outputs) asks for codes, quotes and enums
+    only; explanations are rendered locally from the taxonomy.
+    """
+    if compact:
+        return _get_compact_output_format(language)
+    if language == "en":
+        return """FOR EACH DETECTED TECHNIQUE:
+- Cite the exact DIMA CODE (e.g., TE-58)
+- Indicate the DIMA FAMILY (e.g., "Diversion")
+- Provide the NAME in English (e.g., "Conspiracy theory")
+- Extract an exact QUOTATION as evidence
+- Assess SEVERITY: high/medium/low
+- Provide a detailed EXPLANATION (2-3 sentences)
+
+RESPOND ONLY IN VALID JSON in this exact format (in English):
+{
+  "propaganda_score": 0-100,
+  "conspiracy_score": 0-100,
+  "misinfo_score": 0-100,
+  "overall_risk": 0-100,
+  "content_summary": "Objective summary of the analyzed content in 2-3 sentences (WHO says WHAT, HOW, IN WHAT CONTEXT)",
+  "techniques": [
+    {
+      "dima_code": "TE-XX",
+      "dima_family": "Family name",
+      "name": "Technique name in English",
+      "evidence": "Exact quotation from the content that illustrates this technique",
+      "severity": "high/medium/low",
+      "explanation": "Detailed explanation of how this technique is used (2-3 sentences)",
+      "contextual_impact": "Why this technique is particularly effective/dangerous IN THIS SPECIFIC CONTEXT (1-2 sentences)"
+    }
+  ],
+  "technique_interactions": "If multiple techniques reinforce each other, explain their synergies (e.g., fear + scapegoating = double manipulation). Otherwise: null",
+  "claims": [
+    {
+      "claim": "Textual claim extracted from the content",
+      "confidence": "supported/unsupported/misleading",
+      "issues": ["issue 1", "issue 2"],
+      "reasoning": "Explanation of the judgment on this claim"
+    }
+  ],
+  "summary": "Detailed analysis in 3-4 sentences: summary of identified techniques, risk level, and potential impact on the audience"
+}"""
+    else:
+        return """POUR CHAQUE TECHNIQUE DÉTECTÉE:
 - Cite le CODE DIMA exact (ex: TE-58)
 - Indique la FAMILLE DIMA (ex: "Diversion")
 - Fournis le NOM en français (ex: "Théorie du complot")
@@ -222,14 +358,14 @@ POUR CHAQUE TECHNIQUE DÉTECTÉE:
 - Fournis une EXPLICATION détaillée (2-3 phrases)
 
 RÉPONDS UNIQUEMENT EN JSON VALIDE dans ce format exact (en français) :
-{{
+{
   "propaganda_score": 0-100,
   "conspiracy_score": 0-100,
   "misinfo_score": 0-100,
   "overall_risk": 0-100,
   "content_summary": "Résumé objectif du contenu analysé en 2-3 phrases (QUI dit QUOI, COMMENT, DANS QUEL CONTEXTE)",
   "techniques": [
-    {{
+    {
       "dima_code": "TE-XX",
       "dima_family": "Nom de la famille",
       "name": "Nom de la technique en français",
@@ -237,28 +373,57 @@ RÉPONDS UNIQUEMENT EN JSON VALIDE dans ce format exact (en français) :
       "severity": "high/medium/low",
       "explanation": "Explication détaillée de comment cette technique est utilisée (2-3 phrases)",
       "contextual_impact": "Pourquoi cette technique est particulièrement efficace/dangereuse DANS CE CONTEXTE précis (1-2 phrases)"
-    }}
+    }
   ],
   "technique_interactions": "Si plusieurs techniques se renforcent mutuellement, explique leurs synergies (ex: peur + bouc émissaire = double manipulation). Sinon: null",
   "claims": [
-    {{
+    {
       "claim": "Affirmation textuelle extraite du contenu",
       "confidence": "supported/unsupported/misleading",
       "issues": ["problème 1", "problème 2"],
       "reasoning": "Explication du jugement sur cette affirmation"
-    }}
+    }
   ],
   "summary": "Analyse détaillée en 3-4 phrases : résumé des techniques identifiées, niveau de risque, et impact potentiel sur l'audience"
-}}
+}"""
 
-MÉTADONNÉES :
-Titre : {title}
-Description : {description}
-Plateforme : {platform}
 
-CONTENU À ANALYSER :
-{content}
-"""
+def _get_compact_output_format(language: str = "fr") -> str:
+    """Get the compact (structured outputs) format section of the prompt."""
+    if language == "en":
+        return """FOR EACH DETECTED TECHNIQUE, return only:
+- code: the exact DIMA CODE (e.g., TE-58)
+- severity: high/medium/low
+- quote: a SHORT exact quotation from the content (max 20 words, copied verbatim)
+- impact: why this technique is effective IN THIS CONTEXT (1 short sentence)
+
+FOR EACH CLAIM, return only:
+- text: the claim, copied from the content
+- verdict: supported/unsupported/misleading
+- issues: issue codes among unsourced, out_of_context, misleading_statistics, correlation_causation, omission, false_equivalence, exaggeration, unfalsifiable, logical_fallacy
+
+Scores are integers 0-100 (propaganda, conspiracy, misinfo, overall).
+summary: 1-2 sentences in English.
+content_summary: objective summary of the content in 1-2 sentences (WHO says WHAT, HOW).
+interactions: 1 sentence on how the techniques reinforce each other, or null.
+Do NOT write explanations: they are generated from the DIMA taxonomy."""
+    else:
+        return """POUR CHAQUE TECHNIQUE DÉTECTÉE, renvoie uniquement :
+- code : le CODE DIMA exact (ex: TE-58)
+- severity : high/medium/low
+- quote : une CITATION exacte et COURTE du contenu (20 mots max, copiée mot pour mot)
+- impact : pourquoi cette technique est efficace DANS CE CONTEXTE (1 phrase courte)
+
+POUR CHAQUE AFFIRMATION, renvoie uniquement :
+- text : l'affirmation, copiée du contenu
+- verdict : supported/unsupported/misleading
+- issues : codes de problèmes parmi unsourced, out_of_context, misleading_statistics, correlation_causation, omission, false_equivalence, exaggeration, unfalsifiable, logical_fallacy
+
+Les scores sont des entiers 0-100 (propaganda, conspiracy, misinfo, overall).
+summary : 1-2 phrases en français.
+content_summary : résumé objectif du contenu en 1-2 phrases (QUI dit QUOI, COMMENT).
+interactions : 1 phrase sur la façon dont les techniques se renforcent, ou null.
+N'écris PAS d'explications : elles sont générées à partir de la taxonomie DIMA."""
 
 
 def _get_system_instructions(language: str = "fr") -> str:
@@ -275,17 +440,25 @@ IMPORTANT: Tu dois citer les CODES DIMA exacts (ex: TE-58) pour chaque technique
 La taxonomie DIMA est la référence académique pour identifier 130 techniques de manipulation."""
 
 
-def _build_few_shot_section(language: str = "fr") -> str:
+def _build_few_shot_section(language: str = "fr", detector=None) -> str:
     """
     Build few-shot examples section with high-priority techniques.
     
+    The section only depends on the taxonomy version, so it is cached on the
+    detector (see warm_prompt_cache).
+    
     Args:
         language: Language code ("fr" or "en")
+        detector: DIMADetector to use (default: current global instance)
     
     Returns:
         Formatted few-shot examples string
     """
-    detector = get_detector()
+    detector = detector or get_detector()
+    cache_key = f"few_shot:{language}"
+    cached = detector.prompt_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
     # High-priority techniques for few-shot prompting
     priority_codes = ["TE-01", "TE-02", "TE-58", "TE-62", "TE-31"]
@@ -327,9 +500,17 @@ Contenu: "{example['content_fr']}"
 
 """
     
+    detector.prompt_cache[cache_key] = examples_text
     return examples_text
 
 
+def warm_prompt_cache(detector) -> None:
+    """Precompute the taxonomy-dependent prompt prefixes of a detector (used before a hot-reload swap)."""
+    detector.build_compact_taxonomy_string()
+    for language in ("fr", "en"):
+        _build_few_shot_section(language, detector)
+
+
 def build_legacy_prompt(content: str, metadata: Dict) -> str:
     """
     Build legacy prompt (without DIMA codes) for backward compatibility testing.
@@ -405,7 +586,7 @@ Description : {metadata.get('description', 'N/A')}
 Plateforme : {metadata.get('platform', 'unknown')}
 
 CONTENU À ANALYSER :
-{content[:8000]}
+{content[:MAX_CONTENT_CHARS]}
 """
     
     return prompt
@@ -425,7 +606,8 @@ if __name__ == "__main__":
     prompt = build_dima_aware_prompt(test_content, test_metadata)
     
     print(f"\n📏 Prompt length: {len(prompt)} chars (~{len(prompt.split())} words)")
-    print(f"   Estimated tokens: ~{len(prompt) // 4}")
+    from token_budget import count_tokens
+    print(f"   Prompt tokens: {count_tokens(prompt)}")
     
     print("\n📝 Prompt preview (first 1000 chars):")
     print(prompt[:1000])
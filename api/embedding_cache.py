@@ -0,0 +1,116 @@
+"""
+Query Embedding Cache — bounded LRU of encoder outputs.
+
+The same content (a shared tweet, a retried request, a transcript analyzed in
+both languages) is otherwise re-encoded by the transformer on every call.
+Vectors are stored as float16 in one preallocated (capacity, dim) array; the
+slot of the least recently used entry is reused when the cache is full, so
+memory stays fixed at capacity × dim × 2 bytes (~0.75 MB for 1024 × 384).
+
+Keys are hashes of the normalized text (Unicode NFKC, collapsed whitespace).
+"""
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def query_cache_key(text: str) -> str:
+    """Hash of a query text after Unicode and whitespace normalization."""
+    normalized = _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU cache of L2-normalized query vectors (float16 ring buffer)."""
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self._vectors: Optional[np.ndarray] = None  # Allocated on first insert (dim known)
+        self._slots: "OrderedDict[str, int]" = OrderedDict()  # key → row, LRU first
+        self._next_slot = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def encode(self, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Embed texts, calling encode_fn only for texts not in the cache.
+
+        Args:
+            texts: Query texts
+            encode_fn: Encodes a list of texts to an (n, dim) float32 array
+
+        Returns:
+            (len(texts), dim) float32, L2-normalized
+        """
+        keys = [query_cache_key(text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                if key in found:
+                    continue
+                slot = self._slots.get(key)
+                if slot is not None:
+                    self._slots.move_to_end(key)
+                    found[key] = self._vectors[slot].astype("float32")
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+
+        # Encode each distinct missing text once, outside the lock
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = np.asarray(encode_fn(list(missing.values())), dtype="float32")
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            new_entries = dict(zip(missing.keys(), vectors))
+            found.update(new_entries)
+            self._store(new_entries)
+
+        return np.stack([found[key] for key in keys])
+
+    def _store(self, entries: Dict[str, np.ndarray]):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            if self._vectors is None:
+                dim = len(next(iter(entries.values())))
+                self._vectors = np.zeros((self.capacity, dim), dtype="float16")
+            for key, vector in entries.items():
+                slot = self._slots.get(key)
+                if slot is None:
+                    if self._next_slot < self.capacity:
+                        slot = self._next_slot
+                        self._next_slot += 1
+                    else:
+                        _, slot = self._slots.popitem(last=False)
+                        self.evictions += 1
+                    self._slots[key] = slot
+                self._slots.move_to_end(key)
+                self._vectors[slot] = vector
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._slots),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "bytes": 0 if self._vectors is None else int(self._vectors.nbytes),
+            }
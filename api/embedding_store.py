@@ -0,0 +1,351 @@
+"""
+DIMA Embedding Artifact — versioned, memory-mapped technique embeddings.
+
+Layout (data/dima_embeddings/<model>/, one directory per encoder model so
+several models can be built and compared side by side):
+- vectors-<build>.npy   pre-normalized float32/float16 rows
+- index-<build>.faiss   FAISS inner-product index over the same rows (type
+                        chosen by ann_index from the row count)
+- manifest.json         format version, model, dtype, dim, code order, per-row
+                        text hashes (incremental rebuilds), CSV hash,
+                        and the file names of the current build
+
+Both files are loaded with mmap, so all workers on a host share one page-cache
+copy. The manifest is swapped last (atomic rename), so readers never see a
+half-written build. Writers hold an exclusive flock on write.lock while they
+write, so two workers rebuilding at once do not delete each other's files; the
+build that was replaced is kept for readers that just read the old manifest,
+and only older builds are removed. Any mismatch (model, CSV hash, codes) raises
+ArtifactMismatch and the caller rebuilds instead of mislabelling techniques.
+"""
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import re
+import tempfile
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import faiss
+
+from ann_index import build_index, index_kind as get_index_kind, read_index
+
+
+ARTIFACT_VERSION = 1
+DEFAULT_MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+DEFAULT_ARTIFACT_DIR = Path(__file__).parent.parent / "data" / "dima_embeddings"
+
+
+class ArtifactMismatch(Exception):
+    """Raised when the on-disk artifact does not match the current taxonomy/model."""
+
+
+def model_artifact_dir(base_dir: Path, model_name: str) -> Path:
+    """Artifact directory of one encoder model (e.g. .../paraphrase-multilingual-MiniLM-L12-v2)."""
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model_name.removeprefix("sentence-transformers/")).strip("_")
+    return Path(base_dir) / slug
+
+
+def technique_text(technique: Dict) -> str:
+    """Text embedded for a technique (name + semantic features + keywords)."""
+    return (
+        f"{technique['name_fr']}. "
+        f"{technique['semantic_features']}. "
+        f"Exemples: {technique['example_keywords']}"
+    )
+
+
+@contextlib.contextmanager
+def artifact_lock(artifact_dir: Path):
+    """Exclusive lock on an artifact directory (blocks until other writers are done)."""
+    with open(Path(artifact_dir) / "write.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def text_sha256(text: str) -> str:
+    """SHA-256 of an embedded text (used to reuse unchanged rows on rebuild)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_sha256(path) -> str:
+    """SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_artifact(
+    artifact_dir: Path,
+    vectors: np.ndarray,
+    codes: List[str],
+    model_name: str,
+    csv_sha256: str,
+    dtype: str = "float32",
+    text_hashes: Optional[List[str]] = None,
+    index_kind: str = "auto"
+) -> Dict:
+    """
+    Write a new artifact build atomically.
+
+    Args:
+        artifact_dir: Target directory
+        vectors: Embeddings (rows in `codes` order), normalized here
+        codes: DIMA code of each row
+        model_name: Encoder model name
+        csv_sha256: Hash of the taxonomy CSV the vectors were built from
+        dtype: "float32" or "float16"
+        text_hashes: text_sha256 of each row's source text (enables incremental rebuilds)
+        index_kind: ann_index kind ("auto" chooses from the row count; small
+            artifacts stay flat and memory-mapped)
+
+    Returns:
+        Written manifest
+    """
+    artifact_dir = Path(artifact_dir)
+    artifact_dir.mkdir(parents=True, exist_ok=True)
+
+    vectors = np.array(vectors, dtype="float32")
+    faiss.normalize_L2(vectors)
+
+    with artifact_lock(artifact_dir):
+        try:
+            replaced = read_manifest(artifact_dir)
+        except (ArtifactMismatch, ValueError, OSError):
+            replaced = {}
+
+        build_id = uuid.uuid4().hex[:12]
+        vectors_name = f"vectors-{build_id}.npy"
+        index_name = f"index-{build_id}.faiss"
+        np.save(artifact_dir / vectors_name, vectors.astype(dtype))
+        index = build_index(vectors, index_kind, dtype)
+        faiss.write_index(index, str(artifact_dir / index_name))
+
+        manifest = {
+            "version": ARTIFACT_VERSION,
+            "build_id": build_id,
+            "model": model_name,
+            "dtype": dtype,
+            "index_kind": get_index_kind(index),
+            "dim": int(vectors.shape[1]),
+            "normalized": True,
+            "csv_sha256": csv_sha256,
+            "codes": list(codes),
+            "text_hashes": list(text_hashes or []),
+            "vectors_file": vectors_name,
+            "index_file": index_name,
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=artifact_dir, prefix="manifest.", suffix=".tmp")
+        try:
+            os.fchmod(fd, 0o644)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, artifact_dir / "manifest.json")
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+        # Remove builds older than the replaced one (readers that mmap'd them keep
+        # their inode; the replaced build stays for readers of the old manifest)
+        keep = {vectors_name, index_name, replaced.get("vectors_file"), replaced.get("index_file")}
+        for path in artifact_dir.glob("*-*.*"):
+            if path.name not in keep and path.suffix in (".npy", ".faiss"):
+                path.unlink(missing_ok=True)
+
+    return manifest
+
+
+def read_manifest(artifact_dir: Path) -> Dict:
+    """Read an artifact manifest (raises ArtifactMismatch if missing/invalid)."""
+    manifest_path = Path(artifact_dir) / "manifest.json"
+    if not manifest_path.exists():
+        raise ArtifactMismatch(f"no manifest in {artifact_dir}")
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != ARTIFACT_VERSION:
+        raise ArtifactMismatch(f"artifact version {manifest.get('version')} != {ARTIFACT_VERSION}")
+    return manifest
+
+
+def load_artifact(
+    artifact_dir: Path,
+    expected_codes: Iterable[str],
+    model_name: str,
+    csv_sha256: str,
+    unique_codes: bool = True
+) -> Tuple[np.ndarray, object, Dict]:
+    """
+    Load and validate an artifact (memory-mapped).
+
+    Args:
+        artifact_dir: Artifact directory
+        expected_codes: Codes of the loaded taxonomy
+        model_name: Encoder model the caller will query with
+        csv_sha256: Hash of the source data (taxonomy CSV, or example corpus)
+        unique_codes: One row per code (taxonomy); False for corpora with
+            several rows per code, whose row order must match exactly
+
+    Returns:
+        (vectors memmap, FAISS index, manifest); row i is manifest["codes"][i]
+
+    Raises:
+        ArtifactMismatch: If the artifact is missing or stale
+    """
+    artifact_dir = Path(artifact_dir)
+    manifest = read_manifest(artifact_dir)
+
+    if manifest["model"] != model_name:
+        raise ArtifactMismatch(f"model {manifest['model']} != {model_name}")
+    if manifest["csv_sha256"] != csv_sha256:
+        raise ArtifactMismatch("taxonomy CSV changed since the artifact was built")
+    if unique_codes:
+        if set(manifest["codes"]) != set(expected_codes) or len(manifest["codes"]) != len(set(manifest["codes"])):
+            raise ArtifactMismatch("artifact codes do not match the taxonomy")
+    elif manifest["codes"] != list(expected_codes):
+        raise ArtifactMismatch("artifact rows do not match the corpus")
+
+    vectors_path = artifact_dir / manifest["vectors_file"]
+    index_path = artifact_dir / manifest["index_file"]
+    if not vectors_path.exists() or not index_path.exists():
+        raise ArtifactMismatch("artifact files missing")
+
+    vectors = np.load(vectors_path, mmap_mode="r")
+    if vectors.shape != (len(manifest["codes"]), manifest["dim"]):
+        raise ArtifactMismatch(f"vectors shape {vectors.shape} does not match manifest")
+
+    # Flat indexes are memory-mapped; trained (IVF/HNSW) indexes are read into memory
+    index = read_index(index_path, manifest.get("index_kind", "flat"))
+    if index.ntotal != len(manifest["codes"]):
+        raise ArtifactMismatch("FAISS index size does not match manifest")
+
+    return vectors, index, manifest
+
+
+def _reusable_rows(artifact_dir: Path, model_name: str) -> Tuple[Optional[np.ndarray], Dict[str, int]]:
+    """(vectors memmap, text hash → row) of the current artifact, if built with the same model."""
+    try:
+        manifest = read_manifest(artifact_dir)
+    except (ArtifactMismatch, ValueError, OSError):
+        return None, {}
+    if manifest.get("model") != model_name or not manifest.get("text_hashes"):
+        return None, {}
+    vectors_path = Path(artifact_dir) / manifest["vectors_file"]
+    if not vectors_path.exists():
+        return None, {}
+    vectors = np.load(vectors_path, mmap_mode="r")
+    if len(vectors) != len(manifest["text_hashes"]):
+        return None, {}
+    return vectors, {digest: row for row, digest in enumerate(manifest["text_hashes"])}
+
+
+def encode_incremental(
+    texts: List[str],
+    model,
+    model_name: str,
+    artifact_dir: Path,
+    force: bool = False,
+    batch_size: int = 64,
+    show_progress_bar: bool = False
+) -> Tuple[np.ndarray, List[str], int]:
+    """
+    Embed texts, reusing the rows of the current artifact whose text is unchanged.
+
+    Args:
+        texts: Row texts (new artifact order)
+        model: SentenceTransformer used for encoding
+        model_name: Encoder model name (rows are only reused from the same model)
+        artifact_dir: Directory of the current artifact
+        force: Re-encode every row
+        batch_size: Encoder batch size
+        show_progress_bar: Show the encoder progress bar
+
+    Returns:
+        (float32 vectors, text hashes, number of rows sent to the encoder);
+        vectors is (0, dim) when there are no texts
+    """
+    hashes = [text_sha256(text) for text in texts]
+
+    previous, previous_rows = (None, {}) if force else _reusable_rows(artifact_dir, model_name)
+    reused = [(row, previous_rows[digest]) for row, digest in enumerate(hashes) if digest in previous_rows]
+    todo = [row for row, digest in enumerate(hashes) if digest not in previous_rows]
+
+    encoded = None
+    if todo:
+        encoded = model.encode(
+            [texts[row] for row in todo],
+            batch_size=batch_size,
+            show_progress_bar=show_progress_bar,
+            convert_to_numpy=True
+        )
+        encoded = np.asarray(encoded, dtype="float32")
+
+    if encoded is not None:
+        dim = encoded.shape[1]
+    elif previous is not None:
+        dim = previous.shape[1]
+    else:
+        # No texts and no artifact to reuse: empty matrix of the encoder's width
+        dim = model.get_sentence_embedding_dimension() or 0
+    vectors = np.empty((len(texts), dim), dtype="float32")
+    if reused:
+        new_rows, old_rows = (np.array(rows) for rows in zip(*reused))
+        vectors[new_rows] = previous[old_rows]
+    if encoded is not None:
+        vectors[todo] = encoded
+
+    return vectors, hashes, len(todo)
+
+
+def build_artifact(
+    taxonomy: Dict[str, Dict],
+    model,
+    model_name: str,
+    csv_sha256: str,
+    artifact_dir: Optional[Path] = None,
+    dtype: str = "float32",
+    force: bool = False,
+    batch_size: int = 64,
+    show_progress_bar: bool = False
+) -> Dict:
+    """
+    Encode techniques and write a new artifact (rows in taxonomy order).
+
+    Rows whose text is unchanged since the current artifact (same model) are
+    copied over; only new or edited techniques go through the encoder. The
+    taxonomy size is not fixed.
+
+    Args:
+        taxonomy: DIMADetector.taxonomy (code → technique dict)
+        model: SentenceTransformer used for encoding
+        model_name: Encoder model name (stored in the manifest)
+        csv_sha256: Hash of the taxonomy CSV
+        artifact_dir: Target directory (default: model_artifact_dir(DEFAULT_ARTIFACT_DIR, model_name))
+        dtype: "float32" or "float16"
+        force: Re-encode every row
+        batch_size: Encoder batch size
+        show_progress_bar: Show the encoder progress bar
+
+    Returns:
+        Written manifest (with "encoded" = number of rows sent to the encoder)
+    """
+    if artifact_dir is None:
+        artifact_dir = model_artifact_dir(DEFAULT_ARTIFACT_DIR, model_name)
+
+    codes = list(taxonomy.keys())
+    texts = [technique_text(taxonomy[code]) for code in codes]
+    vectors, hashes, encoded = encode_incremental(
+        texts, model, model_name, artifact_dir, force, batch_size, show_progress_bar
+    )
+
+    manifest = write_artifact(artifact_dir, vectors, codes, model_name, csv_sha256, dtype, text_hashes=hashes)
+    manifest["encoded"] = encoded
+    return manifest
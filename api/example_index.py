@@ -0,0 +1,152 @@
+"""
+DIMA Example Index — kNN voting over annotated example sentences.
+
+The technique artifact holds one centroid-like vector per technique (name +
+features + keywords). This second index holds one vector per annotated example
+sentence in data/dima_examples/ (FR and EN), each mapped back to its DIMA code.
+A query's k nearest sentences vote for their techniques, which catches content
+that resembles real examples more than the technique description.
+
+Stored next to the technique artifact (data/dima_embeddings/<model>/examples/),
+built incrementally (only new/edited sentences are encoded), flat and
+memory-mapped while small, approximate (ann_index) once the corpus grows.
+"""
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from embedding_store import ArtifactMismatch, encode_incremental, load_artifact, write_artifact
+from tracing import get_logger
+
+
+EXAMPLE_KNN_K = int(os.getenv("DIMA_EXAMPLE_KNN_K", "10"))
+
+logger = get_logger("example_index")
+
+# Example text fields embedded for each annotated example
+EXAMPLE_TEXT_FIELDS = ("content_fr", "content_en")
+
+
+def example_sentences(examples: Dict[str, List[Dict]]) -> Tuple[List[str], List[str]]:
+    """
+    Flatten annotated examples into (codes, texts) rows.
+
+    Args:
+        examples: DIMADetector.examples (code → list of example dicts)
+
+    Returns:
+        (DIMA code of each row, sentence of each row)
+    """
+    codes, texts = [], []
+    for code, items in examples.items():
+        for example in items:
+            for field in EXAMPLE_TEXT_FIELDS:
+                text = (example.get(field) or "").strip()
+                if text:
+                    codes.append(code)
+                    texts.append(text)
+    return codes, texts
+
+
+def corpus_sha256(codes: List[str], texts: List[str]) -> str:
+    """Hash of the example corpus (row codes + texts, in order)."""
+    digest = hashlib.sha256()
+    for code, text in zip(codes, texts):
+        digest.update(f"{code}\t{text}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ExampleIndex:
+    """kNN index over example sentences; row i belongs to row_codes[i]."""
+
+    def __init__(self, index, row_codes: List[str]):
+        self.index = index
+        self.row_codes = row_codes
+        self._row_codes_array = np.array(row_codes, dtype=object)
+
+    def __len__(self) -> int:
+        return len(self.row_codes)
+
+    @classmethod
+    def load_or_build(
+        cls,
+        examples: Dict[str, List[Dict]],
+        model,
+        model_name: str,
+        artifact_dir: Path,
+        dtype: str = "float32"
+    ) -> Optional["ExampleIndex"]:
+        """
+        Load the example artifact, rebuilding it (incrementally) when stale.
+
+        Args:
+            examples: DIMADetector.examples
+            model: SentenceTransformer (used only for new/edited sentences)
+            model_name: Encoder model name
+            artifact_dir: Example artifact directory
+            dtype: "float32" or "float16"
+
+        Returns:
+            ExampleIndex, or None if there are no example sentences
+        """
+        codes, texts = example_sentences(examples)
+        if not texts:
+            return None
+
+        source_sha256 = corpus_sha256(codes, texts)
+        try:
+            _, index, _ = load_artifact(artifact_dir, codes, model_name, source_sha256, unique_codes=False)
+        except ArtifactMismatch as e:
+            logger.info("🔄 Building example index", sentences=len(texts), reason=str(e))
+            vectors, hashes, encoded = encode_incremental(texts, model, model_name, artifact_dir)
+            manifest = write_artifact(
+                artifact_dir, vectors, codes, model_name, source_sha256, dtype, text_hashes=hashes
+            )
+            logger.info("✅ Example index saved", sentences=len(texts), encoded=encoded, index_kind=manifest["index_kind"])
+            _, index, _ = load_artifact(artifact_dir, codes, model_name, source_sha256, unique_codes=False)
+
+        return cls(index, codes)
+
+    def vote(
+        self,
+        query_embeddings: np.ndarray,
+        k: int = EXAMPLE_KNN_K,
+        min_similarity: float = 0.0,
+        allowed_codes: Optional[set] = None
+    ) -> List[Dict[str, Dict]]:
+        """
+        kNN voting for normalized query embeddings.
+
+        Each of the k nearest sentences above `min_similarity` votes for its
+        technique; a technique's similarity is its best neighbour's.
+
+        Args:
+            query_embeddings: (n, dim) float32, L2-normalized
+            k: Number of neighbours per query
+            min_similarity: Ignore neighbours below this similarity
+            allowed_codes: Only count votes for these codes (family/exclusion filters)
+
+        Returns:
+            Per query: code → {"similarity": float, "votes": int}
+        """
+        k = min(k, len(self.row_codes))
+        similarities, indices = self.index.search(query_embeddings, k)
+
+        results = []
+        for row_similarities, row_indices in zip(similarities, indices):
+            keep = (row_indices >= 0) & (row_similarities >= min_similarity)
+            votes: Dict[str, Dict] = {}
+            for code, similarity in zip(self._row_codes_array[row_indices[keep]], row_similarities[keep].tolist()):
+                if allowed_codes is not None and code not in allowed_codes:
+                    continue
+                entry = votes.get(code)
+                if entry is None:
+                    votes[code] = {"similarity": similarity, "votes": 1}
+                else:
+                    entry["votes"] += 1
+                    entry["similarity"] = max(entry["similarity"], similarity)
+            results.append(votes)
+        return results
@@ -0,0 +1,419 @@
+"""
+Fact-check Retrieval — semantic claim → fact-check matching.
+
+Persistent vector index over the fact-check corpus (data/factchecks.json):
+- vectors.f32     raw L2-normalized float32 rows, append-only, memory-mapped
+- manifest.json   model, dim, row → fact-check entry map, removed rows
+- index.faiss     FAISS index with ids = row numbers (flat IndexIDMap2 while
+                  small, memory-mapped; IVF once ann_index says so)
+
+Adding or removing fact-checks updates the index incrementally. The index is
+retrained only when the corpus outgrows its index type (or 4x its training
+size), so the corpus can grow to millions of entries.
+
+Builds and syncs run under an exclusive flock on build.lock in the index
+directory, so server workers starting together build the index once.
+"""
+import contextlib
+import fcntl
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from tracing import get_logger
+
+try:
+    import numpy as np
+    import faiss
+    from ann_index import build_index, choose_index_kind, configure_index, index_kind, read_index
+    # Encoder is imported lazily (heavy); only check it is installed
+    FACTCHECK_AVAILABLE = importlib.util.find_spec("sentence_transformers") is not None
+except ImportError:
+    FACTCHECK_AVAILABLE = False
+
+
+BASE_DIR = Path(__file__).parent.parent
+DEFAULT_CORPUS_PATH = BASE_DIR / "data" / "factchecks.json"
+DEFAULT_INDEX_DIR = BASE_DIR / "data" / "factcheck_index"
+DEFAULT_MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+# Model name stored in the index manifest (same encoder as the DIMA detector)
+INDEX_MODEL_NAME = os.getenv("EMBEDDING_MODEL", DEFAULT_MODEL_NAME).removeprefix("sentence-transformers/")
+
+MANIFEST_VERSION = 1
+
+logger = get_logger("factcheck")
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """
+    Get the sentence encoder (shared with the DIMA detector when loaded).
+
+    Returns:
+        SentenceTransformer instance
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                try:
+                    from dima_detector import get_detector
+                    detector = get_detector()
+                    if detector.encoder_model is not None:
+                        _model = detector.encoder_model
+                except ImportError:
+                    pass
+                if _model is None:
+                    from sentence_transformers import SentenceTransformer
+                    _model = SentenceTransformer(os.getenv("EMBEDDING_MODEL", DEFAULT_MODEL_NAME))
+    return _model
+
+
+def factcheck_text(factcheck: Dict) -> str:
+    """Text embedded for a fact-check entry (title + body)."""
+    title = factcheck.get("title", "")
+    text = factcheck.get("text", "")
+    return f"{title}. {text}" if text else title
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+@contextlib.contextmanager
+def build_lock(index_dir: Path = DEFAULT_INDEX_DIR):
+    """Exclusive lock on an index directory (blocks while another process builds it)."""
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    with open(index_dir / "build.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _atomic_write_json(path: Path, data: Dict):
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class FactCheckIndex:
+    """Incremental, persistent FAISS index of fact-checks."""
+
+    def __init__(self, index_dir: Path = DEFAULT_INDEX_DIR, model_name: str = DEFAULT_MODEL_NAME):
+        self.index_dir = Path(index_dir)
+        self.model_name = model_name
+        self.vectors_path = self.index_dir / "vectors.f32"
+        self.manifest_path = self.index_dir / "manifest.json"
+        self.index_path = self.index_dir / "index.faiss"
+
+        self.dim: Optional[int] = None
+        self.rows: List[Dict] = []           # row number → {id, title, url, hash}
+        self.removed: set = set()            # removed row numbers
+        self.row_by_id: Dict[str, int] = {}  # live fact-check id → row
+        self.vectors = None                  # np.memmap (rows × dim)
+        self.index = None
+        self.trained_size = 0                # live rows when the index was (re)built
+        self._writable = False
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.row_by_id)
+
+    def load(self) -> bool:
+        """
+        Load manifest, memory-map vectors and the FAISS index.
+
+        Returns:
+            True if an index was found on disk
+        """
+        if not self.manifest_path.exists():
+            return False
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("model") != self.model_name or manifest.get("version") != MANIFEST_VERSION:
+            print(f"⚠️  Fact-check index built with {manifest.get('model')} (v{manifest.get('version')}), ignoring")
+            return False
+
+        with self._lock:
+            self.dim = manifest["dim"]
+            self.rows = manifest["rows"]
+            self.removed = set(manifest.get("removed", []))
+            self.trained_size = manifest.get("trained_size", 0)
+            self.row_by_id = {
+                row["id"]: i for i, row in enumerate(self.rows) if i not in self.removed
+            }
+            if self.rows:
+                self.vectors = np.memmap(self.vectors_path, dtype="float32", mode="r", shape=(len(self.rows), self.dim))
+
+            if self.index_path.exists():
+                # Flat: read-only mmap, workers share one page-cache copy of the index
+                self.index = read_index(self.index_path, manifest.get("index_kind", "flat"))
+                self._writable = False
+            else:
+                self._rebuild_index()
+        print(f"✅ Fact-check index loaded: {len(self)} entries, dim={self.dim}")
+        return True
+
+    def _new_index(self):
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+
+    def _rebuild_index(self):
+        """Rebuild (and retrain) the FAISS index from the memory-mapped vectors (live rows only)."""
+        live = np.array(sorted(self.row_by_id.values()), dtype="int64")
+        if len(live):
+            # Ids must stay removable, so ann_index picks Flat or IVF (no HNSW)
+            self.index = build_index(self.vectors[live], kind="auto", ids=live)
+        else:
+            self.index = self._new_index()
+        self.trained_size = len(live)
+        self._writable = True
+
+    def _maybe_retrain(self):
+        """Rebuild when the corpus outgrew the index type (or 4x its training size for IVF)."""
+        current = index_kind(self.index)
+        desired = choose_index_kind(len(self), removable=True)
+        if desired != current or (current != "flat" and len(self) > 4 * self.trained_size):
+            print(f"🔄 Rebuilding fact-check index: {current} → {desired} ({len(self)} entries)")
+            self._rebuild_index()
+
+    def _ensure_writable(self):
+        """Reload the index in memory (mmap'd indexes are read-only)."""
+        if self.index is None:
+            self.index = self._new_index()
+            self._writable = True
+        elif not self._writable:
+            self.index = faiss.read_index(str(self.index_path))
+            configure_index(self.index)
+            self._writable = True
+
+    def _encode(self, texts: List[str]):
+        vectors = get_model().encode(texts, convert_to_numpy=True, show_progress_bar=False).astype("float32")
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    def add(self, factchecks: List[Dict], batch_size: int = 256) -> int:
+        """
+        Add (or update) fact-checks incrementally.
+
+        Entries whose id already exists with the same text are skipped; changed
+        entries are re-encoded and their previous row is removed.
+
+        Args:
+            factchecks: Fact-check dicts with id, title, text, url
+
+        Returns:
+            Number of rows encoded and added
+        """
+        with self._lock:
+            pending = []
+            stale_rows = []
+            for fc in factchecks:
+                text = factcheck_text(fc)
+                if not fc.get("id") or not text:
+                    continue
+                row = self.row_by_id.get(fc["id"])
+                if row is not None:
+                    if self.rows[row]["hash"] == _text_hash(text):
+                        continue
+                    stale_rows.append(row)
+                pending.append((fc, text))
+
+            if stale_rows:
+                self._remove_rows(stale_rows)
+            if not pending:
+                self._save()
+                return 0
+
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            for start in range(0, len(pending), batch_size):
+                chunk = pending[start:start + batch_size]
+                vectors = self._encode([text for _, text in chunk])
+                if self.dim is None:
+                    self.dim = vectors.shape[1]
+                self._ensure_writable()
+                self._truncate_vectors()
+                first_row = len(self.rows)
+                ids = np.arange(first_row, first_row + len(chunk), dtype="int64")
+
+                # Append-only vector file (no rewrite of existing rows)
+                with open(self.vectors_path, "ab") as f:
+                    f.write(vectors.tobytes())
+                self.index.add_with_ids(vectors, ids)
+
+                for row, (fc, text) in zip(ids.tolist(), chunk):
+                    self.rows.append({
+                        "id": fc["id"],
+                        "title": fc.get("title", ""),
+                        "url": fc.get("url", ""),
+                        "hash": _text_hash(text)
+                    })
+                    self.row_by_id[fc["id"]] = row
+
+            self.vectors = np.memmap(self.vectors_path, dtype="float32", mode="r", shape=(len(self.rows), self.dim))
+            self._maybe_retrain()
+            self._save()
+            return len(pending)
+
+    def _truncate_vectors(self):
+        """Drop trailing bytes not referenced by the manifest (interrupted append)."""
+        expected = len(self.rows) * self.dim * 4
+        if self.vectors_path.exists() and self.vectors_path.stat().st_size != expected:
+            os.truncate(self.vectors_path, expected)
+
+    def remove(self, factcheck_ids: List[str]) -> int:
+        """
+        Remove fact-checks by id (tombstoned in the manifest, dropped from FAISS).
+
+        Returns:
+            Number of entries removed
+        """
+        with self._lock:
+            rows = [self.row_by_id[fc_id] for fc_id in factcheck_ids if fc_id in self.row_by_id]
+            if rows:
+                self._remove_rows(rows)
+                self._save()
+            return len(rows)
+
+    def _remove_rows(self, rows: List[int]):
+        self._ensure_writable()
+        self.index.remove_ids(np.array(rows, dtype="int64"))
+        for row in rows:
+            self.removed.add(row)
+            self.row_by_id.pop(self.rows[row]["id"], None)
+
+    def sync(self, factchecks: List[Dict]) -> Dict:
+        """
+        Make the index match a corpus: add new/changed entries, remove missing ones.
+
+        Returns:
+            Dict with added/removed counts
+        """
+        corpus_ids = {fc.get("id") for fc in factchecks}
+        removed = self.remove([fc_id for fc_id in list(self.row_by_id) if fc_id not in corpus_ids])
+        added = self.add(factchecks)
+        return {"added": added, "removed": removed, "total": len(self)}
+
+    def _save(self):
+        """Persist manifest and FAISS index atomically."""
+        if self.dim is None:
+            return
+        if self._writable and self.index is not None:
+            tmp_path = self.index_path.with_suffix(".faiss.tmp")
+            faiss.write_index(self.index, str(tmp_path))
+            os.replace(tmp_path, self.index_path)
+        _atomic_write_json(self.manifest_path, {
+            "version": MANIFEST_VERSION,
+            "model": self.model_name,
+            "dim": self.dim,
+            "index_kind": index_kind(self.index) if self.index is not None else "flat",
+            "trained_size": self.trained_size,
+            "rows": self.rows,
+            "removed": sorted(self.removed)
+        })
+
+    def search(self, texts: List[str], top_k: int = 3, min_similarity: float = 0.5) -> List[List[Dict]]:
+        """
+        Find the most similar fact-checks for each query text.
+
+        Args:
+            texts: Claim texts
+            top_k: Matches per claim
+            min_similarity: Minimum cosine similarity
+
+        Returns:
+            One list of matches (id, title, url, similarity) per query text
+        """
+        if not texts or self.index is None or len(self) == 0:
+            return [[] for _ in texts]
+
+        queries = self._encode(texts)
+        with self._lock:
+            similarities, rows = self.index.search(queries, min(top_k, len(self)))
+
+        results = []
+        for sims, ids in zip(similarities, rows):
+            matches = []
+            for similarity, row in zip(sims.tolist(), ids.tolist()):
+                if row < 0 or row in self.removed or similarity < min_similarity:
+                    continue
+                entry = self.rows[row]
+                matches.append({
+                    "factcheck_id": entry["id"],
+                    "title": entry["title"],
+                    "url": entry["url"],
+                    "similarity": float(similarity)
+                })
+            results.append(matches)
+        return results
+
+
+def load_corpus(corpus_path: Path = DEFAULT_CORPUS_PATH) -> List[Dict]:
+    """Load fact-check corpus JSON (list of {id, title, url, text})."""
+    with open(corpus_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# Global singleton instance (loaded lazily)
+_index_instance: Optional[FactCheckIndex] = None
+_index_lock = threading.Lock()
+
+
+def load_factcheck_index(build_if_missing: bool = True) -> Optional[FactCheckIndex]:
+    """
+    Get the global fact-check index, loading it from disk (singleton pattern).
+
+    If no index exists yet and `build_if_missing`, it is built from
+    data/factchecks.json (once: other workers wait on build_lock, then load it).
+
+    Returns:
+        FactCheckIndex, or None if embedding libraries are unavailable
+    """
+    global _index_instance
+    if not FACTCHECK_AVAILABLE:
+        return None
+    if _index_instance is None:
+        with _index_lock:
+            if _index_instance is None:
+                index = FactCheckIndex(model_name=INDEX_MODEL_NAME)
+                if not index.load() and build_if_missing and DEFAULT_CORPUS_PATH.exists():
+                    with build_lock(index.index_dir):
+                        if not index.load():
+                            print("🔄 Building fact-check index from data/factchecks.json...")
+                            stats = index.sync(load_corpus())
+                            print(f"✅ Fact-check index built: {stats}")
+                _index_instance = index
+    return _index_instance
+
+
+def match_claims(claims: List[str], top_k: int = 3, min_similarity: Optional[float] = None) -> List[List[Dict]]:
+    """
+    Match claim texts against the fact-check index.
+
+    Args:
+        claims: Claim texts
+        top_k: Matches per claim
+        min_similarity: Minimum similarity (default: FACTCHECK_MIN_SIMILARITY or 0.5)
+
+    Returns:
+        One list of matches per claim (empty lists if the index is unavailable)
+    """
+    if min_similarity is None:
+        min_similarity = float(os.getenv("FACTCHECK_MIN_SIMILARITY", "0.5"))
+    try:
+        index = load_factcheck_index()
+        if index is None:
+            return [[] for _ in claims]
+        return index.search(claims, top_k=top_k, min_similarity=min_similarity)
+    except Exception as e:
+        logger.warning("⚠️  Fact-check matching failed", error=str(e))
+        return [[] for _ in claims]
@@ -0,0 +1,67 @@
+"""
+Gunicorn config: preload the DIMA model/index once and fork workers from it.
+
+Usage (from api/):
+    gunicorn -c gunicorn.conf.py main:app
+
+The master process imports the app and loads the SentenceTransformer weights,
+the DIMA embedding artifact (memory-mapped) and the fact-check index before
+forking. Workers inherit these pages copy-on-write, so adding a worker costs
+only its private heap instead of another ~500MB model copy.
+
+Environment variables:
+- WEB_CONCURRENCY: number of workers (default 2)
+- PORT: listen port (default 8080)
+- PRELOAD_MODELS: load models in the master before fork (default true)
+- TORCH_NUM_THREADS: intra-op threads per worker (default 1)
+"""
+import gc
+import os
+
+# Tokenizers' Rust thread pool does not survive fork
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "300"))
+graceful_timeout = 30
+keepalive = 5
+
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "true").lower() == "true"
+preload_app = PRELOAD_MODELS
+
+
+def when_ready(server):
+    """Load shared models in the master, then freeze the heap before forking."""
+    if not PRELOAD_MODELS:
+        return
+
+    try:
+        from dima_detector import get_detector
+        detector = get_detector()
+        if detector.encoder_model is not None:
+            detector.encoder_model.eval()
+        server.log.info("DIMA detector preloaded in master (embeddings: %s)", detector.is_embeddings_enabled())
+    except Exception as e:
+        server.log.warning("DIMA preload failed, workers will load lazily: %s", e)
+
+    try:
+        from factcheck import load_factcheck_index
+        load_factcheck_index()
+    except Exception as e:
+        server.log.warning("Fact-check index preload failed: %s", e)
+
+    # Move everything loaded so far to the permanent generation: the cyclic GC
+    # no longer walks (and dirties) these pages in the workers.
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Per-worker settings that must not be inherited from the master."""
+    try:
+        import torch
+        torch.set_num_threads(int(os.getenv("TORCH_NUM_THREADS", "1")))
+    except ImportError:
+        pass
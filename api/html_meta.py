@@ -0,0 +1,235 @@
+"""
+Single-pass page metadata extraction (title, description) for /analyze-lite.
+
+HeadMetaScanner walks the document once, tag by tag, collecting every
+og:/twitter: meta tag, the <title> and the JSON-LD blocks. Each step is one
+compiled-regex search from the current position: script, style and comment
+bodies are skipped with a single search for their end, so the
+multi-megabyte inline scripts of YouTube or TikTok pages are never
+tokenized. Scanning stops at </head> (or <body>) once a description is
+known; otherwise only JSON-LD blocks are looked for further down. It also
+stops at the byte budget.
+
+Bytes can be fed as they are downloaded (lite.fetch_meta closes the
+connection as soon as the scanner is done).
+
+Environment variables:
+- LITE_HEAD_MAX_BYTES: max bytes of a page scanned (and downloaded) for its
+  metadata (default 2 MiB)
+"""
+import codecs
+import html
+import json
+import os
+import re
+from typing import Dict, List, Optional
+
+
+LITE_HEAD_MAX_BYTES = int(os.getenv("LITE_HEAD_MAX_BYTES", str(2 * 1024 * 1024)))
+
+# Meta names kept (first occurrence wins), in lookup order per field
+TITLE_META = ("og:title", "twitter:title")
+DESCRIPTION_META = ("og:description", "twitter:description")
+_WANTED_META = frozenset(TITLE_META + DESCRIPTION_META)
+
+# Consumed input is dropped from the buffer once this many characters are behind the scan position
+_COMPACT_CHARS = 256 * 1024
+
+# Attributes run to the first '>' outside quoted values (content="x > y")
+_TAG_RE = re.compile(r"""<(!--|/?[a-zA-Z][a-zA-Z0-9:-]*)((?:[^>"']|"[^"]*"|'[^']*')*)>""")
+_ATTR_RE = re.compile(r"""([a-zA-Z_:][-a-zA-Z0-9_:.]*)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""")
+_COMMENT_END_RE = re.compile(r"-->")
+_RAW_END_RES = {
+    name: re.compile(rf"</{name}\s*>", re.IGNORECASE)
+    for name in ("script", "style", "title", "noscript", "template")
+}
+_JSON_LD_START_RE = re.compile(r"<script\b[^>]*type\s*=\s*[\"']?application/ld\+json[\"']?[^>]*>", re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _attributes(text: str) -> Dict[str, str]:
+    attributes = {}
+    for match in _ATTR_RE.finditer(text):
+        name = match.group(1).lower()
+        if name not in attributes:
+            value = match.group(2) if match.group(2) is not None else match.group(3) if match.group(3) is not None else match.group(4)
+            attributes[name] = html.unescape(value)
+    return attributes
+
+
+class HeadMetaScanner:
+    """
+    Incremental <head> metadata scanner.
+
+    feed() text as it arrives and stop feeding once `done` is True; after
+    close(), result() gives {"title", "description"} with the same
+    precedence as before: og/twitter meta, then <title>, then the first
+    JSON-LD description or name.
+    """
+
+    def __init__(self, max_chars: int = LITE_HEAD_MAX_BYTES):
+        self.max_chars = max_chars
+        self.fed = 0
+        self.done = False
+        self.head_closed = False
+        self.meta: Dict[str, str] = {}
+        self.title: Optional[str] = None
+        self.json_ld: List[str] = []
+        self._buffer = ""
+        self._pos = 0
+        self._raw_search_from = 0  # Where to resume looking for the end of the block open at _pos
+
+    def feed(self, data: str):
+        if self.done:
+            return
+        remaining = self.max_chars - self.fed
+        if len(data) >= remaining:
+            data = data[:remaining]
+        self.fed += len(data)
+        self._buffer += data
+        self._scan(final=False)
+        if self.fed >= self.max_chars:
+            self.close()  # Budget reached (scan what we have)
+
+    def close(self):
+        """End of input: scan what is left, including unterminated blocks."""
+        if not self.done:
+            self._scan(final=True)
+            self.done = True
+
+    def _scan(self, final: bool):
+        text = self._buffer
+        pos = self._pos
+        while not self.done:
+            if self.head_closed:
+                pos = self._scan_json_ld(text, pos, final)
+                break
+            match = _TAG_RE.search(text, pos)
+            if match is None:
+                # Keep a possibly partial tag (or comment) for the next chunk
+                first = text.find("<", pos)
+                pos = len(text) if final or first < 0 else first
+                break
+            tag = match.group(1).lower()
+            end = match.end()
+            if tag == "!--":
+                # The tag regex stopped at the first '>', which may be inside the comment
+                close = _COMMENT_END_RE.search(text, match.start() + 4)
+                if close is None:
+                    pos = len(text) if final else match.start()
+                    break
+                pos = close.end()
+                continue
+            if tag in _RAW_END_RES:
+                close = _RAW_END_RES[tag].search(text, max(end, self._raw_search_from))
+                if close is None and not final:
+                    pos = match.start()  # Wait for the end of the block (without rescanning what we have)
+                    self._raw_search_from = max(end, len(text) - 32)
+                    break
+                self._raw_search_from = 0
+                content = text[end:close.start() if close else len(text)]
+                pos = close.end() if close else len(text)
+                if tag == "title":
+                    if self.title is None:
+                        self.title = _WHITESPACE_RE.sub(" ", html.unescape(content)).strip()
+                elif tag == "script" and "application/ld+json" in match.group(2).lower():
+                    self.json_ld.append(content)
+                continue
+            pos = end
+            if tag == "meta":
+                attributes = _attributes(match.group(2))
+                name = (attributes.get("property") or attributes.get("name") or "").lower()
+                content = attributes.get("content")
+                if name in _WANTED_META and content and name not in self.meta:
+                    self.meta[name] = content.strip()
+            elif tag in ("/head", "body"):
+                self.head_closed = True
+                if self._meta_value(DESCRIPTION_META) or self._json_ld_description() is not None:
+                    self.done = True
+
+        if pos > _COMPACT_CHARS:
+            self._buffer = text[pos:]
+            self._raw_search_from = max(0, self._raw_search_from - pos)
+            pos = 0
+        self._pos = pos
+
+    def _scan_json_ld(self, text: str, pos: int, final: bool) -> int:
+        """After </head> without a description: only JSON-LD blocks matter."""
+        while True:
+            match = _JSON_LD_START_RE.search(text, pos)
+            if match is None:
+                last = text.rfind("<", pos)
+                return len(text) if final or last < 0 else last
+            close = _RAW_END_RES["script"].search(text, match.end())
+            if close is None:
+                if not final:
+                    return match.start()
+                self.json_ld.append(text[match.end():])
+                return len(text)
+            self.json_ld.append(text[match.end():close.start()])
+            pos = close.end()
+            if self._json_ld_description() is not None:
+                self.done = True
+                return pos
+
+    def _meta_value(self, names) -> Optional[str]:
+        for name in names:
+            if self.meta.get(name):
+                return self.meta[name]
+        return None
+
+    def _json_ld_description(self) -> Optional[str]:
+        for block in self.json_ld:
+            try:
+                data = json.loads(block)
+            except Exception:
+                continue
+            for item in (data if isinstance(data, list) else [data]):
+                if isinstance(item, dict):
+                    description = item.get("description") or item.get("name")
+                    if isinstance(description, str):
+                        return description.strip()
+        return None
+
+    def result(self) -> Dict[str, Optional[str]]:
+        """{"title", "description"} from what has been scanned."""
+        description = self._meta_value(DESCRIPTION_META)
+        if not description:
+            description = self._json_ld_description()
+        return {"title": self._meta_value(TITLE_META) or self.title or None, "description": description}
+
+
+def extract_head_meta(html_text: str, max_chars: int = LITE_HEAD_MAX_BYTES) -> Dict[str, Optional[str]]:
+    """Title and description of an HTML document (scan stops after <head> or at max_chars)."""
+    scanner = HeadMetaScanner(max_chars)
+    scanner.feed(html_text)
+    scanner.close()
+    return scanner.result()
+
+
+def extract_meta_from_chunks(chunks, encoding: str = "utf-8", max_bytes: int = LITE_HEAD_MAX_BYTES) -> Dict:
+    """
+    Title and description from a byte stream (e.g. response.iter_content), reading only what is needed.
+
+    Returns:
+        {"title", "description", "bytes_read", "complete"} (complete: the
+        scanner stopped on its own rather than at the byte budget or end of stream)
+    """
+    scanner = HeadMetaScanner(max_chars=max_bytes)
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    bytes_read = 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        bytes_read += len(chunk)
+        scanner.feed(decoder.decode(chunk))
+        if scanner.done or bytes_read >= max_bytes:
+            break
+    else:
+        scanner.feed(decoder.decode(b"", final=True))
+    complete = scanner.done and scanner.fed < max_bytes
+    scanner.close()
+    meta = scanner.result()
+    meta["bytes_read"] = bytes_read
+    meta["complete"] = complete
+    return meta
@@ -1,8 +1,45 @@
+"""
+Lightweight metadata analysis (/analyze-lite): page meta tags, keyword claims,
+fact-check matches and a heuristic score, without any model call. YouTube,
+Twitter/X and TikTok metadata come from oEmbed / yt-dlp (platform_meta.py);
+otherwise pages are streamed and their metadata parsed as they download,
+stopping after <head> (html_meta.py).
+
+Feeds of URLs go through analyze_url_stream (/analyze-lite/stream): NDJSON
+lines in, one result line out per URL as soon as it completes, with bounded
+concurrency (global and per host). Input lines are read only as slots free
+up, so memory stays bounded whatever the feed size.
+
+Environment variables:
+- LITE_STREAM_CONCURRENCY: URLs analyzed at the same time per stream (default 16)
+- LITE_STREAM_PER_HOST: concurrent fetches per host (default 2)
+- LITE_STREAM_MAX_URLS: max URLs per stream (default 10000); bodies larger
+  than LITE_STREAM_MAX_URLS full-length lines are rejected (413)
+- LITE_PAGE_CACHE_SIZE, LITE_PAGE_CACHE_TTL: analyzed pages kept in memory
+  (default 2048 entries for 900 s; 0 = off)
+- LITE_HOST_FAILURE_TTL: seconds during which a host that failed to connect
+  is not retried (default 120; 0 = off)
+"""
+import asyncio
+import codecs
+import contextvars
+import copy
+import os
 import re
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from typing import Dict, List, Optional
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
 from pathlib import Path
+from urllib.parse import urlsplit
+
+from html_meta import extract_head_meta, extract_meta_from_chunks
+from metrics import stage
+from platform_meta import get_platform_meta_stats, get_platform_metadata
+from ttl_cache import TTLCache
 
 
 USER_AGENT = (
@@ -11,116 +48,207 @@ USER_AGENT = (
     "Chrome/124.0.0.0 Safari/537.36"
 )
 
+LITE_STREAM_CONCURRENCY = int(os.getenv("LITE_STREAM_CONCURRENCY", "16"))
+LITE_STREAM_PER_HOST = int(os.getenv("LITE_STREAM_PER_HOST", "2"))
+LITE_STREAM_MAX_URLS = int(os.getenv("LITE_STREAM_MAX_URLS", "10000"))
+LITE_PAGE_CACHE_SIZE = int(os.getenv("LITE_PAGE_CACHE_SIZE", "2048"))
+LITE_PAGE_CACHE_TTL = float(os.getenv("LITE_PAGE_CACHE_TTL", "900"))
+LITE_HOST_FAILURE_TTL = float(os.getenv("LITE_HOST_FAILURE_TTL", "120"))
+FETCH_TIMEOUT = 15
+FETCH_CHUNK_BYTES = 64 * 1024
+MAX_LINE_BYTES = 8192  # One NDJSON input line (a URL and a few fields)
+MAX_STREAM_BODY_BYTES = LITE_STREAM_MAX_URLS * (MAX_LINE_BYTES + 1)  # Lines and their newlines
+
+# Precompiled patterns (tokenize runs once per claim)
+_TOKEN_RE = re.compile(r"[a-zA-ZÀ-ÿ0-9]{3,}")
+_SENTENCE_SPLIT_RE = re.compile(r"[\.!?\n]+")
+_URL_RE = re.compile(r"http[s]?://[^\s]+")
+
+KNOWN_SUFFIXES = (".fr", ".com", ".org", ".net", ".eu")
+
+
+class HostUnavailableError(Exception):
+    """The host failed to connect recently (not retried until LITE_HOST_FAILURE_TTL expires)."""
+
+
+# URL|platform → analysis; host → connection error
+_page_cache = TTLCache(LITE_PAGE_CACHE_SIZE, LITE_PAGE_CACHE_TTL)
+_host_failures = TTLCache(1024 if LITE_HOST_FAILURE_TTL > 0 else 0, LITE_HOST_FAILURE_TTL)
+
+# One requests session per thread (keep-alive across the URLs of a feed)
+_sessions = threading.local()
+
+
+PLATFORM_DOMAINS = {
+    "youtube": ("youtube.com", "youtu.be"),
+    "twitter": ("twitter.com", "x.com"),
+    "tiktok": ("tiktok.com",),
+}
+
 
 def detect_platform(url: str) -> str:
-    u = url.lower()
-    if "youtube.com" in u or "youtu.be" in u:
-        return "youtube"
-    if "twitter.com" in u or "x.com" in u:
-        return "twitter"
-    if "tiktok.com" in u:
-        return "tiktok"
+    host = url_host(url)
+    for platform, domains in PLATFORM_DOMAINS.items():
+        if any(host == domain or host.endswith("." + domain) for domain in domains):
+            return platform
     return "unknown"
 
 
-def fetch_page(url: str) -> str:
-    resp = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=15)
+def url_host(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+def url_origin(url: str) -> str:
+    """host[:port] (unit of the per-host limits and of host failures)."""
+    return urlsplit(url).netloc.rpartition("@")[2].lower()
+
+
+def _session() -> requests.Session:
+    session = getattr(_sessions, "session", None)
+    if session is None:
+        session = _sessions.session = requests.Session()
+        session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+def _get(url: str, stream: bool = False) -> requests.Response:
+    """GET through the thread's session, remembering hosts that fail to connect."""
+    host = url_origin(url)
+    failure = _host_failures.get(host)
+    if failure is not None:
+        raise HostUnavailableError(f"{host} unavailable (cached): {failure}")
+    try:
+        resp = _session().get(url, timeout=FETCH_TIMEOUT, stream=stream)
+    except (requests.ConnectionError, requests.Timeout) as e:
+        _host_failures.put(host, f"{type(e).__name__}")
+        raise
     resp.raise_for_status()
-    return resp.text
+    return resp
 
 
-def extract_meta(html: str) -> Dict[str, Optional[str]]:
-    # Try common meta tags first
-    def _meta(name):
-        pattern = rf'<meta[^>]+(?:name|property)=["\']{re.escape(name)}["\'][^>]+content=["\'](.*?)["\']'
-        m = re.search(pattern, html, re.IGNORECASE | re.DOTALL)
-        return m.group(1).strip() if m else None
-
-    title = _meta("og:title") or _meta("twitter:title")
-    description = _meta("og:description") or _meta("twitter:description")
-
-    # Fallback to <title>
-    if not title:
-        m = re.search(r"<title>(.*?)</title>", html, re.IGNORECASE | re.DOTALL)
-        if m:
-            title = re.sub(r"\s+", " ", m.group(1)).strip()
-
-    # Attempt to parse JSON-LD if available
-    if not description:
-        for m in re.finditer(r"<script[^>]+type=\"application/ld\+json\"[^>]*>(.*?)</script>", html, re.IGNORECASE | re.DOTALL):
-            try:
-                data = json.loads(m.group(1))
-            except Exception:
-                continue
-            if isinstance(data, dict):
-                desc = data.get("description") or data.get("name")
-                if isinstance(desc, str):
-                    description = desc.strip()
-                    break
-            if isinstance(data, list):
-                for item in data:
-                    if isinstance(item, dict):
-                        desc = item.get("description") or item.get("name")
-                        if isinstance(desc, str):
-                            description = desc.strip()
-                            break
-                if description:
-                    break
+def fetch_page(url: str) -> str:
+    return _get(url).text
+
 
-    return {"title": title, "description": description}
+def fetch_meta(url: str) -> Dict:
+    """
+    Stream a page and parse its metadata as it arrives, closing the connection once <head> is done.
+
+    Returns:
+        {"title", "description", "bytes_read", "complete"} (see html_meta.extract_meta_from_chunks)
+    """
+    resp = _get(url, stream=True)
+    try:
+        encoding = requests.utils.get_encoding_from_headers(resp.headers)
+        # requests defaults text/* without a charset to ISO-8859-1; HTML pages are UTF-8 in practice
+        if not encoding or "charset" not in resp.headers.get("content-type", "").lower():
+            encoding = "utf-8"
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            encoding = "utf-8"
+        return extract_meta_from_chunks(resp.iter_content(FETCH_CHUNK_BYTES), encoding)
+    finally:
+        resp.close()
+
+
+def extract_meta(html: str) -> Dict[str, Optional[str]]:
+    """Title and description of an HTML page (single pass over <head>, see html_meta.py)."""
+    return extract_head_meta(html)
 
 
 def tokenize(text: str) -> List[str]:
-    tokens = re.findall(r"[a-zA-ZÀ-ÿ0-9]{3,}", text.lower())
-    return tokens
+    return _TOKEN_RE.findall(text.lower())
 
 
 def extract_claims_from_text(text: str) -> List[Dict]:
+    """Claims from page text (no media timestamps: titles and descriptions are not timed)."""
     # Import locally to avoid circular import on startup
-    from claims import contains_numbers, contains_sensational_language
+    from claims import is_claim_candidate
 
     claims: List[Dict] = []
     if not text:
         return claims
 
     # Split on sentence-ish boundaries
-    parts = re.split(r"[\.!?\n]+", text)
-    ts = 0.0
-    for p in parts:
+    for p in _SENTENCE_SPLIT_RE.split(text):
         p = p.strip()
-        if not p:
-            continue
-        if contains_numbers(p) or contains_sensational_language(p):
-            claims.append({"ts": ts, "text": p})
-        ts += 5.0
+        if p and is_claim_candidate(p):
+            claims.append({"text": p})
     return claims[:10]
 
 
-# Fact-check matching intentionally omitted in heuristics-only mode
-def match_factchecks_keywords(claims: List[Dict], top_k: int = 3) -> List[Dict]:
-    return []
+FACTCHECK_MATCHING_ENABLED = os.getenv("FACTCHECK_MATCHING_ENABLED", "true").lower() == "true"
+
+
+@lru_cache(maxsize=1)
+def _factcheck_keyword_index() -> List[Dict]:
+    from factcheck import DEFAULT_CORPUS_PATH, factcheck_text, load_corpus
+    if not DEFAULT_CORPUS_PATH.exists():
+        return []
+    return [
+        {"factcheck": fc, "tokens": set(tokenize(factcheck_text(fc)))}
+        for fc in load_corpus()
+    ]
+
+
+def match_factchecks_keywords(claims: List[Dict], top_k: int = 3, min_overlap: float = 0.15) -> List[Dict]:
+    """Keyword-overlap fact-check matching (fallback when embeddings are unavailable)."""
+    matches: List[Dict] = []
+    for claim in claims:
+        claim_tokens = set(tokenize(claim["text"]))
+        if not claim_tokens:
+            continue
+        scored = []
+        for entry in _factcheck_keyword_index():
+            overlap = len(claim_tokens & entry["tokens"]) / len(claim_tokens | entry["tokens"])
+            if overlap >= min_overlap:
+                scored.append((overlap, entry["factcheck"]))
+        scored.sort(key=lambda x: x[0], reverse=True)
+        for overlap, fc in scored[:top_k]:
+            matches.append({
+                "claim": claim["text"],
+                "factcheck_id": fc.get("id"),
+                "title": fc.get("title", ""),
+                "url": fc.get("url", ""),
+                "similarity": round(overlap, 3),
+                "method": "keywords",
+            })
+    return matches
+
+
+def match_factchecks(claims: List[Dict], top_k: int = 3) -> List[Dict]:
+    """Match claims to fact-checks (semantic index, keyword overlap as fallback)."""
+    if not claims or not FACTCHECK_MATCHING_ENABLED:
+        return []
+    from factcheck import FACTCHECK_AVAILABLE, match_claims
+    if not FACTCHECK_AVAILABLE:
+        return match_factchecks_keywords(claims, top_k)
+    matches: List[Dict] = []
+    for claim, claim_matches in zip(claims, match_claims([c["text"] for c in claims], top_k=top_k)):
+        for match in claim_matches:
+            matches.append(dict(match, claim=claim["text"], method="embeddings"))
+    return matches
+
+
+@lru_cache(maxsize=4096)
+def is_known_domain(host: str) -> bool:
+    """Naive suffix check (no tldextract)."""
+    return host.endswith(KNOWN_SUFFIXES)
 
 
 def compute_lite_heuristics(text: str, claims: List[Dict]) -> Dict:
     # Sensational terms count
-    from claims import SENSATIONAL_TERMS, NUMBER_PATTERNS
-    text_lower = (text or "").lower()
+    from claims import SENSATIONAL_TERMS, NUMBER_RES
+    text = text or ""
+    text_lower = text.lower()
     sensational = sum(text_lower.count(t) for t in SENSATIONAL_TERMS)
 
     # Unsourced numbers (simple count of number patterns)
-    import re as _re
-    num_count = 0
-    for p in NUMBER_PATTERNS:
-        num_count += len(_re.findall(p, text or "", flags=_re.IGNORECASE))
+    num_count = sum(len(pattern.findall(text)) for pattern in NUMBER_RES)
 
     # Domain heuristic without tldextract
-    url_pattern = r"http[s]?://[^\s]+"
-    urls = _re.findall(url_pattern, text or "")
-    unknown_domains = 0
-    for u in urls:
-        # naive suffix check
-        if not any(u.lower().endswith(suf) or f".{suf}/" in u.lower() for suf in [".fr", ".com", ".org", ".net", ".eu"]):
-            unknown_domains += 1
+    unknown_domains = sum(1 for u in _URL_RE.findall(text) if not is_known_domain(url_host(u)))
 
     # Simple score
     score = min(100, sensational * 5 + num_count * 3 + unknown_domains * 10)
@@ -145,23 +273,216 @@ def compute_lite_heuristics(text: str, claims: List[Dict]) -> Dict:
 
 def analyze_metadata(url: str, platform: Optional[str] = None) -> Dict:
     platform = platform or detect_platform(url)
-    html = fetch_page(url)
-    meta = extract_meta(html)
+    cached = get_cached_analysis(url, platform)
+    if cached is not None:
+        return cached
+    return _analyze_page(url, platform)
+
+
+def _analyze_page(url: str, platform: str) -> Dict:
+    """Fetch and analyze one page (result stored in the page cache)."""
+    meta = get_platform_metadata(url, platform) or {}
+    sources = meta.pop("sources", [])
+    if not (meta.get("title") and meta.get("description")):
+        # Generic fallback (or complement): scan the page <head>
+        with stage("page_fetch") as span:
+            page_meta = fetch_meta(url)
+            span.set(bytes=page_meta["bytes_read"], head_complete=page_meta["complete"])
+        for key in ("title", "description"):
+            meta[key] = meta.get(key) or page_meta.get(key)
+        sources.append("html")
     combined_text = " ".join([x for x in [meta.get("title"), meta.get("description")] if x])
-    claims = extract_claims_from_text(combined_text)
-    # Heuristics-only POC (no fact-check matches)
-    matches = []
-    heuristics = compute_lite_heuristics(combined_text, claims)
-    return {
+    with stage("claims_extract"):
+        claims = extract_claims_from_text(combined_text)
+    with stage("factcheck_match"):
+        matches = match_factchecks(claims)
+    with stage("heuristics"):
+        heuristics = compute_lite_heuristics(combined_text, claims)
+    result = {
         "input": {
             "url": url,
             "platform": platform,
             "title": meta.get("title"),
             "description": meta.get("description"),
+            "author": meta.get("author"),
+            "metadata_sources": sources,
         },
         "claims": claims,
         "matches": matches,
         "heuristics": heuristics,
     }
+    _page_cache.put(f"{platform}|{url}", copy.deepcopy(result))
+    return result
+
+
+def get_cached_analysis(url: str, platform: Optional[str] = None) -> Optional[Dict]:
+    """Analysis of a recently analyzed page (None if not cached or expired)."""
+    cached = _page_cache.get(f"{platform or detect_platform(url)}|{url}")
+    return copy.deepcopy(cached) if cached is not None else None
+
+
+def get_lite_cache_stats() -> Dict:
+    return {"pages": _page_cache.get_stats(), "failed_hosts": _host_failures.get_stats(), "platform_metadata": get_platform_meta_stats()}
+
+
+# ---------------------------------------------------------------------------
+# Streaming (NDJSON feeds)
+# ---------------------------------------------------------------------------
+
+_stream_pool: Optional[ThreadPoolExecutor] = None
+_stream_pool_lock = threading.Lock()
+
 
+def _get_stream_pool() -> ThreadPoolExecutor:
+    global _stream_pool
+    with _stream_pool_lock:
+        if _stream_pool is None:
+            _stream_pool = ThreadPoolExecutor(max_workers=max(1, LITE_STREAM_CONCURRENCY), thread_name_prefix="lite-stream")
+        return _stream_pool
+
+
+def parse_url_line(line: bytes, index: int) -> Dict:
+    """NDJSON line (a URL string, or {"url", "platform", "id"}) → item (with 'error' if invalid)."""
+    if len(line) > MAX_LINE_BYTES:
+        return {"index": index, "error": f"Line longer than {MAX_LINE_BYTES} bytes"}
+    try:
+        value = json.loads(line)
+    except ValueError:
+        value = line.decode("utf-8", errors="replace").strip()  # Plain URL per line
+    if isinstance(value, str):
+        value = {"url": value}
+    if not isinstance(value, dict):
+        return {"index": index, "error": "Expected a URL or a JSON object with 'url'"}
+    url = value.get("url")
+    item = {"index": index, "url": url, "platform": value.get("platform")}
+    if "id" in value:
+        item["id"] = value["id"]
+    if not isinstance(url, str) or urlsplit(url).scheme not in ("http", "https"):
+        item["error"] = "Missing or invalid http(s) 'url'"
+    return item
+
+
+async def iter_file_chunks(f, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """Chunks of a (spooled) file, as an async byte stream for analyze_url_stream."""
+    while True:
+        data = f.read(chunk_size)
+        if not data:
+            return
+        yield data
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split a byte stream into non-empty lines (an over-long line is cut, not buffered)."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        while True:
+            newline = buffer.find(b"\n")
+            if newline < 0:
+                break
+            line, buffer = buffer[:newline].strip(), buffer[newline + 1:]
+            if line:
+                yield line
+        if len(buffer) > MAX_LINE_BYTES:
+            yield buffer[:MAX_LINE_BYTES + 1]
+            buffer = b""
+            async for chunk in chunks:  # Drop the rest of the over-long line
+                newline = chunk.find(b"\n")
+                if newline >= 0:
+                    buffer = chunk[newline + 1:]
+                    break
+    if buffer.strip():
+        yield buffer.strip()
+
+
+async def analyze_url_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    Analyze an NDJSON feed of URLs, yielding one JSON line per URL as it completes.
+
+    At most LITE_STREAM_CONCURRENCY URLs are in flight (LITE_STREAM_PER_HOST
+    per host); the next input line is only read once a slot frees up. When the
+    consumer stops early (client disconnect), the feeder and the pending
+    analyses are cancelled.
+
+    Args:
+        chunks: Input byte chunks (e.g. iter_file_chunks over the spooled body)
+
+    Yields:
+        '{"index", "url", "status": "ok", "result"}' or '{"index", ..., "status": "error", "error"}' lines,
+        then a final '{"summary": {...}}' line
+    """
+    loop = asyncio.get_running_loop()
+    pool = _get_stream_pool()
+    slots = asyncio.Semaphore(max(1, LITE_STREAM_CONCURRENCY))
+    host_slots: Dict[str, asyncio.Semaphore] = {}
+    results: asyncio.Queue = asyncio.Queue()
+    tasks: Set[asyncio.Future] = set()
+    summary = {"urls": 0, "ok": 0, "errors": 0, "cached": 0}
+    started = time.perf_counter()
+
+    async def analyze(item: Dict):
+        try:
+            if "error" not in item:
+                platform = item["platform"] or detect_platform(item["url"])
+                result = get_cached_analysis(item["url"], platform)
+                if result is not None:
+                    item.update(status="ok", result=result, cached=True)
+                else:
+                    host = url_origin(item["url"])
+                    host_slot = host_slots.setdefault(host, asyncio.Semaphore(max(1, LITE_STREAM_PER_HOST)))
+                    async with host_slot:
+                        context = contextvars.copy_context()
+                        result = await loop.run_in_executor(pool, context.run, _analyze_page, item["url"], platform)
+                    item.update(status="ok", result=result, cached=False)
+        except Exception as e:
+            item["error"] = f"{type(e).__name__}: {str(e)[:200]}"
+        finally:
+            slots.release()
+        if "error" in item:
+            item["status"] = "error"
+        item.pop("platform", None)
+        await results.put(item)
+
+    async def feed():
+        index = 0
+        async for line in _iter_lines(chunks):
+            await slots.acquire()
+            if index >= LITE_STREAM_MAX_URLS:
+                slots.release()
+                await results.put({"index": index, "status": "error", "error": f"Stream limit reached ({LITE_STREAM_MAX_URLS} URLs)"})
+                index += 1
+                break
+            task = asyncio.ensure_future(analyze(parse_url_line(line, index)))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            index += 1
+        return index
+
+    feeder = asyncio.ensure_future(feed())
+    getter = None
+    emitted = 0
+    try:
+        while True:
+            if feeder.done() and emitted >= feeder.result():
+                break
+            getter = asyncio.ensure_future(results.get())
+            await asyncio.wait({getter, feeder}, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                getter.cancel()
+                continue
+            item = getter.result()
+            emitted += 1
+            summary["urls"] += 1
+            summary["ok" if item["status"] == "ok" else "errors"] += 1
+            summary["cached"] += int(bool(item.get("cached")))
+            yield json.dumps(item, ensure_ascii=False, default=str) + "\n"
+    finally:
+        # No-ops after a complete run; stop reading and fetching for a gone client
+        feeder.cancel()
+        if getter is not None:
+            getter.cancel()
+        for task in list(tasks):
+            task.cancel()
 
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    yield json.dumps({"summary": summary}) + "\n"
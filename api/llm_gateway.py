@@ -0,0 +1,514 @@
+"""
+Model Gateway — shared OpenAI client for all LLM/ASR/vision calls.
+
+Provides:
+- One pooled HTTP client (keep-alive connection pool) per process
+- Per-endpoint timeouts (analysis, vision, transcription, probe)
+- Jittered exponential retries honouring Retry-After
+- Token-bucket limits for requests/min (RPM) and tokens/min (TPM)
+- Concurrency cap and circuit breaker (callers fall back to degraded reports)
+- Optional request hedging against slow completions (tail latency)
+- Token usage/cost accounting and the per-request cost budget (token_budget.py)
+- OpenAI Batch API primitives (file upload, batch create/poll, results download)
+"""
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+from openai import OpenAI, APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+
+from metrics import HEDGE_ELIGIBLE, HEDGE_FIRED, HEDGE_WON
+from token_budget import count_message_tokens, record_usage, request_budget_allows
+from tracing import get_logger
+
+
+logger = get_logger("llm_gateway")
+
+DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+# Per-endpoint timeouts in seconds (override with LLM_TIMEOUT_<ENDPOINT>)
+ENDPOINT_TIMEOUTS = {
+    "analysis": 60.0,
+    "vision": 45.0,
+    "transcription": 300.0,
+    "probe": 15.0,
+    "batch": 120.0,
+}
+
+# Completion tokens assumed when a call does not set max_tokens (TPM accounting)
+DEFAULT_COMPLETION_TOKENS = 800
+
+
+class ModelUnavailableError(Exception):
+    """Raised when the model cannot be called (circuit open, overload, retries exhausted)."""
+
+
+class BudgetExceededError(ModelUnavailableError):
+    """Raised when a call would exceed the request's cost budget (LLM_REQUEST_COST_BUDGET_USD)."""
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def get_endpoint_timeout(endpoint: str) -> float:
+    """Get timeout (seconds) for a logical endpoint."""
+    default = ENDPOINT_TIMEOUTS.get(endpoint, ENDPOINT_TIMEOUTS["analysis"])
+    return _env_float(f"LLM_TIMEOUT_{endpoint.upper()}", default)
+
+
+def estimate_tokens(messages: List[Dict], max_tokens: Optional[int] = None, model: str = DEFAULT_MODEL) -> int:
+    """
+    Token estimate for a chat request (counted prompt + images + completion allowance).
+
+    Used for TPM rate limiting and the request cost budget; exact usage is
+    reported by the API.
+    """
+    images = sum(
+        1
+        for message in messages or []
+        if isinstance(message.get("content"), list)
+        for part in message["content"]
+        if part.get("type") == "image_url"
+    )
+    return count_message_tokens(messages, model) + images * 85 + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0  # tokens per second
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, amount: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """
+        Take `amount` tokens, waiting for refill if needed.
+
+        Requests larger than the capacity are clamped so they can still pass.
+
+        Returns:
+            True if acquired, False if `timeout` elapsed first
+        """
+        if self.unlimited:
+            return True
+        amount = min(amount, self.capacity)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return True
+                wait = (amount - self.tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed → open after `failure_threshold` failures; open → half-open after
+    `reset_timeout` seconds; one successful trial call closes it again. While
+    the trial is in flight, other calls are refused.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_thread: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Check whether a call may go through (in half-open state, only the single trial call)."""
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+                self._trial_thread = threading.get_ident()
+            return True
+
+    def release_trial(self):
+        """End this thread's trial call without an outcome (non-retryable exit); the next call becomes the trial."""
+        with self._lock:
+            if self._trial_in_flight and self._trial_thread == threading.get_ident():
+                self._trial_in_flight = False
+                self._trial_thread = None
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = "closed"
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._trial_in_flight = False
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Rolling window of call latencies (seconds) for percentile deadlines."""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Get the `pct` percentile (0-100), or None if no samples yet."""
+        with self._lock:
+            data = sorted(self.samples)
+        if not data:
+            return None
+        index = min(len(data) - 1, int(round(pct / 100.0 * (len(data) - 1))))
+        return data[index]
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Extract Retry-After (seconds) from an API error response, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (RateLimitError, APITimeoutError, APIConnectionError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code >= 500 or error.status_code == 409
+    return False
+
+
+class ModelGateway:
+    """Shared OpenAI access point with pooling, limits, retries and a circuit breaker."""
+
+    def __init__(self, api_key: Optional[str] = None):
+        max_connections = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=60.0
+            ),
+            timeout=httpx.Timeout(get_endpoint_timeout("analysis"), connect=5.0)
+        )
+        # Retries are handled here (jitter + Retry-After + breaker), not by the SDK
+        self.client = OpenAI(
+            api_key=api_key or os.getenv("OPENAI_API_KEY"),
+            http_client=self.http_client,
+            max_retries=0
+        )
+
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "3"))
+        self.backoff_base = _env_float("LLM_BACKOFF_BASE", 0.5)
+        self.backoff_max = _env_float("LLM_BACKOFF_MAX", 20.0)
+        self.queue_timeout = _env_float("LLM_QUEUE_TIMEOUT", 30.0)
+
+        self._semaphore = threading.BoundedSemaphore(int(os.getenv("LLM_MAX_CONCURRENCY", "8")))
+        self.rpm_bucket = TokenBucket(_env_float("LLM_RPM_LIMIT", 500))
+        self.tpm_bucket = TokenBucket(_env_float("LLM_TPM_LIMIT", 200000))
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("LLM_BREAKER_THRESHOLD", "5")),
+            reset_timeout=_env_float("LLM_BREAKER_RESET", 30.0)
+        )
+
+        # Hedging: duplicate (or smaller-model) call when the primary is slower
+        # than the rolling latency percentile, capped to a fraction of calls
+        self.hedge_enabled = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+        self.hedge_model = os.getenv("LLM_HEDGE_MODEL", "")  # empty = duplicate primary model
+        self.hedge_percentile = _env_float("LLM_HEDGE_PERCENTILE", 95)
+        self.hedge_min_samples = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+        self.hedge_default_delay = _env_float("LLM_HEDGE_DELAY", 8.0)
+        self.hedge_budget = _env_float("LLM_HEDGE_BUDGET", 0.05)
+        self._latencies: Dict[str, LatencyTracker] = {}
+        self._hedge_pool = ThreadPoolExecutor(
+            max_workers=2 * int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+            thread_name_prefix="llm-hedge"
+        )
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "rejected": 0,
+            "in_flight": 0,
+            "hedge_eligible": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "over_budget": 0,
+        }
+
+    def _incr(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def chat_completion(self, endpoint: str = "analysis", **kwargs):
+        """
+        Create a chat completion through the gateway.
+
+        Args:
+            endpoint: Logical endpoint (selects timeout): analysis, vision, probe
+            **kwargs: Arguments for client.chat.completions.create (model defaults to OPENAI_MODEL)
+
+        Returns:
+            ChatCompletion response
+        """
+        kwargs.setdefault("model", DEFAULT_MODEL)
+        tokens = estimate_tokens(kwargs.get("messages"), kwargs.get("max_tokens"), kwargs["model"])
+        completion_tokens = kwargs.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+        if not request_budget_allows(kwargs["model"], tokens - completion_tokens, completion_tokens):
+            self._incr("over_budget")
+            raise BudgetExceededError(f"Request cost budget exhausted ({endpoint})")
+        return self._call(endpoint, self.client.chat.completions.create, tokens, **kwargs)
+
+    def chat_completion_hedged(self, endpoint: str = "analysis", **kwargs) -> Tuple[object, str]:
+        """
+        Create a chat completion, hedging with a second call if the first is slow.
+
+        If the primary call has not returned by the rolling latency percentile
+        (LLM_HEDGE_PERCENTILE) and the hedge budget allows it, a duplicate call
+        (or LLM_HEDGE_MODEL) is fired and the first successful answer wins.
+        The losing call is not cancelled; its result is discarded.
+
+        Args:
+            endpoint: Logical endpoint (selects timeout and latency window)
+            **kwargs: Arguments for client.chat.completions.create
+
+        Returns:
+            (response, model that answered)
+        """
+        kwargs.setdefault("model", DEFAULT_MODEL)
+        primary_model = kwargs["model"]
+        if not self.hedge_enabled:
+            return self.chat_completion(endpoint, **kwargs), primary_model
+
+        self._incr("hedge_eligible")
+        HEDGE_ELIGIBLE.inc((endpoint,))
+        # Calls run in a copy of the request context (request ID, spans, usage accounting)
+        primary = self._hedge_pool.submit(contextvars.copy_context().run, self.chat_completion, endpoint, **kwargs)
+        done, _ = wait([primary], timeout=self._hedge_deadline(endpoint))
+        if done or not self._hedge_allowed():
+            return primary.result(), primary_model
+
+        hedge_model = self.hedge_model or primary_model
+        hedge = self._hedge_pool.submit(
+            contextvars.copy_context().run, self.chat_completion, endpoint, **dict(kwargs, model=hedge_model)
+        )
+        self._incr("hedged")
+        HEDGE_FIRED.inc((endpoint,))
+        logger.info("⏱️  Hedging call", endpoint=endpoint, model=hedge_model)
+
+        roles = {primary: ("primary", primary_model), hedge: ("hedge", hedge_model)}
+        pending = set(roles)
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    first_error = first_error or future.exception()
+                    continue
+                role, model = roles[future]
+                if role == "hedge":
+                    self._incr("hedge_wins")
+                    HEDGE_WON.inc((endpoint,))
+                return future.result(), model
+        raise first_error
+
+    def _hedge_deadline(self, endpoint: str) -> float:
+        """Seconds to wait for the primary call before hedging."""
+        tracker = self._latencies.get(endpoint)
+        if tracker is None or len(tracker) < self.hedge_min_samples:
+            return self.hedge_default_delay
+        return tracker.percentile(self.hedge_percentile)
+
+    def _hedge_allowed(self) -> bool:
+        """Check the hedge budget (fraction of eligible calls that may be hedged)."""
+        with self._stats_lock:
+            return self._stats["hedged"] + 1 <= max(1.0, self.hedge_budget * self._stats["hedge_eligible"])
+
+    def transcription(self, **kwargs):
+        """Create an audio transcription (Whisper) through the gateway."""
+        return self._call("transcription", self.client.audio.transcriptions.create, 0, **kwargs)
+
+    def _call(self, endpoint: str, create: Callable, tokens: int, **kwargs):
+        """Run one API call with limits, retries and circuit breaking."""
+        if not self.breaker.allow():
+            self._incr("rejected")
+            raise ModelUnavailableError(f"Circuit open for OpenAI ({endpoint})")
+
+        if not self._semaphore.acquire(timeout=self.queue_timeout):
+            self.breaker.release_trial()
+            self._incr("rejected")
+            raise ModelUnavailableError(f"Too many concurrent OpenAI calls ({endpoint})")
+
+        self._incr("in_flight")
+        try:
+            if not self.rpm_bucket.acquire(1, timeout=self.queue_timeout) or (
+                tokens and not self.tpm_bucket.acquire(tokens, timeout=self.queue_timeout)
+            ):
+                self._incr("rejected")
+                raise ModelUnavailableError(f"OpenAI rate limit budget exhausted ({endpoint})")
+
+            kwargs.setdefault("timeout", get_endpoint_timeout(endpoint))
+            upload = kwargs.get("file")
+            attempt = 0
+            while True:
+                self._incr("requests")
+                try:
+                    if hasattr(upload, "seek"):
+                        upload.seek(0)  # Re-send the full file on retries
+                    started = time.monotonic()
+                    response = create(**kwargs)
+                    self._latencies.setdefault(endpoint, LatencyTracker()).record(time.monotonic() - started)
+                    self.breaker.record_success()
+                    if endpoint != "batch":  # Batch API results are accounted when downloaded (batch.py)
+                        record_usage(endpoint, getattr(response, "model", None) or kwargs.get("model"), getattr(response, "usage", None))
+                    return response
+                except Exception as e:
+                    if not _is_retryable(e):
+                        raise
+                    if attempt >= self.max_retries:
+                        self._incr("failures")
+                        self.breaker.record_failure()
+                        raise ModelUnavailableError(f"OpenAI {endpoint} failed after {attempt + 1} attempts: {e}") from e
+
+                    # Full jitter, but never sooner than the server asks
+                    delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                    retry_after = _retry_after_seconds(e)
+                    if retry_after is not None:
+                        delay = max(delay, min(retry_after, self.backoff_max))
+                    attempt += 1
+                    self._incr("retries")
+                    logger.warning(
+                        "⚠️  OpenAI error, retrying", endpoint=endpoint, error=type(e).__name__,
+                        attempt=attempt, max_retries=self.max_retries, delay=round(delay, 2)
+                    )
+                    time.sleep(delay)
+        finally:
+            self._incr("in_flight", -1)
+            self._semaphore.release()
+            self.breaker.release_trial()
+
+    def submit_batch(self, requests: List[Dict], metadata: Optional[Dict] = None) -> Dict:
+        """
+        Upload chat requests as a JSONL file and create an OpenAI batch (24h window).
+
+        Args:
+            requests: Batch input lines ({"custom_id", "method", "url", "body"})
+            metadata: Batch metadata (e.g. our job ID)
+
+        Returns:
+            Batch object (id, status, output_file_id, ...)
+        """
+        payload = "\n".join(json.dumps(request, ensure_ascii=False) for request in requests).encode("utf-8")
+        uploaded = self._call("batch", self.client.files.create, 0, file=("batch.jsonl", payload, "application/jsonl"), purpose="batch")
+        body = {"input_file_id": uploaded.id, "endpoint": "/v1/chat/completions", "completion_window": "24h"}
+        if metadata:
+            body["metadata"] = metadata
+        return self._call("batch", self._api_request, 0, method="post", path="/batches", body=body)
+
+    def get_batch(self, batch_id: str) -> Dict:
+        """Get an OpenAI batch object (status, request counts, output/error file IDs)."""
+        return self._call("batch", self._api_request, 0, method="get", path=f"/batches/{batch_id}")
+
+    def get_file_content(self, file_id: str) -> str:
+        """Download a file (batch output or error JSONL) as text."""
+        return self._call("batch", self.client.files.content, 0, file_id=file_id).text
+
+    def _api_request(self, method: str, path: str, body: Optional[Dict] = None, timeout: Optional[float] = None) -> Dict:
+        """JSON API call for resources without an SDK helper in the pinned openai version (batches)."""
+        options = {"timeout": timeout} if timeout else {}
+        if method == "post":
+            response = self.client.post(path, cast_to=httpx.Response, body=body, options=options)
+        else:
+            response = self.client.get(path, cast_to=httpx.Response, options=options)
+        return response.json()
+
+    def get_stats(self) -> Dict:
+        """Get gateway counters and circuit breaker state."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["circuit_state"] = self.breaker.state
+        stats["hedge_rate"] = stats["hedged"] / stats["hedge_eligible"] if stats["hedge_eligible"] else 0.0
+        stats["hedge_win_rate"] = stats["hedge_wins"] / stats["hedged"] if stats["hedged"] else 0.0
+        return stats
+
+
+# Global singleton (created lazily on first call)
+_gateway_instance: Optional[ModelGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> ModelGateway:
+    """
+    Get global model gateway instance (singleton pattern).
+
+    Returns:
+        ModelGateway instance
+    """
+    global _gateway_instance
+    if _gateway_instance is None:
+        with _gateway_lock:
+            if _gateway_instance is None:
+                _gateway_instance = ModelGateway()
+    return _gateway_instance
+
+
+def get_gateway_stats() -> Optional[Dict]:
+    """Get gateway stats without creating the gateway (None if not initialized)."""
+    if _gateway_instance is None:
+        return None
+    return _gateway_instance.get_stats()
@@ -1,11 +1,14 @@
 """Main FastAPI application (lightweight metadata POC)."""
 import os
+import secrets
 import time
 from typing import Optional
 
-from fastapi import FastAPI, Form, HTTPException, UploadFile, File
+from fastapi import FastAPI, Form, Header, HTTPException, Request, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from starlette.background import BackgroundTask
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 try:
@@ -15,15 +18,21 @@ except Exception:
 
 # DIMA semantic layer
 try:
-    from dima_detector import get_detector
+    from dima_detector import get_detector, get_reload_status, reload_detector, reload_detector_async, start_taxonomy_watcher
     DIMA_AVAILABLE = True
 except ImportError:
     DIMA_AVAILABLE = False
 
+from metrics import METRICS_ENABLED, REQUEST_SECONDS, render_metrics, server_timing_header, start_request
+from tracing import get_logger, new_request_id, set_request_id, start_span
+from token_budget import get_request_usage, get_usage_stats, start_request_usage, tokenizer_name
+
 # Avoid importing heavy task/redis code at startup; import inside endpoints when needed
 
 load_dotenv()
 
+logger = get_logger("api")
+
 app = FastAPI(title="InfoVerif API", version="1.0.0")
 
 # Include extension routes
@@ -36,6 +45,17 @@ except ImportError:
 # Global DIMA detector instance (loaded at startup)
 dima_detector = None
 
+# Taxonomy hot reload: admin token for /admin/reload-taxonomy, file watcher interval (0 = off)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+TAXONOMY_WATCH_INTERVAL = float(os.getenv("DIMA_TAXONOMY_WATCH_INTERVAL", "0"))
+
+
+def current_detector():
+    """Current DIMA detector (follows hot reloads), or None if DIMA failed to load at startup."""
+    if DIMA_AVAILABLE and dima_detector is not None:
+        return get_detector()
+    return None
+
 # Feature flags (Deep is default)
 DEEP_ANALYSIS_ENABLED = os.getenv("DEEP_ANALYSIS_ENABLED", "true").lower() == "true"
 
@@ -47,6 +67,12 @@ def create_analysis_response(result: dict, start_time: float) -> JSONResponse:
     """
     Create JSONResponse with custom headers for extension compatibility.
     
+    x-model-card reports the model that actually answered (hedging may
+    switch to LLM_HEDGE_MODEL); x-taxonomy-version reports the taxonomy
+    version the analysis ran on (stable across a concurrent hot reload).
+    The request's model usage (tokens, estimated cost, per stage) is added
+    as "llm_usage" and summarized in x-llm-tokens / x-llm-cost-usd.
+    
     Args:
         result: Analysis result dict
         start_time: Request start timestamp
@@ -56,16 +82,23 @@ def create_analysis_response(result: dict, start_time: float) -> JSONResponse:
     """
     latency_ms = int((time.time() - start_time) * 1000)
     
-    # Determine taxonomy version from DIMA availability
-    taxonomy_version = "DIMA-M2.2-130" if DIMA_AVAILABLE and dima_detector else "legacy"
+    # Determine taxonomy version (pinned by the analysis, else current)
+    detector = current_detector()
+    taxonomy_version = result.get("taxonomy_version") or (detector.taxonomy_version if detector else "legacy")
     
     headers = {
-        "x-model-card": "gpt-4o-mini",
+        "x-model-card": result.get("model_used") or os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
         "x-taxonomy-version": taxonomy_version,
         "x-latency-ms": str(latency_ms),
         "x-backend-version": BACKEND_VERSION,
     }
     
+    usage = get_request_usage()
+    if usage is not None and usage["calls"]:
+        result = dict(result, llm_usage=usage)
+        headers["x-llm-tokens"] = str(usage["prompt_tokens"] + usage["completion_tokens"])
+        headers["x-llm-cost-usd"] = f"{usage['cost_usd']:.6f}"
+    
     return JSONResponse(content=result, headers=headers)
 
 # CORS - Allow web app + Chrome extension
@@ -83,9 +116,39 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["x-model-card", "x-taxonomy-version", "x-latency-ms", "x-backend-version"],  # Expose custom headers for extension
+    expose_headers=["x-model-card", "x-taxonomy-version", "x-latency-ms", "x-backend-version", "x-request-id", "Server-Timing", "x-llm-tokens", "x-llm-cost-usd"],  # Expose custom headers for extension
 )
 
+
+@app.middleware("http")
+async def stage_timing_middleware(request: Request, call_next):
+    """Collect per-stage timings of the request (metrics.stage) into a Server-Timing header."""
+    if not METRICS_ENABLED:
+        return await call_next(request)
+    started = time.perf_counter()
+    timings = start_request()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(getattr(route, "path", "unmatched"), elapsed)
+    response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    return response
+
+
+@app.middleware("http")
+async def request_context_middleware(request: Request, call_next):
+    """Assign a request ID (x-request-id in/out), start usage accounting and open the request's root span."""
+    request_id = new_request_id(request.headers.get("x-request-id"))
+    set_request_id(request_id)
+    start_request_usage()
+    with start_span("http_request", method=request.method, path=request.url.path) as span:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        span.set(route=getattr(route, "path", "unmatched"), status=response.status_code)
+    response.headers["x-request-id"] = request_id
+    return response
+
 # Redis connection (optional)
 redis_conn = None
 try:
@@ -113,11 +176,18 @@ async def startup_event():
             else:
                 print("⚠️  DIMA embeddings NOT available (sentence-transformers/faiss missing or failed to load)")
                 print("   Continuing with M2.1 (prompts-only, no semantic similarity)")
+            
+            if TAXONOMY_WATCH_INTERVAL > 0:
+                start_taxonomy_watcher(TAXONOMY_WATCH_INTERVAL)
+                print(f"👀 Watching DIMA taxonomy files every {TAXONOMY_WATCH_INTERVAL:g}s")
         except Exception as e:
             print(f"⚠️  Error loading DIMA taxonomy: {e}")
             print("   Continuing with degraded functionality (legacy prompts only)")
     else:
         print("⚠️  DIMA modules not available, using legacy prompts")
+    
+    # Load the tokenizer now rather than on the first analysis (prompt token budget)
+    print(f"🔢 Prompt tokenizer: {tokenizer_name()}")
 
 
 # Request/response models kept minimal for POC
@@ -132,17 +202,50 @@ async def health():
     data = {"status": "ok", "service": "infoverif-api"}
     
     # DIMA status
-    if DIMA_AVAILABLE and dima_detector:
-        stats = dima_detector.get_taxonomy_stats()
+    detector = current_detector()
+    if detector:
+        stats = detector.get_taxonomy_stats()
         data["dima"] = {
             "status": "loaded",
             "techniques": stats['total_techniques'],
             "families": stats['total_families'],
-            "embeddings_enabled": dima_detector.is_embeddings_enabled()
+            "embeddings_enabled": detector.is_embeddings_enabled(),
+            "taxonomy_version": detector.taxonomy_version,
+            "reload": get_reload_status()
         }
+        if detector.query_cache is not None:
+            data["dima"]["query_cache"] = detector.query_cache.get_stats()
     else:
         data["dima"] = {"status": "unavailable"}
     
+    # Model gateway status (only once initialized by an analysis)
+    try:
+        from llm_gateway import get_gateway_stats
+        gateway_stats = get_gateway_stats()
+        if gateway_stats is not None:
+            data["llm_gateway"] = gateway_stats
+    except ImportError:
+        pass
+    
+    # Cumulative model usage and estimated spend (this worker)
+    data["llm_usage"] = get_usage_stats()
+    
+    # Near-duplicate submissions (only once a text has been indexed)
+    try:
+        from near_duplicate import get_near_duplicate_stats
+        near_duplicate_stats = get_near_duplicate_stats()
+        if near_duplicate_stats is not None:
+            data["near_duplicates"] = near_duplicate_stats
+    except ImportError:
+        pass
+    
+    # /analyze-lite page cache and hosts skipped after connection failures
+    try:
+        from lite import get_lite_cache_stats
+        data["lite_cache"] = get_lite_cache_stats()
+    except ImportError:
+        pass
+    
     # Redis status
     if redis is not None:
         try:
@@ -157,6 +260,14 @@ async def health():
     return data
 
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Stage and request latency histograms (Prometheus text format, this worker only)."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled by configuration")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/dima-taxonomy")
 async def dima_taxonomy_endpoint():
     """
@@ -165,20 +276,21 @@ async def dima_taxonomy_endpoint():
     Returns:
         Taxonomy statistics and sample techniques
     """
-    if not DIMA_AVAILABLE or not dima_detector:
+    detector = current_detector()
+    if not detector:
         raise HTTPException(status_code=503, detail="DIMA taxonomy not loaded")
     
-    stats = dima_detector.get_taxonomy_stats()
-    families = dima_detector.get_all_families()
+    stats = detector.get_taxonomy_stats()
+    families = detector.get_all_families()
     
     # Sample techniques per family (first 3)
     samples = {}
     for family in families:
-        codes = dima_detector.get_family_techniques(family)[:3]
+        codes = detector.get_family_techniques(family)[:3]
         samples[family] = [
             {
                 "code": code,
-                "name": dima_detector.get_technique(code)['name_fr']
+                "name": detector.get_technique(code)['name_fr']
             }
             for code in codes
         ]
@@ -191,22 +303,59 @@ async def dima_taxonomy_endpoint():
     }
 
 
+def require_admin_token(x_admin_token: Optional[str]):
+    """Reject the request unless it carries ADMIN_TOKEN (404 when no token is configured)."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@app.post("/admin/reload-taxonomy")
+async def reload_taxonomy_endpoint(wait: bool = False, x_admin_token: Optional[str] = Header(None)):
+    """
+    Hot-reload the DIMA taxonomy, examples, embeddings and prompt prefixes.
+    
+    The new version is built in the background and swapped in atomically;
+    in-flight analyses finish on the previous version. Only the worker that
+    serves this request reloads (use DIMA_TAXONOMY_WATCH_INTERVAL for all workers).
+    
+    Args:
+        wait: Block until the new version is live (default: return immediately)
+        x_admin_token: Must match ADMIN_TOKEN
+    """
+    require_admin_token(x_admin_token)
+    if not current_detector():
+        raise HTTPException(status_code=503, detail="DIMA taxonomy not loaded")
+    
+    if wait:
+        try:
+            detector = await run_in_threadpool(reload_detector)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Taxonomy reload failed: {str(e)[:300]}")
+        return {"status": "reloaded", "taxonomy_version": detector.taxonomy_version, "reload": get_reload_status()}
+    
+    started = reload_detector_async()
+    return JSONResponse(
+        status_code=202 if started else 409,
+        content={"status": "reloading" if started else "already_reloading", "reload": get_reload_status()}
+    )
+
+
 @app.get("/test-openai")
 async def test_openai():
     """Test OpenAI API connection."""
     import json
-    from openai import OpenAI
+    from llm_gateway import get_gateway
     
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         return {"status": "error", "message": "OPENAI_API_KEY not configured"}
     
     try:
-        client = OpenAI(api_key=api_key)
-        
-        # Simple JSON test
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+        # Simple JSON test (shared pooled client)
+        response = get_gateway().chat_completion(
+            endpoint="probe",
             messages=[
                 {"role": "system", "content": "You respond only in JSON."},
                 {"role": "user", "content": "Return JSON with: test_score (integer 42), message (string 'working')"}
@@ -378,6 +527,32 @@ async def analyze_lite(url: str = Form(...), platform: Optional[str] = Form(None
         raise HTTPException(status_code=400, detail=f"analyze-lite failed: {str(e)[:200]}")
 
 
+@app.post("/analyze-lite/stream")
+async def analyze_lite_stream(request: Request):
+    """
+    Lightweight analysis of a feed of URLs (NDJSON body: one URL or {"url", "platform", "id"} per line).
+
+    Streams one NDJSON result line per URL as it completes (not in input order),
+    then a summary line. Bodies over MAX_STREAM_BODY_BYTES are rejected with 413.
+    """
+    import tempfile
+    from lite import MAX_STREAM_BODY_BYTES, analyze_url_stream, iter_file_chunks
+    # The streaming response listens for client disconnects on the same ASGI
+    # channel as the body, so the body is spooled (to disk past 1 MB) first
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    size = 0
+    async for data in request.stream():
+        size += len(data)
+        if size > MAX_STREAM_BODY_BYTES:
+            spool.close()
+            raise HTTPException(status_code=413, detail=f"Stream body larger than {MAX_STREAM_BODY_BYTES} bytes")
+        spool.write(data)
+    spool.seek(0)
+    return StreamingResponse(
+        analyze_url_stream(iter_file_chunks(spool)), media_type="application/x-ndjson", background=BackgroundTask(spool.close)
+    )
+
+
 @app.post("/analyze-text")
 async def analyze_text_endpoint(text: str = Form(...), platform: Optional[str] = Form("text"), language: Optional[str] = Form("fr")):
     start_time = time.time()
@@ -463,9 +638,9 @@ async def analyze_video_url_endpoint(
     try:
         from deep import analyze_url
         
-        print(f"🎬 Analyzing video URL: {url}")
+        logger.info("🎬 Analyzing video URL", url=url)
         if text:
-            print(f"📝 Multimodal mode: Post text provided ({len(text)} chars)")
+            logger.info("📝 Multimodal mode: post text provided", chars=len(text))
         
         result = analyze_url(url, platform or "video", post_text=text)
         
@@ -478,7 +653,7 @@ async def analyze_video_url_endpoint(
     except Exception as e:
         import traceback
         full_error = traceback.format_exc()
-        print(f"❌ analyze-video-url failed: {str(e)}\n{full_error}")
+        logger.error("❌ analyze-video-url failed", error=str(e), traceback=full_error)
         raise HTTPException(status_code=400, detail=f"analyze-video-url failed: {str(e)[:300]}")
 
 
@@ -507,6 +682,133 @@ async def analyze_image_endpoint(file: UploadFile = File(...), platform: Optiona
         raise HTTPException(status_code=400, detail=f"analyze-image failed: {str(e)[:300]}")
 
 
+
+# ---------------------------------------------------------------------------
+# Batch analysis (see batch.py)
+# ---------------------------------------------------------------------------
+
+BATCH_UPLOAD_CHUNK = 1024 * 1024
+
+
+async def upload_chunks(upload: UploadFile):
+    """Read a multipart upload in BATCH_UPLOAD_CHUNK pieces."""
+    while True:
+        data = await upload.read(BATCH_UPLOAD_CHUNK)
+        if not data:
+            return
+        yield data
+
+
+def batch_job_response(job, status_code: int = 200) -> JSONResponse:
+    """Job status with the URLs to poll and download."""
+    data = job.to_dict()
+    data["status_url"] = f"/analyze/batch/{job.job_id}"
+    data["results_url"] = f"/analyze/batch/{job.job_id}/results"
+    return JSONResponse(content=data, status_code=status_code)
+
+
+def require_batch_access(x_admin_token: Optional[str]):
+    """Batch jobs run paid model calls at scale: enabled explicitly and admin only."""
+    if not DEEP_ANALYSIS_ENABLED:
+        raise HTTPException(status_code=404, detail="Deep analysis is disabled by configuration")
+    import batch
+    if not batch.BATCH_ENABLED:
+        raise HTTPException(status_code=404, detail="Batch analysis is disabled by configuration")
+    require_admin_token(x_admin_token)
+
+
+def get_batch_job(job_id: str, x_admin_token: Optional[str]):
+    require_batch_access(x_admin_token)
+    import batch
+    job = batch.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown batch job")
+    return job
+
+
+@app.post("/analyze/batch")
+async def analyze_batch_endpoint(request: Request, language: str = "fr", platform: str = "text", backend: str = "online", x_admin_token: Optional[str] = Header(None)):
+    """
+    Start a batch job over JSONL records (one {"id", "text", "language", "platform"} per line).
+
+    The input is the raw request body (application/x-ndjson) or a multipart
+    "file" field (language/platform/backend may also be form fields).
+    Returns 202 with the job status; results stream into /analyze/batch/{job_id}/results.
+    Requires BATCH_ENABLED and the x-admin-token header.
+    """
+    require_batch_access(x_admin_token)
+    import batch
+    if not os.getenv("OPENAI_API_KEY"):
+        raise HTTPException(status_code=500, detail="OPENAI_API_KEY not configured")
+
+    upload = None
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Missing 'file' field (JSONL records)")
+        language = form.get("language") or language
+        platform = form.get("platform") or platform
+        backend = form.get("backend") or backend
+
+    try:
+        job = batch.create_job(backend, language, platform)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        f = await run_in_threadpool(open, job.input_path, "wb")
+        try:
+            size = 0
+            chunks = upload_chunks(upload) if upload is not None else request.stream()
+            async for data in chunks:
+                size += len(data)
+                if size > batch.BATCH_MAX_INPUT_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Batch input larger than {batch.BATCH_MAX_INPUT_BYTES} bytes")
+                await run_in_threadpool(f.write, data)
+        finally:
+            await run_in_threadpool(f.close)
+        await run_in_threadpool(batch.prepare_input, job)
+    except ValueError as e:
+        batch.discard_job(job)
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        # Too large, client gone, disk error...: never leave a job stuck in "created"
+        batch.discard_job(job)
+        raise
+
+    batch.start_job(job)
+    logger.info("📦 Batch job accepted", job_id=job.job_id, backend=job.backend, records=job.total)
+    return batch_job_response(job, status_code=202)
+
+
+@app.get("/analyze/batch/{job_id}")
+async def batch_status_endpoint(job_id: str, x_admin_token: Optional[str] = Header(None)):
+    """Batch job progress (status, processed/total, failures, token usage)."""
+    return batch_job_response(get_batch_job(job_id, x_admin_token))
+
+
+@app.get("/analyze/batch/{job_id}/results")
+async def batch_results_endpoint(job_id: str, x_admin_token: Optional[str] = Header(None)):
+    """Results written so far, one JSON line per record (complete once status is 'completed')."""
+    job = get_batch_job(job_id, x_admin_token)
+    if not os.path.exists(job.output_path):
+        return PlainTextResponse("", media_type="application/x-ndjson")
+    return FileResponse(job.output_path, media_type="application/x-ndjson", filename=f"batch-{job_id}.jsonl")
+
+
+@app.post("/analyze/batch/{job_id}/resume")
+async def batch_resume_endpoint(job_id: str, x_admin_token: Optional[str] = Header(None)):
+    """Continue an interrupted or failed job from its checkpoint."""
+    import batch
+    job = get_batch_job(job_id, x_admin_token)
+    try:
+        batch.start_job(job)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return batch_job_response(job, status_code=202)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8000)))
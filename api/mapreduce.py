@@ -0,0 +1,272 @@
+"""
+Long-content map-reduce analysis.
+
+Splits long transcripts into overlapping segments (at sentence boundaries),
+analyzes them concurrently under a concurrency cap, then merges techniques
+and claims (deduplicated by DIMA code + evidence) and aggregates scores.
+Segment results are cached by content hash, so a re-run only pays for the
+segments whose text changed.
+"""
+import contextvars
+import copy
+import hashlib
+import re
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+
+SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2}
+SCORE_FIELDS = ["propaganda_score", "conspiracy_score", "misinfo_score", "overall_risk"]
+
+# Preferred cut points, strongest first (searched backwards from the segment end)
+_BOUNDARIES = ["\n\n", "\n", ". ", "! ", "? ", "; ", ", ", " "]
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _normalize(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", (text or "").strip().lower())
+
+
+def split_into_segments(text: str, max_chars: int = 8000, overlap: int = 300) -> List[Dict]:
+    """
+    Split text into segments of at most `max_chars`, cut at natural boundaries.
+
+    Consecutive segments overlap by up to `overlap` chars so that a technique
+    straddling a cut is seen whole by at least one segment.
+
+    Args:
+        text: Full transcript
+        max_chars: Maximum segment length
+        overlap: Overlap between consecutive segments
+
+    Returns:
+        List of dicts with index, start, end (char offsets) and text
+    """
+    segments = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + max_chars, length)
+        if end < length:
+            # Look for a boundary in the last 20% of the window
+            floor = start + int(max_chars * 0.8)
+            for boundary in _BOUNDARIES:
+                cut = text.rfind(boundary, floor, end)
+                if cut != -1:
+                    end = cut + len(boundary)
+                    break
+        segments.append({"index": len(segments), "start": start, "end": end, "text": text[start:end]})
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+    return segments
+
+
+def segment_cache_key(text: str, language: str, variant: str = "") -> str:
+    """Cache key for one segment analysis (content + language + prompt variant)."""
+    digest = hashlib.sha256()
+    digest.update(f"{language}|{variant}|".encode("utf-8"))
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SegmentCache:
+    """Thread-safe in-memory LRU cache of segment analyses."""
+
+    def __init__(self, capacity: int = 512):
+        self.capacity = capacity
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry)
+
+    def put(self, key: str, analysis: Dict):
+        with self._lock:
+            self._entries[key] = copy.deepcopy(analysis)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def analyze_segments(
+    segments: List[Dict],
+    analyze_fn: Callable[[Dict], Dict],
+    max_workers: int = 4,
+    cache: Optional[SegmentCache] = None,
+    cache_variant: str = "",
+    language: str = "fr"
+) -> List[Dict]:
+    """
+    Map step: analyze segments concurrently, reusing cached segment results.
+
+    Args:
+        segments: Output of split_into_segments
+        analyze_fn: Callable analyzing one segment dict, returning an analysis dict
+        max_workers: Concurrency cap
+        cache: Optional segment cache
+        cache_variant: Extra cache key component (prompt/model variant)
+        language: Language code (part of the cache key)
+
+    Returns:
+        Analyses in segment order; a segment whose analysis raised is
+        {"segment_error": "..."} (the first error is raised if every segment failed)
+    """
+    results: List[Optional[Dict]] = [None] * len(segments)
+    todo = []
+    for segment in segments:
+        key = segment_cache_key(segment["text"], language, cache_variant)
+        cached = cache.get(key) if cache else None
+        if cached is not None:
+            results[segment["index"]] = cached
+        else:
+            todo.append((segment, key))
+
+    if todo:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(todo))), thread_name_prefix="segment") as pool:
+            # Run in copies of the caller's context (per-request stage timings follow the segments)
+            futures = [
+                (segment, key, pool.submit(contextvars.copy_context().run, analyze_fn, segment))
+                for segment, key in todo
+            ]
+            errors = []
+            for segment, key, future in futures:
+                try:
+                    analysis = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    results[segment["index"]] = {"segment_error": f"{type(e).__name__}: {str(e)[:200]}"}
+                    continue
+                results[segment["index"]] = analysis
+                if cache and not analysis.get("degraded"):
+                    cache.put(key, analysis)
+            if len(errors) == len(segments):
+                raise errors[0]
+
+    return results
+
+
+def merge_segment_analyses(segments: List[Dict], analyses: List[Dict]) -> Dict:
+    """
+    Reduce step: merge per-segment analyses into one report.
+
+    - Techniques are deduplicated by (DIMA code, normalized evidence), keeping
+      the highest severity; evidence spans are shifted to full-text offsets.
+    - Claims are deduplicated by normalized text.
+    - Scores blend the maximum (one strongly manipulative segment matters)
+      with the length-weighted mean (how pervasive it is).
+    - Failed segments ({"segment_error"}) are left out and flagged in
+      "segments"; the merged report is then marked degraded.
+
+    Args:
+        segments: Output of split_into_segments
+        analyses: Per-segment analyses (same order)
+
+    Returns:
+        Merged analysis dictionary
+    """
+    merged: Dict = {}
+    all_segments = segments
+    all_analyses = analyses
+    succeeded = [(segment, analysis) for segment, analysis in zip(segments, analyses) if "segment_error" not in analysis]
+    segments = [segment for segment, _ in succeeded]
+    analyses = [analysis for _, analysis in succeeded]
+
+    total_chars = sum(len(segment["text"]) for segment in segments) or 1
+    for field in SCORE_FIELDS:
+        values = [float(analysis.get(field, 0) or 0) for analysis in analyses]
+        weighted_mean = sum(
+            value * len(segment["text"]) for value, segment in zip(values, segments)
+        ) / total_chars
+        merged[field] = int(round(0.5 * max(values, default=0) + 0.5 * weighted_mean))
+
+    techniques: Dict[tuple, Dict] = {}
+    for segment, analysis in zip(segments, analyses):
+        for tech in analysis.get("techniques", []):
+            tech = dict(tech)
+            span = tech.get("evidence_span")
+            if span:
+                tech["evidence_span"] = [span[0] + segment["start"], span[1] + segment["start"]]
+            key = (tech.get("dima_code") or _normalize(tech.get("name", "")), _normalize(tech.get("evidence", "")))
+            existing = techniques.get(key)
+            if existing is None:
+                tech["segment"] = segment["index"]
+                techniques[key] = tech
+            elif SEVERITY_RANK.get(tech.get("severity"), 1) > SEVERITY_RANK.get(existing.get("severity"), 1):
+                existing["severity"] = tech.get("severity")
+    merged["techniques"] = list(techniques.values())
+
+    claims: Dict[str, Dict] = {}
+    for segment, analysis in zip(segments, analyses):
+        for claim in analysis.get("claims", []):
+            key = _normalize(claim.get("claim", ""))
+            if key and key not in claims:
+                claims[key] = dict(claim, segment=segment["index"])
+    merged["claims"] = list(claims.values())
+
+    hints: Dict[str, Dict] = {}
+    for analysis in analyses:
+        for hint in analysis.get("embedding_hints", []) or []:
+            code = hint.get("code")
+            if code and (code not in hints or hint.get("similarity", 0) > hints[code].get("similarity", 0)):
+                hints[code] = hint
+    if hints:
+        merged["embedding_hints"] = sorted(hints.values(), key=lambda h: h.get("similarity", 0), reverse=True)
+
+    summaries = [analysis.get("summary", "").strip() for analysis in analyses if analysis.get("summary")]
+    merged["summary"] = " ".join(summaries[:4])
+    for field in ("content_summary", "technique_interactions"):
+        texts = list(OrderedDict.fromkeys(
+            (analysis.get(field) or "").strip() for analysis in analyses if (analysis.get(field) or "").strip()
+        ))
+        if texts:
+            merged[field] = " ".join(texts[:4])
+    trimmed = list(OrderedDict.fromkeys(section for analysis in analyses for section in analysis.get("prompt_trimmed") or []))
+    if trimmed:
+        merged["prompt_trimmed"] = trimmed
+
+    models = Counter(analysis.get("model_used") for analysis in analyses if analysis.get("model_used"))
+    if models:
+        merged["model_used"] = models.most_common(1)[0][0]
+    output_modes = [analysis["output_mode"] for analysis in analyses if analysis.get("output_mode")]
+    if output_modes:
+        merged["output_mode"] = output_modes[0]
+    if len(analyses) < len(all_analyses) or any(analysis.get("degraded") for analysis in analyses):
+        merged["degraded"] = True
+    tiers = [analysis["prompt_tier"] for analysis in analyses if analysis.get("prompt_tier")]
+    if tiers:
+        names = {tier["tier"] for tier in tiers}
+        merged["prompt_tier"] = {
+            "tier": names.pop() if len(names) == 1 else "mixed",
+            "prompt_tokens": sum(tier["prompt_tokens"] for tier in tiers)
+        }
+
+    merged["segments"] = []
+    for segment, analysis in zip(all_segments, all_analyses):
+        entry = {
+            "index": segment["index"],
+            "start": segment["start"],
+            "end": segment["end"],
+            "overall_risk": analysis.get("overall_risk", 0),
+            "prompt_tier": (analysis.get("prompt_tier") or {}).get("tier")
+        }
+        if "segment_error" in analysis:
+            entry.update(status="failed", error=analysis["segment_error"])
+        merged["segments"].append(entry)
+    return merged
@@ -0,0 +1,182 @@
+"""
+Per-stage latency instrumentation.
+
+Pipeline code wraps its stages in `with stage("llm_call") as span:`. Each
+stage is recorded:
+- in a process-wide histogram (exported in Prometheus text format on /metrics,
+  with the counters other modules register, e.g. token usage in token_budget.py)
+- in the current request's timings (contextvar), summarized in the
+  `Server-Timing` response header by the middleware in main.py
+- as a tracing span (see tracing.py), to which attributes can be added
+
+Overhead is two perf_counter calls, a bisect and a lock per stage. Metrics are
+per process: with several gunicorn workers, each scrape sees one worker.
+
+Environment variables:
+- METRICS_ENABLED: record stage timings and serve /metrics (default true)
+"""
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from tracing import start_span
+
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Seconds; covers cache hits (ms) up to long video pipelines (minutes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Stage → [total seconds, calls] for the request being handled (None outside requests)
+_request_timings: contextvars.ContextVar[Optional[Dict[str, List[float]]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+# Every histogram/counter created, in render order
+_REGISTRY: List = []
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label value."""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._series: Dict[str, List] = {}  # label value → [bucket counts, sum, count]
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def observe(self, label_value: str, seconds: float):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        """Prometheus text exposition lines."""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for label_value, (counts, total, count) in sorted(snapshot.items()):
+            labels = f'{self.label}="{label_value}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with one series per tuple of label values."""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def inc(self, label_values: Tuple[str, ...], amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        """Prometheus text exposition lines."""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.snapshot().items()):
+            labels = ",".join(f'{label}="{label_value}"' for label, label_value in zip(self.labels, label_values))
+            lines.append(f"{self.name}{{{labels}}} {value:.12g}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "infoverif_stage_duration_seconds", "Duration of pipeline stages (download, transcription, LLM call, ...)", "stage"
+)
+REQUEST_SECONDS = Histogram(
+    "infoverif_request_duration_seconds", "Duration of HTTP requests by route", "route"
+)
+
+# Hedged model calls (llm_gateway.chat_completion_hedged): hedge rate = fired / eligible,
+# win rate = won / fired
+HEDGE_ELIGIBLE = Counter("infoverif_llm_hedge_eligible_total", "Model calls eligible for hedging by endpoint", ("endpoint",))
+HEDGE_FIRED = Counter("infoverif_llm_hedges_total", "Hedge calls fired by endpoint", ("endpoint",))
+HEDGE_WON = Counter("infoverif_llm_hedge_wins_total", "Hedge calls that answered first by endpoint", ("endpoint",))
+
+
+def record_stage(name: str, seconds: float):
+    """Record a stage duration measured by the caller."""
+    if not METRICS_ENABLED:
+        return
+    STAGE_SECONDS.observe(name, seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.get(name)
+        if entry is None:
+            timings[name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+
+@contextmanager
+def stage(name: str, **attributes) -> Iterator:
+    """
+    Time a pipeline stage (histogram + current request's Server-Timing + span).
+
+    Yields:
+        The stage's span (span.set(...) adds attributes; no-op without tracing)
+    """
+    with start_span(name, **attributes) as span:
+        if not METRICS_ENABLED:
+            yield span
+            return
+        started = time.perf_counter()
+        try:
+            yield span
+        finally:
+            record_stage(name, time.perf_counter() - started)
+
+
+def start_request() -> Dict[str, List[float]]:
+    """Start collecting stage timings for the current request (returns the timings dict)."""
+    timings: Dict[str, List[float]] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: Dict[str, List[float]], total_seconds: float) -> str:
+    """Server-Timing header value: one entry per stage (summed), plus the total."""
+    entries = []
+    for name, (seconds, calls) in timings.items():
+        entry = f"{name};dur={seconds * 1000:.1f}"
+        if calls > 1:
+            entry += f';desc="x{calls}"'
+        entries.append(entry)
+    entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def render_metrics() -> str:
+    """All metrics in Prometheus text format."""
+    lines: List[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
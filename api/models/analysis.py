@@ -0,0 +1,151 @@
+"""
+Pydantic models for compact (structured-output) analysis responses.
+
+The compact mode asks the LLM for codes, quotes and enums plus a few short
+context fields (content summary, per-technique impact, technique interactions)
+that cannot be derived from the taxonomy; explanations are rendered locally
+from the DIMA taxonomy (see dima_detector).
+"""
+
+from typing import Dict, List, Literal, Optional
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+
+Severity = Literal["high", "medium", "low"]
+Verdict = Literal["supported", "unsupported", "misleading"]
+ClaimIssue = Literal[
+    "unsourced",
+    "out_of_context",
+    "misleading_statistics",
+    "correlation_causation",
+    "omission",
+    "false_equivalence",
+    "exaggeration",
+    "unfalsifiable",
+    "logical_fallacy",
+]
+
+SEVERITIES: List[str] = list(Severity.__args__)
+VERDICTS: List[str] = list(Verdict.__args__)
+CLAIM_ISSUES: List[str] = list(ClaimIssue.__args__)
+
+
+class CompactScores(BaseModel):
+    """Risk scores (0-100)."""
+    model_config = ConfigDict(extra="forbid")
+
+    propaganda: int = Field(..., ge=0, le=100)
+    conspiracy: int = Field(..., ge=0, le=100)
+    misinfo: int = Field(..., ge=0, le=100)
+    overall: int = Field(..., ge=0, le=100)
+
+    @field_validator("propaganda", "conspiracy", "misinfo", "overall", mode="before")
+    @classmethod
+    def clamp_score(cls, value):
+        """The strict schema cannot carry the range: clamp instead of failing the analysis."""
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return max(0, min(100, value))
+        return value
+
+
+class CompactTechnique(BaseModel):
+    """Detected technique: DIMA code + severity + exact quote from the content."""
+    model_config = ConfigDict(extra="forbid")
+
+    code: str = Field(..., pattern=r"^TE-\d{2,3}$", description="DIMA code (e.g., TE-58)")
+    severity: Severity
+    quote: str = Field(..., description="Exact quotation from the analyzed content")
+    impact: str = Field("", description="Why the technique works in this context (one short sentence)")
+
+
+class CompactClaim(BaseModel):
+    """Claim extracted from the content with a verdict and issue codes."""
+    model_config = ConfigDict(extra="forbid")
+
+    text: str
+    verdict: Verdict
+    issues: List[ClaimIssue] = Field(default_factory=list)
+
+
+class CompactAnalysis(BaseModel):
+    """Full compact analysis as returned by the LLM."""
+    model_config = ConfigDict(extra="forbid")
+
+    scores: CompactScores
+    techniques: List[CompactTechnique] = Field(default_factory=list)
+    claims: List[CompactClaim] = Field(default_factory=list)
+    summary: str = ""
+    content_summary: str = ""
+    interactions: Optional[str] = None
+
+
+def build_compact_response_format(codes: List[str]) -> Dict:
+    """
+    Build the OpenAI `response_format` for strict structured outputs.
+
+    Strict mode requires every property to be listed in `required` and
+    `additionalProperties: false`; out-of-range scores are clamped to 0-100 by
+    the Pydantic model on our side.
+
+    Args:
+        codes: Allowed DIMA codes (constrains the `code` enum)
+
+    Returns:
+        response_format dict for chat.completions.create
+    """
+    score = {"type": "integer"}
+    schema = {
+        "type": "object",
+        "additionalProperties": False,
+        "required": ["scores", "techniques", "claims", "summary", "content_summary", "interactions"],
+        "properties": {
+            "scores": {
+                "type": "object",
+                "additionalProperties": False,
+                "required": ["propaganda", "conspiracy", "misinfo", "overall"],
+                "properties": {
+                    "propaganda": score,
+                    "conspiracy": score,
+                    "misinfo": score,
+                    "overall": score,
+                },
+            },
+            "techniques": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "additionalProperties": False,
+                    "required": ["code", "severity", "quote", "impact"],
+                    "properties": {
+                        "code": {"type": "string", "enum": list(codes)},
+                        "severity": {"type": "string", "enum": SEVERITIES},
+                        "quote": {"type": "string"},
+                        "impact": {"type": "string"},
+                    },
+                },
+            },
+            "claims": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "additionalProperties": False,
+                    "required": ["text", "verdict", "issues"],
+                    "properties": {
+                        "text": {"type": "string"},
+                        "verdict": {"type": "string", "enum": VERDICTS},
+                        "issues": {
+                            "type": "array",
+                            "items": {"type": "string", "enum": CLAIM_ISSUES},
+                        },
+                    },
+                },
+            },
+            "summary": {"type": "string"},
+            "content_summary": {"type": "string"},
+            "interactions": {"type": ["string", "null"]},
+        },
+    }
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "dima_compact_analysis", "strict": True, "schema": schema},
+    }
@@ -0,0 +1,224 @@
+"""
+Near-duplicate submission detection (MinHash LSH).
+
+Coordinated campaigns submit many lightly edited copies of the same text.
+Each analyzed text is reduced to a MinHash signature of its word 3-shingles
+and indexed with locality-sensitive hashing (bands of the signature); a new
+submission whose estimated Jaccard similarity with a recent one reaches the
+threshold reuses that analysis instead of calling the model again, with the
+word-level differences reported. Only analyses of the same language and
+variant (platform, taxonomy version, model) are reused.
+
+Bounded in memory (max entries, oldest evicted) and time-windowed (entries
+older than the window are dropped). In-process only: each worker keeps its own
+index.
+
+Environment variables:
+- NEAR_DUPLICATE_ENABLED (default true)
+- NEAR_DUPLICATE_THRESHOLD: minimum Jaccard similarity (default 0.8)
+- NEAR_DUPLICATE_WINDOW: seconds an analysis stays reusable (default 21600)
+- NEAR_DUPLICATE_MAX_ENTRIES (default 5000)
+- NEAR_DUPLICATE_MIN_WORDS: shorter texts are always analyzed (default 20)
+"""
+import copy
+import difflib
+import itertools
+import os
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+NEAR_DUPLICATE_ENABLED = os.getenv("NEAR_DUPLICATE_ENABLED", "true").lower() == "true"
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+NEAR_DUPLICATE_WINDOW = float(os.getenv("NEAR_DUPLICATE_WINDOW", "21600"))
+NEAR_DUPLICATE_MAX_ENTRIES = int(os.getenv("NEAR_DUPLICATE_MAX_ENTRIES", "5000"))
+NEAR_DUPLICATE_MIN_WORDS = int(os.getenv("NEAR_DUPLICATE_MIN_WORDS", "20"))
+
+# 128 hash functions in 16 bands of 8 rows: pairs above ~0.7 Jaccard share a band
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+MAX_STORED_CHARS = 20000  # Text kept per entry for the word diff
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(1)
+_PERM_A = _rng.integers(1, _MERSENNE_PRIME, NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _MERSENNE_PRIME, NUM_PERM, dtype=np.uint64)
+
+_URL_RE = re.compile(r"https?://\S+")
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_words(text: str) -> List[str]:
+    """Lowercased, accent-folded words (URLs dropped)."""
+    text = unicodedata.normalize("NFKD", _URL_RE.sub(" ", text).casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _WORD_RE.findall(text)
+
+
+def minhash_signature(words: List[str]) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint64 values) of the word shingles of a text."""
+    size = min(SHINGLE_SIZE, len(words))
+    shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode("utf-8")) & _MERSENNE_PRIME for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles)
+    )
+    # (a·x + b) mod p for every hash function and shingle, min per function
+    return ((np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % _MERSENNE_PRIME).min(axis=1)
+
+
+def word_deltas(old_words: List[str], new_words: List[str], limit: int = 50) -> Dict[str, List[str]]:
+    """Words added to / removed from a previous submission (in order, truncated)."""
+    added, removed = [], []
+    matcher = difflib.SequenceMatcher(a=old_words, b=new_words, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag in ("replace", "delete"):
+            removed.append(" ".join(old_words[i1:i2]))
+        if tag in ("replace", "insert"):
+            added.append(" ".join(new_words[j1:j2]))
+    return {"added": added[:limit], "removed": removed[:limit]}
+
+
+class NearDuplicateIndex:
+    """Thread-safe, time-windowed MinHash LSH index of recent analyses."""
+
+    def __init__(
+        self,
+        threshold: float = NEAR_DUPLICATE_THRESHOLD,
+        window_seconds: float = NEAR_DUPLICATE_WINDOW,
+        max_entries: int = NEAR_DUPLICATE_MAX_ENTRIES,
+        min_words: int = NEAR_DUPLICATE_MIN_WORDS
+    ):
+        self.threshold = threshold
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.min_words = min_words
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()  # Oldest first
+        self._buckets: Dict[tuple, set] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _band_keys(signature: np.ndarray) -> List[tuple]:
+        return [(band, signature[band * ROWS:(band + 1) * ROWS].tobytes()) for band in range(BANDS)]
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        for key in self._band_keys(entry["signature"]):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def _expire(self, now: float):
+        while self._entries:
+            entry_id, entry = next(iter(self._entries.items()))
+            if now - entry["created"] <= self.window_seconds and len(self._entries) <= self.max_entries:
+                break
+            self._remove(entry_id)
+
+    def lookup(self, text: str, language: str, variant: str = "") -> Optional[Dict]:
+        """
+        Find a recent analysis of a near-identical text in the same language and variant.
+
+        Args:
+            text: Submitted text
+            language: Language code
+            variant: Everything else the report depends on (platform, taxonomy version, model)
+
+        Returns:
+            Copy of the stored report with a "near_duplicate" section
+            (similarity, age, word deltas), or None
+        """
+        words = normalize_words(text)
+        if len(words) < self.min_words:
+            return None
+        signature = minhash_signature(words)
+
+        with self._lock:
+            self._expire(time.time())
+            candidates = set()
+            for key in self._band_keys(signature):
+                candidates |= self._buckets.get(key, set())
+
+            best, best_similarity = None, 0.0
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if entry["language"] != language or entry["variant"] != variant:
+                    continue
+                similarity = float(np.mean(entry["signature"] == signature))
+                if similarity >= self.threshold and similarity > best_similarity:
+                    best, best_similarity = entry, similarity
+
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            report = copy.deepcopy(best["report"])
+            old_words, created = best["words"], best["created"]
+
+        report["near_duplicate"] = {
+            "similarity": round(best_similarity, 3),
+            "age_seconds": int(time.time() - created),
+            **word_deltas(old_words, normalize_words(text[:MAX_STORED_CHARS]))
+        }
+        return report
+
+    def add(self, text: str, language: str, report: Dict, variant: str = ""):
+        """Index an analysis of `text` under its language and variant (ignored for texts under min_words)."""
+        words = normalize_words(text[:MAX_STORED_CHARS])
+        if len(words) < self.min_words:
+            return
+        signature = minhash_signature(normalize_words(text))
+        entry = {
+            "signature": signature,
+            "language": language,
+            "variant": variant,
+            "words": words,
+            "report": copy.deepcopy(report),
+            "created": time.time(),
+        }
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = entry
+            for key in self._band_keys(signature):
+                self._buckets.setdefault(key, set()).add(entry_id)
+            self._expire(entry["created"])
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_index_instance: Optional[NearDuplicateIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_near_duplicate_index() -> NearDuplicateIndex:
+    """Get or create the process-wide near-duplicate index."""
+    global _index_instance
+    if _index_instance is None:
+        with _index_lock:
+            if _index_instance is None:
+                _index_instance = NearDuplicateIndex()
+    return _index_instance
+
+
+def get_near_duplicate_stats() -> Optional[Dict]:
+    """Index stats, or None if no submission has been indexed yet."""
+    if _index_instance is None:
+        return None
+    return _index_instance.get_stats()
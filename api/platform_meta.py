@@ -0,0 +1,187 @@
+"""
+Platform-native metadata (title, description, author) for YouTube, Twitter/X and TikTok URLs.
+
+Each platform has adapters tried in order, from the lightest structured
+source to the heaviest; fields from earlier adapters win, and the chain
+stops as soon as both title and description are known:
+- youtube: oEmbed (title, author), then yt-dlp info (full description, duration)
+- twitter: oEmbed (tweet text as description, author)
+- tiktok: oEmbed (caption, author), then yt-dlp info
+A few hundred bytes of JSON replace a full page download. Lite analysis
+falls back to scanning the page HTML for whatever is still missing.
+
+yt-dlp info (extract_info(download=False)) is cached per URL; the deep
+pipeline stores the info of the videos it downloads, so the same URL is
+never extracted twice.
+
+Environment variables:
+- PLATFORM_META_ENABLED: use the platform adapters (default true)
+- PLATFORM_META_YTDLP: allow yt-dlp info extraction in the chains (default true)
+- PLATFORM_META_TIMEOUT: oEmbed request timeout in seconds (default 5)
+- PLATFORM_META_CACHE_SIZE, PLATFORM_META_CACHE_TTL: metadata and yt-dlp
+  info kept in memory (default 1024 entries for 3600 s)
+"""
+import html
+import os
+import re
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+
+from metrics import stage
+from tracing import get_logger
+from ttl_cache import TTLCache
+
+
+PLATFORM_META_ENABLED = os.getenv("PLATFORM_META_ENABLED", "true").lower() == "true"
+PLATFORM_META_YTDLP = os.getenv("PLATFORM_META_YTDLP", "true").lower() == "true"
+PLATFORM_META_TIMEOUT = float(os.getenv("PLATFORM_META_TIMEOUT", "5"))
+PLATFORM_META_CACHE_SIZE = int(os.getenv("PLATFORM_META_CACHE_SIZE", "1024"))
+PLATFORM_META_CACHE_TTL = float(os.getenv("PLATFORM_META_CACHE_TTL", "3600"))
+
+# Long descriptions (YouTube allows 5000 characters) are cut before reaching prompts
+DESCRIPTION_MAX_CHARS = 1500
+
+OEMBED_ENDPOINTS = {
+    "youtube": "https://www.youtube.com/oembed",
+    "twitter": "https://publish.twitter.com/oembed",
+    "tiktok": "https://www.tiktok.com/oembed",
+}
+
+FIELDS = ("title", "description", "author", "duration", "thumbnail")
+
+_TWEET_TEXT_RE = re.compile(r"<p[^>]*>(.*?)</p>", re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]+>")
+_BR_RE = re.compile(r"<br\s*/?>", re.IGNORECASE)
+
+
+logger = get_logger("platform_meta")
+
+# URL → normalized yt-dlp info fields; platform|URL → merged adapter result
+_ytdlp_cache = TTLCache(PLATFORM_META_CACHE_SIZE, PLATFORM_META_CACHE_TTL)
+_meta_cache = TTLCache(PLATFORM_META_CACHE_SIZE, PLATFORM_META_CACHE_TTL)
+
+
+def _clean(value) -> Optional[str]:
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    return value or None
+
+
+def _oembed(platform: str, url: str, **params) -> Dict:
+    response = requests.get(
+        OEMBED_ENDPOINTS[platform], params={"url": url, "format": "json", **params}, timeout=PLATFORM_META_TIMEOUT
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def youtube_oembed(url: str) -> Dict:
+    data = _oembed("youtube", url)
+    return {"title": _clean(data.get("title")), "author": _clean(data.get("author_name")), "thumbnail": data.get("thumbnail_url")}
+
+
+def twitter_oembed(url: str) -> Dict:
+    """Tweet text from the embed HTML (<blockquote><p>text</p>— author ...)."""
+    data = _oembed("twitter", url, omit_script="true", dnt="true")
+    text = None
+    match = _TWEET_TEXT_RE.search(data.get("html") or "")
+    if match:
+        text = _clean(html.unescape(_TAG_RE.sub("", _BR_RE.sub("\n", match.group(1)))))
+    author = _clean(data.get("author_name"))
+    return {"title": f"Post de {author}" if author else None, "description": text, "author": author}
+
+
+def tiktok_oembed(url: str) -> Dict:
+    data = _oembed("tiktok", url)
+    caption = _clean(data.get("title"))
+    return {"title": caption, "description": caption, "author": _clean(data.get("author_name")), "thumbnail": data.get("thumbnail_url")}
+
+
+def metadata_from_info(info: Dict) -> Dict:
+    """Normalized fields from a yt-dlp info dict."""
+    return {
+        "title": _clean(info.get("title")),
+        "description": _clean(info.get("description")),
+        "author": _clean(info.get("uploader") or info.get("channel") or info.get("creator")),
+        "duration": info.get("duration"),
+        "thumbnail": info.get("thumbnail"),
+    }
+
+
+def remember_ytdlp_info(url: str, info: Dict):
+    """Cache the info of a video yt-dlp already extracted (e.g. while downloading its audio)."""
+    if info:
+        _ytdlp_cache.put(url, metadata_from_info(info))
+
+
+def ytdlp_info(url: str) -> Dict:
+    """yt-dlp metadata without downloading the media (cached)."""
+    cached = _ytdlp_cache.get(url)
+    if cached is not None:
+        return dict(cached)
+    import yt_dlp
+    options = {"quiet": True, "no_warnings": True, "skip_download": True, "extract_flat": False, "noplaylist": True}
+    with yt_dlp.YoutubeDL(options) as ydl:
+        info = ydl.extract_info(url, download=False)
+    remember_ytdlp_info(url, info)
+    return metadata_from_info(info)
+
+
+# Adapter chains per platform (lightest first)
+PLATFORM_ADAPTERS: Dict[str, Tuple[Tuple[str, Callable[[str], Dict]], ...]] = {
+    "youtube": (("oembed", youtube_oembed), ("yt_dlp", ytdlp_info)),
+    "twitter": (("oembed", twitter_oembed),),
+    "tiktok": (("oembed", tiktok_oembed), ("yt_dlp", ytdlp_info)),
+}
+
+
+def get_platform_metadata(url: str, platform: str) -> Optional[Dict]:
+    """
+    Metadata from the platform's structured sources.
+
+    Args:
+        url: Post or video URL
+        platform: detect_platform() result
+
+    Returns:
+        {"title", "description", "author", "duration", "thumbnail", "sources"}
+        (fields may be None), or None when no adapter applies or all failed
+    """
+    adapters = PLATFORM_ADAPTERS.get(platform)
+    if not PLATFORM_META_ENABLED or not adapters:
+        return None
+    cache_key = f"{platform}|{url}"
+    cached = _meta_cache.get(cache_key)
+    if cached is not None:
+        return dict(cached)
+
+    merged: Dict = dict.fromkeys(FIELDS)
+    sources = []
+    for name, adapter in adapters:
+        if name == "yt_dlp" and not PLATFORM_META_YTDLP:
+            continue
+        try:
+            with stage(f"platform_meta_{name}", platform=platform):
+                fields = adapter(url)
+        except Exception as e:
+            logger.warning("⚠️  Platform metadata failed", platform=platform, adapter=name, error=str(e)[:200])
+            continue
+        sources.append(name)
+        for key, value in fields.items():
+            if merged.get(key) is None and value is not None:
+                merged[key] = value
+        if merged["title"] and merged["description"]:
+            break
+    if not sources:
+        return None
+    if merged["description"] and len(merged["description"]) > DESCRIPTION_MAX_CHARS:
+        merged["description"] = merged["description"][:DESCRIPTION_MAX_CHARS].rstrip() + "…"
+    merged["sources"] = sources
+    _meta_cache.put(cache_key, dict(merged))
+    return merged
+
+
+def get_platform_meta_stats() -> Dict:
+    return {"metadata": _meta_cache.get_stats(), "yt_dlp_info": _ytdlp_cache.get_stats()}
@@ -0,0 +1,394 @@
+"""
+Token accounting and prompt/cost budgets for LLM calls.
+
+- Prompt tokens are counted before sending (tiktoken when installed, else
+  ~4 chars/token). Encoders are loaded once per model and counts of repeated
+  texts (static prompt sections, retries, map-reduce re-runs) are cached.
+- fit_prompt() keeps a prompt under LLM_PROMPT_TOKEN_BUDGET by dropping, in
+  order: the few-shot examples, the embedding hints, then the end of the
+  content. Trims are logged and reported in the analysis.
+- Actual usage (response.usage) is recorded by the model gateway per stage
+  (gateway endpoint) and model: cumulative counters on /metrics and /health,
+  plus the current request's usage (contextvar, returned with the analysis).
+- LLM_REQUEST_COST_BUDGET_USD caps the spend of one request; the gateway
+  refuses calls beyond it (callers fall back like for an unavailable model).
+
+Environment variables:
+- LLM_PROMPT_TOKEN_BUDGET: max prompt tokens per call, 0 = unlimited (default 12000)
+- LLM_REQUEST_COST_BUDGET_USD: max spend per request, 0 = unlimited (default 0)
+- LLM_PRICE_INPUT_PER_1M / LLM_PRICE_OUTPUT_PER_1M: override model prices (USD per 1M tokens)
+- TOKEN_COUNT_CACHE_SIZE: cached token counts (default 2048)
+"""
+import contextvars
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken  # optional: exact counts
+except ImportError:
+    tiktoken = None
+
+from metrics import Counter
+from tracing import get_logger
+
+
+DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+PROMPT_TOKEN_BUDGET = int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", "12000"))
+REQUEST_COST_BUDGET = float(os.getenv("LLM_REQUEST_COST_BUDGET_USD", "0"))
+TOKEN_COUNT_CACHE_SIZE = int(os.getenv("TOKEN_COUNT_CACHE_SIZE", "2048"))
+
+# Fallback when tiktoken (or its encoding files) is unavailable
+CHARS_PER_TOKEN = 4
+
+# Chat format overhead (role markers per message, reply priming)
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+# Content is never trimmed below this (the prompt is sent over budget instead)
+MIN_CONTENT_TOKENS = 256
+
+# Texts shorter than this are counted directly (hashing would cost as much)
+_MIN_CACHED_CHARS = 256
+
+# USD per 1M tokens (input, output); longest matching prefix wins
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+logger = get_logger("token_budget")
+
+LLM_CALLS = Counter("infoverif_llm_calls_total", "Model calls by stage (gateway endpoint) and model", ("stage", "model"))
+LLM_TOKENS = Counter("infoverif_llm_tokens_total", "Tokens reported by the API by stage, model and kind", ("stage", "model", "kind"))
+LLM_COST = Counter("infoverif_llm_cost_usd_total", "Estimated spend in USD by stage and model", ("stage", "model"))
+PROMPT_TRIMS = Counter("infoverif_prompt_trims_total", "Prompt sections dropped or cut to fit the token budget", ("section",))
+
+# Usage of the request being handled (None outside requests)
+_request_usage: contextvars.ContextVar[Optional[Dict]] = contextvars.ContextVar("request_usage", default=None)
+_usage_lock = threading.Lock()
+
+
+# ---------------------------------------------------------------------------
+# Counting
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=16)
+def _encoding(model: str):
+    """tiktoken encoding for a model (None when unavailable; cached, including failures)."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception as e:
+        logger.warning("⚠️  Tokenizer unavailable, estimating tokens from length", model=model, error=str(e))
+        return None
+    # Model unknown to this tiktoken version: gpt-4o family uses o200k, older models cl100k
+    for name in ("o200k_base", "cl100k_base") if model.startswith("gpt-4o") else ("cl100k_base",):
+        try:
+            return tiktoken.get_encoding(name)
+        except Exception:
+            continue
+    return None
+
+
+def tokenizer_name(model: str = DEFAULT_MODEL) -> str:
+    """Name of the tokenizer used for a model ("estimate" without tiktoken); loads it on first call."""
+    encoding = _encoding(model)
+    return encoding.name if encoding is not None else "estimate"
+
+
+class _CountCache:
+    """LRU of token counts keyed by (encoding, text digest)."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._counts: "OrderedDict[Tuple[str, bytes], int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[int]:
+        with self._lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+            return count
+
+    def put(self, key, count: int):
+        with self._lock:
+            self._counts[key] = count
+            self._counts.move_to_end(key)
+            while len(self._counts) > self.capacity:
+                self._counts.popitem(last=False)
+
+
+_count_cache = _CountCache(TOKEN_COUNT_CACHE_SIZE)
+
+
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    """
+    Count the tokens of a text for a model.
+
+    Args:
+        text: Text to count
+        model: Model name (selects the tokenizer)
+
+    Returns:
+        Token count (estimated from length without tiktoken)
+    """
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    if len(text) < _MIN_CACHED_CHARS or TOKEN_COUNT_CACHE_SIZE <= 0:
+        return len(encoding.encode(text, disallowed_special=()))
+
+    key = (encoding.name, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest())
+    count = _count_cache.get(key)
+    if count is None:
+        count = len(encoding.encode(text, disallowed_special=()))
+        _count_cache.put(key, count)
+    return count
+
+
+def count_message_tokens(messages: List[Dict], model: str = DEFAULT_MODEL) -> int:
+    """Prompt tokens of chat messages (text parts only; images are counted by the caller)."""
+    total = TOKENS_PER_REPLY
+    for message in messages or []:
+        total += TOKENS_PER_MESSAGE
+        content = message.get("content", "")
+        if isinstance(content, str):
+            total += count_tokens(content, model)
+        elif isinstance(content, list):
+            total += sum(count_tokens(part.get("text", ""), model) for part in content if part.get("type") == "text")
+    return total
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = DEFAULT_MODEL) -> str:
+    """Keep the first `max_tokens` tokens of a text (cut at a word boundary without tiktoken)."""
+    encoding = _encoding(model)
+    if encoding is None:
+        limit = max_tokens * CHARS_PER_TOKEN
+        if len(text) <= limit:
+            return text
+        cut = text.rfind(" ", 0, limit)
+        return text[:cut if cut > limit // 2 else limit]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+# ---------------------------------------------------------------------------
+# Prompt budget
+# ---------------------------------------------------------------------------
+
+# Embedding hints kept by the last step before all hints are dropped
+_TRIMMED_HINTS = 2
+
+
+def _trim_steps(max_hints: int) -> Tuple[Tuple[bool, int, Optional[str]], ...]:
+    """Degradation steps before cutting content: (include_few_shot, max_hints, section dropped by the step)."""
+    return (
+        (True, max_hints, None),
+        (False, max_hints, "few_shot"),
+        (False, min(_TRIMMED_HINTS, max_hints), "hints"),
+        (False, 0, "hints"),
+    )
+
+
+def fit_prompt(
+    build: Callable[[str, bool, int], str],
+    content: str,
+    reserved_tokens: int = 0,
+    budget: Optional[int] = None,
+    model: str = DEFAULT_MODEL,
+    max_hints: int = 5
+) -> Tuple[str, Dict]:
+    """
+    Build a prompt that fits the token budget.
+
+    Starts from the full prompt (all max_hints hints); over budget, drops the
+    few-shot section, then the embedding hints (max_hints → 2 → 0), then cuts
+    the end of the content (never below MIN_CONTENT_TOKENS).
+
+    Args:
+        build: build(content, include_few_shot, max_hints) → prompt
+        content: Content to analyze
+        reserved_tokens: Tokens of the rest of the request (system message, response schema)
+        budget: Prompt token budget (default LLM_PROMPT_TOKEN_BUDGET; 0 = unlimited)
+        model: Model name (selects the tokenizer)
+        max_hints: Embedding hints the caller provides (all kept within budget)
+
+    Returns:
+        (prompt, report) with report = {"prompt_tokens", "budget", "trimmed": [sections]}
+    """
+    budget = PROMPT_TOKEN_BUDGET if budget is None else budget
+    trimmed: List[str] = []
+
+    previous = None
+    for include_few_shot, step_hints, section in _trim_steps(max_hints):
+        prompt = build(content, include_few_shot, step_hints)
+        if prompt == previous:
+            continue  # Nothing to drop at this step (no few-shot or hints in this prompt)
+        if section and section not in trimmed:
+            trimmed.append(section)
+        previous = prompt
+        tokens = reserved_tokens + count_tokens(prompt, model)
+        if budget <= 0 or tokens <= budget:
+            return prompt, _trim_report(tokens, budget, trimmed, len(content))
+
+    # Still over budget without few-shot and hints: cut the content
+    overhead = reserved_tokens + count_tokens(build("", False, 0), model)
+    content = truncate_to_tokens(content, max(budget - overhead, MIN_CONTENT_TOKENS), model)
+    trimmed.append("content")
+    prompt = build(content, False, 0)
+    tokens = reserved_tokens + count_tokens(prompt, model)
+    return prompt, _trim_report(tokens, budget, trimmed, len(content))
+
+
+def _trim_report(tokens: int, budget: int, trimmed: List[str], content_chars: int) -> Dict:
+    """Count and log the trims of a fitted prompt."""
+    if trimmed:
+        for section in trimmed:
+            PROMPT_TRIMS.inc((section,))
+        logger.warning(
+            "✂️  Prompt trimmed to fit token budget",
+            trimmed=trimmed, prompt_tokens=tokens, budget=budget, content_chars=content_chars
+        )
+    return {"prompt_tokens": tokens, "budget": budget, "trimmed": trimmed}
+
+
+# ---------------------------------------------------------------------------
+# Usage and cost
+# ---------------------------------------------------------------------------
+
+def get_model_price(model: str) -> Tuple[float, float]:
+    """(input, output) USD per 1M tokens; env overrides apply to all models, unknown models cost 0."""
+    input_price = output_price = 0.0
+    for prefix in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model and model.startswith(prefix):
+            input_price, output_price = MODEL_PRICES[prefix]
+            break
+    return (
+        float(os.getenv("LLM_PRICE_INPUT_PER_1M", str(input_price))),
+        float(os.getenv("LLM_PRICE_OUTPUT_PER_1M", str(output_price)))
+    )
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, price_factor: float = 1.0) -> float:
+    """USD cost of a call (price_factor: e.g. 0.5 for Batch API requests)."""
+    input_price, output_price = get_model_price(model)
+    return (prompt_tokens * input_price + completion_tokens * output_price) * price_factor / 1_000_000
+
+
+def _add_usage(totals: Dict, prompt_tokens: int, completion_tokens: int, cost: float):
+    totals["calls"] += 1
+    totals["prompt_tokens"] += prompt_tokens
+    totals["completion_tokens"] += completion_tokens
+    totals["cost_usd"] += cost
+
+
+def _empty_usage() -> Dict:
+    return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+
+
+def _usage_tokens(usage, key: str) -> int:
+    value = usage.get(key) if isinstance(usage, dict) else getattr(usage, key, 0)
+    return int(value or 0)
+
+
+def record_usage(stage: str, model: str, usage=None, price_factor: float = 1.0) -> float:
+    """
+    Record one model call (cumulative counters + current request).
+
+    Args:
+        stage: Gateway endpoint (analysis, vision, transcription, probe) or "batch"
+        model: Model that answered
+        usage: response.usage or its dict form (None for calls without token
+            usage, e.g. transcription)
+        price_factor: Price multiplier (Batch API discount)
+
+    Returns:
+        Estimated cost of the call in USD
+    """
+    model = model or DEFAULT_MODEL
+    prompt_tokens = _usage_tokens(usage, "prompt_tokens")
+    completion_tokens = _usage_tokens(usage, "completion_tokens")
+    cost = estimate_cost(model, prompt_tokens, completion_tokens, price_factor)
+
+    LLM_CALLS.inc((stage, model))
+    if prompt_tokens:
+        LLM_TOKENS.inc((stage, model, "prompt"), prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.inc((stage, model, "completion"), completion_tokens)
+    if cost:
+        LLM_COST.inc((stage, model), cost)
+
+    request_usage = _request_usage.get()
+    if request_usage is not None:
+        with _usage_lock:
+            _add_usage(request_usage, prompt_tokens, completion_tokens, cost)
+            _add_usage(request_usage["by_stage"].setdefault(stage, _empty_usage()), prompt_tokens, completion_tokens, cost)
+    return cost
+
+
+def start_request_usage() -> Dict:
+    """Start accounting model usage for the current request (returns the usage dict)."""
+    usage = dict(_empty_usage(), by_stage={})
+    _request_usage.set(usage)
+    return usage
+
+
+def get_request_usage() -> Optional[Dict]:
+    """Usage of the current request so far (None outside requests)."""
+    usage = _request_usage.get()
+    if usage is None:
+        return None
+    with _usage_lock:
+        snapshot = dict(usage, by_stage={stage: dict(totals) for stage, totals in usage["by_stage"].items()})
+    snapshot["cost_usd"] = round(snapshot["cost_usd"], 6)
+    for totals in snapshot["by_stage"].values():
+        totals["cost_usd"] = round(totals["cost_usd"], 6)
+    return snapshot
+
+
+def request_budget_allows(model: str, prompt_tokens: int, completion_tokens: int) -> bool:
+    """Check that a call (estimated tokens) keeps the current request within LLM_REQUEST_COST_BUDGET_USD."""
+    if REQUEST_COST_BUDGET <= 0:
+        return True
+    usage = _request_usage.get()
+    spent = usage["cost_usd"] if usage is not None else 0.0
+    return spent + estimate_cost(model, prompt_tokens, completion_tokens) <= REQUEST_COST_BUDGET
+
+
+def get_usage_stats() -> Dict:
+    """Cumulative usage of this process (totals and per stage)."""
+    totals = _empty_usage()
+    by_stage: Dict[str, Dict] = {}
+    for (stage, _model), calls in LLM_CALLS.snapshot().items():
+        by_stage.setdefault(stage, _empty_usage())["calls"] += int(calls)
+    for (stage, _model, kind), tokens in LLM_TOKENS.snapshot().items():
+        by_stage.setdefault(stage, _empty_usage())[f"{kind}_tokens"] += int(tokens)
+    for (stage, _model), cost in LLM_COST.snapshot().items():
+        by_stage.setdefault(stage, _empty_usage())["cost_usd"] += cost
+    for stage_totals in by_stage.values():
+        for key in totals:
+            totals[key] += stage_totals[key]
+        stage_totals["cost_usd"] = round(stage_totals["cost_usd"], 6)
+    totals["cost_usd"] = round(totals["cost_usd"], 6)
+    return dict(
+        totals,
+        by_stage=by_stage,
+        tokenizer=tokenizer_name(),
+        prompt_token_budget=PROMPT_TOKEN_BUDGET,
+        prompt_trims={section: int(count) for (section,), count in PROMPT_TRIMS.snapshot().items()}
+    )
@@ -0,0 +1,276 @@
+"""
+Request-scoped tracing and structured logging.
+
+Every HTTP request gets a request ID (incoming `x-request-id` header, or a new
+one) carried in a contextvar through the pipeline, including map-reduce
+segment threads (they run in a copy of the request context). Pipeline stages
+are spans (`metrics.stage` opens one) with attributes such as bytes
+downloaded, prompt tokens or number of embedding hints; finished spans go to
+a pluggable exporter.
+
+Logs from the pipeline go through `get_logger(name)`: one line per event,
+tagged with the request ID, as text (default) or JSON.
+
+Environment variables:
+- TRACE_EXPORTER: none (default) | file | memory | log
+- TRACE_FILE: JSON-lines file for the file exporter (default traces.jsonl)
+- LOG_FORMAT: text (default) | json
+"""
+import abc
+import contextvars
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation of a trace (trace ID = request ID)."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "end", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: Optional[str], parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, **attributes):
+        """Add attributes (e.g. span.set(bytes=..., prompt_tokens=...))."""
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return None if self.end is None else (self.end - self.start) * 1000
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms or 0.0, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Returned when no exporter is configured (attributes are dropped)."""
+
+    def set(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class SpanExporter(abc.ABC):
+    """Exporter interface: receives every finished span."""
+
+    @abc.abstractmethod
+    def export(self, span: Span):
+        """Handle one finished span."""
+
+
+class InMemoryExporter(SpanExporter):
+    """Keeps the most recent spans in memory (tests, debugging)."""
+
+    def __init__(self, max_spans: int = 10000):
+        self.spans: deque = deque(maxlen=max_spans)
+
+    def export(self, span: Span):
+        self.spans.append(span)
+
+    def trace(self, trace_id: str) -> List[Span]:
+        """Spans of one request, in start order."""
+        return sorted((span for span in list(self.spans) if span.trace_id == trace_id), key=lambda span: span.start)
+
+
+class FileExporter(SpanExporter):
+    """Appends spans as JSON lines to a local file."""
+
+    def __init__(self, path: str = TRACE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class LogExporter(SpanExporter):
+    """Writes each span as a structured log line."""
+
+    def export(self, span: Span):
+        get_logger("trace").info(
+            f"span {span.name}", span_id=span.span_id, parent_id=span.parent_id,
+            duration_ms=round(span.duration_ms or 0.0, 1), error=span.error, **span.attributes
+        )
+
+
+_exporter: Optional[SpanExporter] = None
+
+
+def set_exporter(exporter: Optional[SpanExporter]):
+    """Install the span exporter (None disables span collection)."""
+    global _exporter
+    _exporter = exporter
+
+
+def get_exporter() -> Optional[SpanExporter]:
+    return _exporter
+
+
+# ---------------------------------------------------------------------------
+# Request ID and spans
+# ---------------------------------------------------------------------------
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    """Use a well-formed incoming ID (x-request-id) or generate one."""
+    if incoming and _REQUEST_ID_RE.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+def set_request_id(request_id: str):
+    _request_id.set(request_id)
+
+
+def get_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+@contextmanager
+def start_span(name: str, **attributes) -> Iterator:
+    """
+    Open a span as a child of the current one (no-op without an exporter).
+
+    Yields:
+        The span (use span.set(...) to add attributes)
+    """
+    exporter = _exporter
+    if exporter is None:
+        yield NOOP_SPAN
+        return
+
+    parent = _current_span.get()
+    span = Span(name, get_request_id(), parent.span_id if parent else None, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f"{type(e).__name__}: {str(e)[:200]}"
+        raise
+    finally:
+        span.end = time.time()
+        _current_span.reset(token)
+        try:
+            exporter.export(span)
+        except Exception as e:
+            print(f"⚠️  Span export failed: {e}", file=sys.stderr)
+
+
+def current_span():
+    """Innermost open span (or the no-op span)."""
+    return _current_span.get() or NOOP_SPAN
+
+
+# ---------------------------------------------------------------------------
+# Structured logging
+# ---------------------------------------------------------------------------
+
+class _RequestFormatter(logging.Formatter):
+    """Text: 'message [request_id] key=value ...'; JSON: one object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", {})
+        request_id = getattr(record, "request_id", None)
+        if LOG_FORMAT == "json":
+            payload = {
+                "ts": round(record.created, 3),
+                "level": record.levelname.lower(),
+                "logger": record.name,
+                "msg": record.getMessage(),
+                "request_id": request_id,
+                **fields,
+            }
+            return json.dumps(payload, ensure_ascii=False, default=str)
+        text = record.getMessage()
+        if request_id:
+            text += f" [{request_id[:12]}]"
+        if fields:
+            text += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return text
+
+
+_handler = logging.StreamHandler(sys.stdout)
+_handler.setFormatter(_RequestFormatter())
+_root_logger = logging.getLogger("infoverif")
+_root_logger.addHandler(_handler)
+_root_logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+_root_logger.propagate = False
+
+
+class StructuredLogger:
+    """Logger whose keyword arguments become structured fields."""
+
+    def __init__(self, name: str):
+        self._logger = _root_logger.getChild(name)
+
+    def _log(self, level: int, message: str, fields: Dict[str, Any]):
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, message, extra={"fields": fields, "request_id": get_request_id()})
+
+    def debug(self, message: str, **fields):
+        self._log(logging.DEBUG, message, fields)
+
+    def info(self, message: str, **fields):
+        self._log(logging.INFO, message, fields)
+
+    def warning(self, message: str, **fields):
+        self._log(logging.WARNING, message, fields)
+
+    def error(self, message: str, **fields):
+        self._log(logging.ERROR, message, fields)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """Structured logger correlated with the current request ID."""
+    return StructuredLogger(name)
+
+
+def _exporter_from_env() -> Optional[SpanExporter]:
+    if TRACE_EXPORTER == "file":
+        return FileExporter(TRACE_FILE)
+    if TRACE_EXPORTER == "memory":
+        return InMemoryExporter()
+    if TRACE_EXPORTER == "log":
+        return LogExporter()
+    return None
+
+
+set_exporter(_exporter_from_env())
@@ -0,0 +1,298 @@
+"""
+Timed transcription: Whisper segments with media offsets.
+
+Audio is transcribed with response_format="verbose_json", which returns
+segments with start/end seconds. Audio longer than TRANSCRIPTION_CHUNK_SECONDS
+is cut into chunks with ffmpeg. The chunks are transcribed concurrently and
+their segments are yielded in order as soon as each chunk is done, so
+consumers (claims.iter_claims) start before a long file is fully
+transcribed.
+
+TranscriptTimeline joins the segment texts into the transcript the model
+analyzes, and remembers where each segment starts. A quoted passage (technique
+evidence, claim) then maps back to seconds in the media. attach_media_offsets
+adds these offsets to an analysis so the extension can link to the moment in
+the video.
+
+Environment variables:
+- TRANSCRIPTION_CHUNK_SECONDS: audio longer than this is transcribed in chunks
+  of this length (default 600; 0 = never chunk)
+- TRANSCRIPTION_CONCURRENCY: chunks transcribed at once (default 3)
+"""
+import bisect
+import contextvars
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import ffmpeg
+
+from llm_gateway import get_gateway
+from metrics import stage
+
+
+TRANSCRIPTION_CHUNK_SECONDS = float(os.getenv("TRANSCRIPTION_CHUNK_SECONDS", "600"))
+TRANSCRIPTION_CONCURRENCY = int(os.getenv("TRANSCRIPTION_CONCURRENCY", "3"))
+
+# A last chunk shorter than this is merged into the previous one
+_MIN_CHUNK_SECONDS = 30.0
+
+# Quotes not found verbatim are matched to the segment window sharing most of their words
+_MIN_WORD_OVERLAP = 0.6
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _as_dict(response) -> Dict:
+    if isinstance(response, dict):
+        return response
+    if hasattr(response, "model_dump"):
+        return response.model_dump()
+    return {"text": str(response)}
+
+
+def transcribe_segments(audio_path: str, offset: float = 0.0) -> Dict:
+    """
+    Transcribe one audio file with segment timestamps (Whisper verbose_json).
+
+    Args:
+        audio_path: Audio file (at most 25 MB, the API limit)
+        offset: Seconds added to every timestamp (position of a chunk in the media)
+
+    Returns:
+        {"text", "segments": [{"start", "end", "text"}], "duration", "language"}
+    """
+    with open(audio_path, 'rb') as audio_file, stage("transcription", audio_bytes=os.path.getsize(audio_path)) as span:
+        response = _as_dict(get_gateway().transcription(
+            model="whisper-1",
+            file=audio_file,
+            response_format="verbose_json"
+        ))
+        text = (response.get("text") or "").strip()
+        segments = [
+            {
+                "start": round(offset + float(segment.get("start") or 0.0), 2),
+                "end": round(offset + float(segment.get("end") or segment.get("start") or 0.0), 2),
+                "text": (segment.get("text") or "").strip(),
+            }
+            for segment in response.get("segments") or []
+        ]
+        if not segments and text:
+            # No timing returned: one segment covering the whole file
+            segments = [{"start": round(offset, 2), "end": round(offset + float(response.get("duration") or 0.0), 2), "text": text}]
+        span.set(transcript_chars=len(text), segments=len(segments), audio_seconds=response.get("duration"))
+    return {"text": text, "segments": segments, "duration": response.get("duration"), "language": response.get("language")}
+
+
+def audio_duration(audio_path: str) -> Optional[float]:
+    """Duration of a media file in seconds (None when ffprobe cannot tell)."""
+    try:
+        return float(ffmpeg.probe(audio_path)["format"]["duration"])
+    except Exception:
+        return None
+
+
+def plan_chunks(duration: Optional[float], chunk_seconds: float = TRANSCRIPTION_CHUNK_SECONDS) -> List[Tuple[float, Optional[float]]]:
+    """(start, length) of the chunks to transcribe; a single (0, None) when no cut is needed."""
+    if not duration or chunk_seconds <= 0 or duration <= chunk_seconds + _MIN_CHUNK_SECONDS:
+        return [(0.0, None)]
+    chunks = []
+    start = 0.0
+    while start < duration:
+        length = chunk_seconds
+        if duration - (start + length) < _MIN_CHUNK_SECONDS:
+            length = duration - start
+        chunks.append((start, length))
+        start += length
+    return chunks
+
+
+def _transcribe_chunk(audio_path: str, start: float, length: float, workdir: str) -> Dict:
+    chunk_path = os.path.join(workdir, f"chunk_{int(start)}.mp3")
+    try:
+        with stage("ffmpeg", input_bytes=os.path.getsize(audio_path)) as span:
+            (
+                ffmpeg
+                .input(audio_path, ss=start, t=length)
+                .output(chunk_path, acodec='libmp3lame', ar='16000', ac=1)
+                .overwrite_output()
+                .run(quiet=True, capture_stderr=True)
+            )
+            span.set(output_bytes=os.path.getsize(chunk_path))
+    except ffmpeg.Error as e:
+        raise Exception(f"FFmpeg error: {e.stderr.decode()}")
+    try:
+        return transcribe_segments(chunk_path, offset=start)
+    finally:
+        os.remove(chunk_path)
+
+
+def iter_transcript_segments(audio_path: str) -> Iterator[Dict]:
+    """
+    Transcribe audio, yielding timed segments in media order as they become available.
+
+    Args:
+        audio_path: Audio file
+
+    Yields:
+        {"start", "end", "text"} segments (seconds from the start of the media)
+    """
+    chunks = plan_chunks(audio_duration(audio_path))
+    if len(chunks) == 1:
+        yield from transcribe_segments(audio_path)["segments"]
+        return
+
+    workdir = tempfile.mkdtemp(prefix="transcription-")
+    pool = ThreadPoolExecutor(max_workers=max(1, min(TRANSCRIPTION_CONCURRENCY, len(chunks))), thread_name_prefix="transcription")
+    futures = []
+    try:
+        futures = [
+            pool.submit(contextvars.copy_context().run, _transcribe_chunk, audio_path, start, length, workdir)
+            for start, length in chunks
+        ]
+        for future in futures:
+            yield from future.result()["segments"]
+    finally:
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait=True)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+class TranscriptTimeline:
+    """
+    Transcript text built from timed segments, mapping text back to media time.
+
+    Segments are joined with a space; `add` can be called as segments arrive.
+    """
+
+    def __init__(self, segments=()):
+        self.segments: List[Dict] = []
+        self._offsets: List[int] = []  # Character offset of each segment in the text
+        self._parts: List[str] = []
+        self._length = 0
+        self._text: Optional[str] = None
+        self._folded: Optional[Tuple[str, List[int]]] = None
+        for segment in segments:
+            self.add(segment)
+
+    def add(self, segment: Dict) -> Optional[Dict]:
+        """Append a segment (ignored when its text is empty); returns the stored segment."""
+        text = (segment.get("text") or "").strip()
+        if not text:
+            return None
+        if self._parts:
+            self._length += 1
+        stored = {"start": segment["start"], "end": segment.get("end", segment["start"]), "text": text}
+        self.segments.append(stored)
+        self._offsets.append(self._length)
+        self._parts.append(text)
+        self._length += len(text)
+        self._text = None
+        self._folded = None
+        return stored
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = " ".join(self._parts)
+        return self._text
+
+    @property
+    def duration(self) -> Optional[float]:
+        return self.segments[-1]["end"] if self.segments else None
+
+    def segment_at(self, char_offset: int) -> Optional[Dict]:
+        """Segment containing a character offset of the text."""
+        if not self.segments:
+            return None
+        index = max(0, bisect.bisect_right(self._offsets, char_offset) - 1)
+        return self.segments[index]
+
+    def span_times(self, start: int, end: int) -> Dict:
+        """{"start", "end"} seconds of the text between two character offsets."""
+        return {"start": self.segment_at(start)["start"], "end": self.segment_at(max(start, end - 1))["end"]}
+
+    def _folded_text(self) -> Tuple[str, List[int]]:
+        """Lowercased text reduced to single-spaced words, with the original offset of each character."""
+        if self._folded is None:
+            chars: List[str] = []
+            positions: List[int] = []
+            for match in _WORD_RE.finditer(self.text):
+                if chars:
+                    chars.append(" ")
+                    positions.append(match.start())
+                chars.extend(match.group().lower())
+                positions.extend(range(match.start(), match.end()))
+            self._folded = ("".join(chars), positions)
+        return self._folded
+
+    def locate(self, quote: str) -> Optional[Dict]:
+        """
+        Media time of a passage quoted from the transcript.
+
+        Looks for the exact quote, then for its words ignoring case and
+        punctuation, then for the run of segments sharing most of its words
+        (claims are often paraphrased).
+
+        Args:
+            quote: Passage (technique evidence, claim text)
+
+        Returns:
+            {"start", "end"} in seconds, or None when the passage is not found
+        """
+        quote = (quote or "").strip().strip('"«»“”').strip()
+        if not quote or not self.segments:
+            return None
+        start = self.text.find(quote)
+        if start >= 0:
+            return self.span_times(start, start + len(quote))
+
+        words = [word.lower() for word in _WORD_RE.findall(quote)]
+        if not words:
+            return None
+        folded, positions = self._folded_text()
+        start = folded.find(" ".join(words))
+        if start >= 0:
+            end = start + len(" ".join(words)) - 1
+            return self.span_times(positions[start], positions[end] + 1)
+        return self._best_overlap(set(words), len(words))
+
+    def _best_overlap(self, words: set, quote_words: int) -> Optional[Dict]:
+        best, best_score = None, 0.0
+        segment_words = [set(_WORD_RE.findall(segment["text"].lower())) for segment in self.segments]
+        for first in range(len(self.segments)):
+            window = set()
+            for last in range(first, min(first + 3, len(self.segments))):
+                window |= segment_words[last]
+                score = len(words & window) / len(words)
+                if score > best_score:
+                    best, best_score = (first, last), score
+                if len(window) >= 2 * quote_words:
+                    break
+        if best is None or best_score < _MIN_WORD_OVERLAP:
+            return None
+        return {"start": self.segments[best[0]]["start"], "end": self.segments[best[1]]["end"]}
+
+
+def attach_media_offsets(analysis: Dict, timeline: TranscriptTimeline) -> None:
+    """
+    Add media offsets (seconds) to the techniques and claims of an analysis (in place).
+
+    Techniques get `evidence_time` ({"start", "end"}) when their evidence is
+    found in the transcript. Claims get `ts` and `end`.
+    """
+    if not timeline.segments:
+        return
+    for technique in analysis.get("techniques", []):
+        times = timeline.locate(technique.get("evidence", ""))
+        if times:
+            technique["evidence_time"] = times
+    for claim in analysis.get("claims", []):
+        times = timeline.locate(claim.get("claim", ""))
+        if times:
+            claim["ts"] = times["start"]
+            claim["end"] = times["end"]
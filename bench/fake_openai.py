@@ -0,0 +1,355 @@
+"""
+Offline stand-in for the OpenAI API (benchmarks only).
+
+Serves the endpoints the API calls, with configurable latency and error
+distributions, so the full pipeline can be driven without network or cost:
+- POST /v1/chat/completions: compact structured output (json_schema), legacy
+  JSON analysis (json_object) or plain text (vision extraction)
+- POST /v1/audio/transcriptions: fixed transcript (text or verbose_json)
+- POST /v1/files, POST /v1/batches, GET /v1/batches/<id>, GET /v1/files/<id>/content:
+  Batch API (batches are processed at submission and reported completed)
+- GET  /media/<name>: fixture files (yt-dlp generic extractor, /analyze-lite pages)
+
+Latency per endpoint is log-normal (median, sigma); errors are injected as
+429 (with Retry-After) or 500 with the configured probabilities.
+
+Usage (standalone):
+    python bench/fake_openai.py --port 8765 --chat 800:0.4:0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=bench uvicorn main:app
+"""
+import argparse
+import email.parser
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional
+
+
+TRANSCRIPT = (
+    "Ils ne veulent pas que vous sachiez la vérité. Les médias officiels cachent les chiffres réels "
+    "depuis des mois. Partagez cette vidéo avant qu'elle soit supprimée : c'est maintenant ou jamais. "
+    "Tous les experts indépendants sont d'accord, le gouvernement ment et prépare la suite."
+)
+
+
+@dataclass
+class EndpointProfile:
+    """Latency (log-normal) and error injection for one endpoint."""
+    median_ms: float = 50.0
+    sigma: float = 0.3
+    error_rate: float = 0.0       # 500 responses
+    rate_limit_rate: float = 0.0  # 429 responses
+
+    def sample_latency(self, rng: random.Random) -> float:
+        return self.median_ms * math.exp(rng.gauss(0.0, self.sigma)) / 1000.0
+
+
+@dataclass
+class FakeOpenAIConfig:
+    chat: EndpointProfile = field(default_factory=EndpointProfile)
+    vision: EndpointProfile = field(default_factory=EndpointProfile)
+    transcription: EndpointProfile = field(default_factory=lambda: EndpointProfile(median_ms=200.0))
+    media_dir: Optional[Path] = None
+    seed: int = 0
+
+
+def _completion(content: str, model: str, prompt_chars: int) -> Dict:
+    prompt_tokens = prompt_chars // 4
+    completion_tokens = len(content) // 4
+    return {
+        "id": "chatcmpl-bench-" + hashlib.sha1(content.encode("utf-8")).hexdigest()[:12],
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+            "logprobs": None,
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _pick_quote(prompt: str) -> str:
+    """A sentence from the end of the prompt (where the analyzed content sits)."""
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", prompt[-1500:]) if 20 <= len(s.strip()) <= 200]
+    return sentences[len(sentences) // 2] if sentences else prompt[-80:].strip()
+
+
+def compact_answer(prompt: str, schema: Dict) -> str:
+    """Deterministic answer matching the compact analysis schema."""
+    digest = int(hashlib.sha1(prompt.encode("utf-8")).hexdigest(), 16)
+    codes = schema["properties"]["techniques"]["items"]["properties"]["code"]["enum"]
+    quote = _pick_quote(prompt)
+    techniques = [
+        {"code": codes[(digest >> (8 * i)) % len(codes)], "severity": ("high", "medium", "low")[i % 3], "quote": quote,
+         "impact": "Joue sur la peur dans un contexte de défiance."}
+        for i in range(3)
+    ]
+    return json.dumps({
+        "scores": {"propaganda": 62, "conspiracy": 48, "misinfo": 35, "overall": 62},
+        "techniques": techniques,
+        "claims": [{"text": quote, "verdict": "unsupported", "issues": ["unsourced", "exaggeration"]}],
+        "summary": "Contenu à forte charge émotionnelle, affirmations non sourcées.",
+        "content_summary": "Un message viral affirme que les médias cachent des chiffres et appelle à partager.",
+        "interactions": "La peur renforce l'appel à l'urgence.",
+    }, ensure_ascii=False)
+
+
+def legacy_answer(prompt: str) -> str:
+    """Answer for the verbose JSON (json_object) prompts."""
+    quote = _pick_quote(prompt)
+    return json.dumps({
+        "propaganda_score": 62,
+        "conspiracy_score": 48,
+        "misinfo_score": 35,
+        "overall_risk": 62,
+        "techniques": [{
+            "dima_code": "TE-58",
+            "dima_family": "Diversion",
+            "name": "Théorie du complot",
+            "evidence": quote,
+            "severity": "medium",
+            "explanation": "Explication de benchmark.",
+        }],
+        "claims": [{"claim": quote, "confidence": "unsupported", "issues": ["non sourcé"], "reasoning": "Benchmark."}],
+        "summary": "Analyse de benchmark.",
+    }, ensure_ascii=False)
+
+
+def chat_answer(request: Dict) -> Dict:
+    """Chat completion for a request body (text prompts; vision prompts get the transcript)."""
+    messages = request.get("messages", [])
+    user_content = messages[-1].get("content", "") if messages else ""
+    model = request.get("model", "gpt-4o-mini")
+    if isinstance(user_content, list):
+        return _completion(TRANSCRIPT, model, 1000)
+    response_format = request.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        content = compact_answer(user_content, response_format["json_schema"]["schema"])
+    elif response_format.get("type") == "json_object":
+        content = legacy_answer(user_content)
+    else:
+        content = "OK"
+    return _completion(content, model, len(user_content))
+
+
+def _multipart_file(content_type: str, body: bytes) -> bytes:
+    """Content of the "file" part of a multipart/form-data body."""
+    message = email.parser.BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body)
+    for part in message.get_payload():
+        if part.get_param("name", header="content-disposition") == "file":
+            return part.get_payload(decode=True)
+    return b""
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    server_version = "FakeOpenAI/1.0"
+    config: FakeOpenAIConfig = FakeOpenAIConfig()
+    rng = random.Random(0)
+    rng_lock = threading.Lock()
+    files: Dict[str, bytes] = {}
+    batches: Dict[str, Dict] = {}
+
+    def log_message(self, format, *args):  # Quiet
+        pass
+
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_text(self, status: int, text: str, content_type: str = "text/plain; charset=utf-8"):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate(self, profile: EndpointProfile) -> bool:
+        """Sleep for a sampled latency; send an injected error and return False if drawn."""
+        with self.rng_lock:
+            latency = profile.sample_latency(self.rng)
+            draw = self.rng.random()
+        time.sleep(latency)
+        if draw < profile.rate_limit_rate:
+            self._send_json(429, {"error": {"message": "Rate limit (injected)", "type": "rate_limit_error"}}, {"Retry-After": "0.1"})
+            return False
+        if draw < profile.rate_limit_rate + profile.error_rate:
+            self._send_json(500, {"error": {"message": "Server error (injected)", "type": "server_error"}})
+            return False
+        return True
+
+    def do_GET(self):
+        if self.path.startswith("/media/") and self.config.media_dir is not None:
+            path = (self.config.media_dir / self.path[len("/media/"):].split("?")[0]).resolve()
+            if path.is_file() and self.config.media_dir.resolve() in path.parents:
+                body = path.read_bytes()
+                content_type = {".html": "text/html; charset=utf-8", ".mp4": "video/mp4", ".png": "image/png"}.get(path.suffix, "application/octet-stream")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+        match = re.match(r"^/v1/batches/([\w-]+)$", self.path)
+        if match and match.group(1) in self.batches:
+            self._send_json(200, self.batches[match.group(1)])
+            return
+        match = re.match(r"^/v1/files/([\w-]+)/content$", self.path)
+        if match and match.group(1) in self.files:
+            self._send_text(200, self.files[match.group(1)].decode("utf-8"), "application/octet-stream")
+            return
+        if self.path.rstrip("/") == "/v1/models":
+            self._send_json(200, {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model", "created": 0, "owned_by": "bench"}]})
+            return
+        self._send_json(404, {"error": {"message": f"Not found: {self.path}"}})
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+
+        if self.path.startswith("/v1/chat/completions"):
+            request = json.loads(body or b"{}")
+            messages = request.get("messages", [])
+            is_vision = bool(messages) and isinstance(messages[-1].get("content"), list)
+            if not self._simulate(self.config.vision if is_vision else self.config.chat):
+                return
+            self._send_json(200, chat_answer(request))
+            return
+
+        if self.path.startswith("/v1/files"):
+            file_id = "file-" + uuid.uuid4().hex[:24]
+            content = _multipart_file(self.headers.get("Content-Type", ""), body)
+            self.files[file_id] = content
+            self._send_json(200, {
+                "id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": "batch.jsonl", "purpose": "batch", "status": "processed",
+            })
+            return
+
+        if self.path.startswith("/v1/batches"):
+            request = json.loads(body or b"{}")
+            lines = self.files.get(request.get("input_file_id"), b"").decode("utf-8").splitlines()
+            results = []
+            for line in filter(None, (line.strip() for line in lines)):
+                item = json.loads(line)
+                results.append({
+                    "id": "batch_req_" + uuid.uuid4().hex[:12],
+                    "custom_id": item["custom_id"],
+                    "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": chat_answer(item["body"])},
+                    "error": None,
+                })
+            output_file_id = "file-" + uuid.uuid4().hex[:24]
+            self.files[output_file_id] = "\n".join(json.dumps(result, ensure_ascii=False) for result in results).encode("utf-8")
+            batch_id = "batch_" + uuid.uuid4().hex[:24]
+            self.batches[batch_id] = {
+                "id": batch_id, "object": "batch", "endpoint": request.get("endpoint"),
+                "input_file_id": request.get("input_file_id"), "completion_window": request.get("completion_window"),
+                "status": "completed", "output_file_id": output_file_id, "error_file_id": None,
+                "created_at": int(time.time()), "metadata": request.get("metadata"),
+                "request_counts": {"total": len(results), "completed": len(results), "failed": 0},
+            }
+            self._send_json(200, self.batches[batch_id])
+            return
+
+        if self.path.startswith("/v1/audio/transcriptions"):
+            if not self._simulate(self.config.transcription):
+                return
+            if b'name="response_format"\r\n\r\nverbose_json' in body:
+                words = TRANSCRIPT.split(". ")
+                segments = [
+                    {"id": i, "start": float(4 * i), "end": float(4 * i + 4), "text": sentence}
+                    for i, sentence in enumerate(words)
+                ]
+                self._send_json(200, {"task": "transcribe", "language": "french", "duration": 4.0 * len(segments), "text": TRANSCRIPT, "segments": segments})
+            else:
+                self._send_text(200, TRANSCRIPT)
+            return
+
+        self._send_json(404, {"error": {"message": f"Not found: {self.path}"}})
+
+
+class FakeOpenAIServer:
+    """Fake OpenAI server running in a background thread."""
+
+    def __init__(self, config: Optional[FakeOpenAIConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        config = config or FakeOpenAIConfig()
+        handler = type("BoundFakeOpenAIHandler", (FakeOpenAIHandler,), {
+            "config": config, "rng": random.Random(config.seed), "files": {}, "batches": {},
+        })
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-openai", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def parse_profile(spec: str, default: EndpointProfile) -> EndpointProfile:
+    """Parse "median_ms[:sigma[:error_rate[:rate_limit_rate]]]"."""
+    values = [float(part) for part in spec.split(":")] if spec else []
+    fields = [default.median_ms, default.sigma, default.error_rate, default.rate_limit_rate]
+    fields[:len(values)] = values
+    return EndpointProfile(*fields)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline fake OpenAI API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--chat", default="", help="median_ms[:sigma[:error_rate[:rate_limit_rate]]]")
+    parser.add_argument("--vision", default="")
+    parser.add_argument("--transcription", default="")
+    parser.add_argument("--media-dir", help="Directory served under /media/")
+    args = parser.parse_args()
+
+    defaults = FakeOpenAIConfig()
+    config = FakeOpenAIConfig(
+        chat=parse_profile(args.chat, defaults.chat),
+        vision=parse_profile(args.vision, defaults.vision),
+        transcription=parse_profile(args.transcription, defaults.transcription),
+        media_dir=Path(args.media_dir) if args.media_dir else None,
+    )
+    with FakeOpenAIServer(config, args.host, args.port) as server:
+        print(f"🧪 Fake OpenAI API on {server.url}/v1 (Ctrl+C to stop)")
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
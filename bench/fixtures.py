@@ -0,0 +1,79 @@
+"""
+Benchmark fixtures: texts, a page for /analyze-lite, and generated media.
+
+Media (a short video with a tone, a PNG screenshot) is generated with ffmpeg
+into a scratch directory rather than committed; scenarios that need it are
+skipped when ffmpeg is not installed.
+"""
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Dict
+
+
+SHORT_TEXT_FR = (
+    "URGENT : ils ne veulent pas que vous sachiez la vérité ! Les médias officiels cachent les chiffres "
+    "réels depuis des mois. Tous les experts indépendants sont d'accord : le gouvernement ment. "
+    "Partagez avant que ce message soit supprimé."
+)
+
+SHORT_TEXT_EN = (
+    "They don't want you to know the truth! The mainstream media has been hiding the real numbers for "
+    "months. Every independent expert agrees: the government is lying. Share this before it gets deleted."
+)
+
+# ~15k characters: exercises map-reduce segmentation (DIMA_MAX_CONTENT_CHARS = 8000)
+LONG_TEXT_FR = " ".join(
+    f"Paragraphe {i}. " + SHORT_TEXT_FR + " Selon une étude que personne ne peut consulter, 87 % des cas sont liés. "
+    "Les élites préparent la prochaine étape pendant que vous dormez."
+    for i in range(45)
+)
+
+LITE_PAGE_HTML = """<!doctype html>
+<html><head>
+<meta property="og:title" content="Révélation : le rapport que le gouvernement voulait cacher">
+<meta property="og:description" content="Selon des sources anonymes, 90 % des chiffres officiels seraient faux. Partagez avant la censure !">
+<title>Rapport caché</title>
+</head><body><p>Benchmark page.</p></body></html>
+"""
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+def build_fixtures(media_dir: Path) -> Dict[str, Path]:
+    """
+    Write fixture files into media_dir.
+
+    Returns:
+        Name → path of every fixture created (video/image only with ffmpeg)
+    """
+    media_dir.mkdir(parents=True, exist_ok=True)
+    fixtures = {}
+
+    page = media_dir / "article.html"
+    page.write_text(LITE_PAGE_HTML, encoding="utf-8")
+    fixtures["page"] = page
+
+    if ffmpeg_available():
+        video = media_dir / "clip.mp4"
+        subprocess.run(
+            [
+                "ffmpeg", "-y", "-loglevel", "error",
+                "-f", "lavfi", "-i", "testsrc=size=320x240:rate=15:duration=5",
+                "-f", "lavfi", "-i", "sine=frequency=440:duration=5",
+                "-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest", str(video),
+            ],
+            check=True
+        )
+        fixtures["video"] = video
+
+        image = media_dir / "screenshot.png"
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi", "-i", "testsrc=size=640x480", "-frames:v", "1", str(image)],
+            check=True
+        )
+        fixtures["image"] = image
+
+    return fixtures
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+End-to-end API benchmark (offline).
+
+Drives api/main.py in-process (FastAPI TestClient, startup included) against
+the local fake OpenAI server (bench/fake_openai.py): text, long text
+(map-reduce), image, video upload (ffmpeg), video URL (yt-dlp generic
+extractor on a fixture served locally) and /analyze-lite. Reports p50/p95/p99
+latency, throughput and process RSS per scenario, and compares with stored
+baselines so regressions in deep.py / dima_detector.py show up before deploy.
+
+Fake model latency defaults to a few tens of ms so that our own overhead
+(prompt building, embeddings, parsing) dominates the numbers.
+
+Usage:
+    python bench/run_bench.py                       # run and compare with bench/baselines.json
+    python bench/run_bench.py --save-baseline       # record new baselines
+    python bench/run_bench.py --scenarios text_short_fr text_long_fr -n 50 -c 8
+    python bench/run_bench.py --chat 800:0.4:0.02:0.01   # realistic latency, 2% errors, 1% 429s
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List
+
+BENCH_DIR = Path(__file__).parent
+sys.path.insert(0, str(BENCH_DIR))
+sys.path.insert(0, str(BENCH_DIR.parent / "api"))
+
+from fake_openai import FakeOpenAIConfig, FakeOpenAIServer, parse_profile
+from fixtures import LONG_TEXT_FR, SHORT_TEXT_EN, SHORT_TEXT_FR, build_fixtures
+
+
+DEFAULT_BASELINES = BENCH_DIR / "baselines.json"
+
+
+def read_memory_mb() -> Dict[str, float]:
+    """Current and peak RSS of this process (Linux /proc)."""
+    memory = {}
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    key, value = line.split(":", 1)
+                    memory[key] = int(value.split()[0])
+    except OSError:
+        pass
+    return {"rss_mb": round(memory.get("VmRSS", 0) / 1024, 1), "peak_rss_mb": round(memory.get("VmHWM", 0) / 1024, 1)}
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * q
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def build_scenarios(client, fixtures: Dict[str, Path], media_url: str) -> Dict[str, Callable]:
+    """Scenario name → zero-argument callable returning an HTTP response."""
+    lite_feed = "\n".join(json.dumps({"url": f"{media_url}/article.html?item={i}", "platform": "web"}) for i in range(50))
+    scenarios = {
+        "health": lambda: client.get("/health"),
+        "text_short_fr": lambda: client.post("/analyze-text", data={"text": SHORT_TEXT_FR, "language": "fr"}),
+        "text_short_en": lambda: client.post("/analyze-text", data={"text": SHORT_TEXT_EN, "language": "en"}),
+        "text_long_fr": lambda: client.post("/analyze-text", data={"text": LONG_TEXT_FR, "language": "fr"}),
+        "lite": lambda: client.post("/analyze-lite", data={"url": f"{media_url}/article.html", "platform": "web"}),
+        "lite_stream": lambda: client.post(
+            "/analyze-lite/stream", content=lite_feed, headers={"content-type": "application/x-ndjson"}
+        ),
+    }
+    if "image" in fixtures:
+        image_bytes = fixtures["image"].read_bytes()
+        scenarios["image"] = lambda: client.post(
+            "/analyze-image", files={"file": ("screenshot.png", image_bytes, "image/png")}, data={"language": "fr"}
+        )
+    if "video" in fixtures:
+        video_bytes = fixtures["video"].read_bytes()
+        scenarios["video_upload"] = lambda: client.post(
+            "/analyze-video", files={"file": ("clip.mp4", video_bytes, "video/mp4")}, data={"language": "fr"}
+        )
+        scenarios["video_url"] = lambda: client.post(
+            "/analyze-video-url", data={"url": f"{media_url}/clip.mp4", "platform": "video"}
+        )
+    return scenarios
+
+
+def run_scenario(call: Callable, requests: int, concurrency: int, warmup: int) -> Dict:
+    """Run one scenario: warmup calls, then `requests` calls on `concurrency` threads."""
+    for _ in range(warmup):
+        call()
+
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+
+    def timed_call(_):
+        started = time.perf_counter()
+        response = call()
+        elapsed = (time.perf_counter() - started) * 1000
+        return elapsed, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for elapsed, status in pool.map(timed_call, range(requests)):
+            if status < 400:
+                latencies.append(elapsed)
+            else:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+    wall = time.perf_counter() - started
+
+    return {
+        "requests": requests,
+        "ok": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50), 1),
+        "p95_ms": round(percentile(latencies, 0.95), 1),
+        "p99_ms": round(percentile(latencies, 0.99), 1),
+        "mean_ms": round(statistics.fmean(latencies), 1) if latencies else 0.0,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        **read_memory_mb(),
+    }
+
+
+def compare(results: Dict[str, Dict], baselines: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Regressions: p95 slower or throughput lower than baseline by more than `tolerance`."""
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if not baseline:
+            continue
+        if baseline.get("p95_ms") and result["p95_ms"] > baseline["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']} ms > baseline {baseline['p95_ms']} ms (+{tolerance:.0%})")
+        if baseline.get("throughput_rps") and result["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {result['throughput_rps']} rps < baseline {baseline['throughput_rps']} rps (-{tolerance:.0%})")
+        if result["ok"] < result["requests"] and not baseline.get("errors"):
+            regressions.append(f"{name}: {result['requests'] - result['ok']} failed requests (baseline had none)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end API benchmark")
+    parser.add_argument("--scenarios", nargs="+", help="Scenarios to run (default: all available)")
+    parser.add_argument("-n", "--requests", type=int, default=20, help="Requests per scenario")
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--chat", default="30:0.3", help="Fake chat profile: median_ms[:sigma[:error_rate[:rate_limit_rate]]]")
+    parser.add_argument("--vision", default="40:0.3")
+    parser.add_argument("--transcription", default="80:0.3")
+    parser.add_argument("--baselines", default=str(DEFAULT_BASELINES))
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baselines")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed regression vs baseline (fraction)")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    media_dir = Path(tempfile.mkdtemp(prefix="infoverif-bench-"))
+    fixtures = build_fixtures(media_dir)
+    if "video" not in fixtures:
+        print("⚠️  ffmpeg not found: image and video scenarios skipped")
+
+    defaults = FakeOpenAIConfig()
+    config = FakeOpenAIConfig(
+        chat=parse_profile(args.chat, defaults.chat),
+        vision=parse_profile(args.vision, defaults.vision),
+        transcription=parse_profile(args.transcription, defaults.transcription),
+        media_dir=media_dir,
+    )
+
+    with FakeOpenAIServer(config) as server:
+        # Point the API at the fake server; keep caches from turning the benchmark into cache hits
+        os.environ["OPENAI_BASE_URL"] = f"{server.url}/v1"
+        os.environ["OPENAI_API_KEY"] = "bench"
+        os.environ.setdefault("NEAR_DUPLICATE_ENABLED", "false")
+        os.environ.setdefault("MAPREDUCE_CACHE_SIZE", "0")
+        os.environ.setdefault("LITE_PAGE_CACHE_SIZE", "0")
+        os.environ.setdefault("LLM_RPM_LIMIT", "1000000")  # Measure our overhead, not client-side throttling
+        os.environ.setdefault("LLM_TPM_LIMIT", "1000000000")
+
+        from fastapi.testclient import TestClient
+        import main as api_main
+
+        with TestClient(api_main.app) as client:
+            scenarios = build_scenarios(client, fixtures, f"{server.url}/media")
+            names = args.scenarios or list(scenarios)
+            unknown = [name for name in names if name not in scenarios]
+            if unknown:
+                print(f"❌ Unknown or unavailable scenarios: {unknown} (available: {list(scenarios)})")
+                sys.exit(2)
+
+            results = {}
+            print(f"\n{'scenario':<15} {'ok':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rps':>7} {'RSS MB':>8}")
+            for name in names:
+                result = run_scenario(scenarios[name], args.requests, args.concurrency, args.warmup)
+                results[name] = result
+                errors = f"  errors: {result['errors']}" if result["errors"] else ""
+                print(
+                    f"{name:<15} {result['ok']:>3}/{result['requests']:<3} {result['p50_ms']:>9} {result['p95_ms']:>9} "
+                    f"{result['p99_ms']:>9} {result['throughput_rps']:>7} {result['rss_mb']:>8}{errors}"
+                )
+
+    run_info = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "chat": args.chat,
+        "vision": args.vision,
+        "transcription": args.transcription,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": run_info, "results": results}, f, indent=2)
+
+    baselines_path = Path(args.baselines)
+    if args.save_baseline:
+        stored = {}
+        if baselines_path.exists():
+            stored = json.loads(baselines_path.read_text(encoding="utf-8")).get("scenarios", {})
+        stored.update(results)
+        baselines_path.write_text(json.dumps({"config": run_info, "scenarios": stored}, indent=2) + "\n", encoding="utf-8")
+        print(f"\n💾 Baselines saved to {baselines_path}")
+        return
+
+    if not baselines_path.exists():
+        print(f"\nℹ️  No baselines at {baselines_path} (run with --save-baseline)")
+        return
+
+    baseline_data = json.loads(baselines_path.read_text(encoding="utf-8"))
+    if baseline_data.get("config") != run_info:
+        print(f"⚠️  Baselines were recorded with {baseline_data.get('config')}; comparing anyway")
+    regressions = compare(results, baseline_data.get("scenarios", {}), args.tolerance)
+    if regressions:
+        print("\n❌ Regressions vs baseline:")
+        for regression in regressions:
+            print(f"   - {regression}")
+        sys.exit(1)
+    print(f"\n✅ No regression vs baseline (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark nearest-neighbour index types: recall@k and latency vs the flat baseline.
+
+Builds Flat, IVF-Flat, HNSW and IVF-PQ indexes (api/ann_index.py) over
+synthetic clustered vectors (or an existing .npy matrix), then reports build
+time, index size, single-query latency (p50/p95) and recall@k against exact
+search, for each latency/recall target.
+
+Usage:
+    python scripts/bench_ann_index.py --sizes 10000 100000 1000000
+    python scripts/bench_ann_index.py --vectors data/dima_embeddings/<model>/vectors-<build>.npy --sizes 100000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import faiss
+
+# Add api directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "api"))
+
+import ann_index
+from ann_index import INDEX_KINDS, build_index, configure_index, index_kind
+
+
+def clustered_vectors(n: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    """Normalized vectors drawn around random centroids (closer to real embeddings than pure noise)."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((clusters, dim)).astype("float32")
+    vectors = centroids[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim)).astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def load_or_sample(path: str, n: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Sample n rows from a matrix, resampled with noise if it is smaller than n."""
+    base = np.asarray(np.load(path, mmap_mode="r"), dtype="float32")
+    rng = np.random.default_rng(seed)
+    vectors = base[rng.integers(0, len(base), n)] + 0.05 * rng.standard_normal((n, base.shape[1])).astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def index_size_mb(index) -> float:
+    return faiss.serialize_index(index).nbytes / (1024 * 1024)
+
+
+def measure(index, queries: np.ndarray, k: int, ground_truth: np.ndarray) -> dict:
+    """Single-query latency percentiles and recall@k."""
+    latencies = []
+    found = []
+    for query in queries:
+        started = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found.append(ids[0])
+    recall = np.mean([
+        len(set(result.tolist()) & set(truth.tolist())) / k
+        for result, truth in zip(found, ground_truth)
+    ])
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "recall": float(recall),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ANN index recall@k vs latency benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--kinds", nargs="+", choices=INDEX_KINDS, default=list(INDEX_KINDS))
+    parser.add_argument("--targets", nargs="+", choices=list(ann_index.SEARCH_PARAMS), default=list(ann_index.SEARCH_PARAMS))
+    parser.add_argument("--vectors", help="Sample from an existing .npy matrix instead of synthetic data")
+    parser.add_argument("--threads", type=int, default=1, help="FAISS OpenMP threads (1 = per-worker reality)")
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+
+    print(f"{'size':>9} {'kind':<9} {'target':<9} {'chosen':<7} {'build s':>8} {'size MB':>8} {'p50 ms':>7} {'p95 ms':>7} {'recall@' + str(args.k):>9}")
+    for n in args.sizes:
+        if args.vectors:
+            data = load_or_sample(args.vectors, n + args.queries, args.dim)
+        else:
+            data = clustered_vectors(n + args.queries, args.dim, clusters=max(16, n // 500))
+        vectors, queries = data[:n], data[n:]
+
+        flat = build_index(vectors, "flat")
+        _, ground_truth = flat.search(queries, args.k)
+        auto = ann_index.choose_index_kind(n)
+
+        for kind in args.kinds:
+            started = time.perf_counter()
+            index = build_index(vectors, kind)
+            build_s = time.perf_counter() - started
+            size_mb = index_size_mb(index)
+            built = index_kind(index)  # May fall back to a simpler kind on small corpora
+
+            targets = args.targets if built != "flat" else args.targets[:1]
+            for target in targets:
+                configure_index(index, target)
+                stats = measure(index, queries, args.k, ground_truth)
+                marker = "*" if built == auto else ""
+                print(
+                    f"{n:>9} {built:<9} {target if built != 'flat' else '-':<9} {marker:<7} {build_s:>8.2f} {size_mb:>8.1f} "
+                    f"{stats['p50_ms']:>7.3f} {stats['p95_ms']:>7.3f} {stats['recall']:>9.3f}"
+                )
+        print()
+
+    print("* = kind chosen by ann_index.choose_index_kind for that size (ANN_TARGET=" + ann_index.ANN_TARGET + ")")
+
+
+if __name__ == "__main__":
+    main()
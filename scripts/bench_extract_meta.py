@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Benchmark page metadata extraction: single-pass <head> parser vs regex scans.
+
+Compares api/html_meta.py (what /analyze-lite uses) with the previous
+extract_meta, which ran one DOTALL regex per meta name and a JSON-LD regex
+over the whole document. Reports per-page latency (p50/p95) for both, how
+much of the page the streaming scanner downloads before it stops, and
+whether both agree on title and description.
+
+Pages are saved HTML files (e.g. YouTube, TikTok, news articles). Without
+--pages, synthetic pages shaped like those (large inline scripts in <head>,
+JSON-LD in <body>) are generated.
+
+Usage:
+    python scripts/bench_extract_meta.py --save https://www.youtube.com/watch?v=... https://www.tiktok.com/@.../video/...
+    python scripts/bench_extract_meta.py --pages data/bench_pages/*.html
+    python scripts/bench_extract_meta.py --repeat 50
+"""
+import argparse
+import json
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Add api directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "api"))
+
+from html_meta import extract_head_meta, extract_meta_from_chunks
+
+DEFAULT_PAGES_DIR = Path(__file__).parent.parent / "data" / "bench_pages"
+
+
+# Previous implementation (regexes precompiled), kept here as the reference
+_META_RES = {
+    name: re.compile(
+        rf'<meta[^>]+(?:name|property)=["\']{re.escape(name)}["\'][^>]+content=["\'](.*?)["\']',
+        re.IGNORECASE | re.DOTALL
+    )
+    for name in ("og:title", "twitter:title", "og:description", "twitter:description")
+}
+_TITLE_RE = re.compile(r"<title>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+_JSON_LD_RE = re.compile(r"<script[^>]+type=\"application/ld\+json\"[^>]*>(.*?)</script>", re.IGNORECASE | re.DOTALL)
+
+
+def regex_extract_meta(html: str) -> Dict[str, Optional[str]]:
+    def _meta(name):
+        m = _META_RES[name].search(html)
+        return m.group(1).strip() if m else None
+
+    title = _meta("og:title") or _meta("twitter:title")
+    description = _meta("og:description") or _meta("twitter:description")
+    if not title:
+        m = _TITLE_RE.search(html)
+        if m:
+            title = re.sub(r"\s+", " ", m.group(1)).strip()
+    if not description:
+        for m in _JSON_LD_RE.finditer(html):
+            try:
+                data = json.loads(m.group(1))
+            except Exception:
+                continue
+            for item in (data if isinstance(data, list) else [data]):
+                if isinstance(item, dict):
+                    desc = item.get("description") or item.get("name")
+                    if isinstance(desc, str):
+                        description = desc.strip()
+                        break
+            if description:
+                break
+    return {"title": title, "description": description}
+
+
+def synthetic_pages() -> Dict[str, str]:
+    """Pages shaped like the heavy ones seen in production (sizes in the name)."""
+    script = "<script>var ytInitialData = " + json.dumps({"items": [{"id": i, "text": "x" * 80} for i in range(12000)]}) + ";</script>"
+    body = "<div class=\"c\">" + "<p>Paragraphe de contenu avec du texte.</p>" * 20000 + "</div>"
+    json_ld = '<script type="application/ld+json">{"@type": "VideoObject", "name": "Vidéo", "description": "Description JSON-LD"}</script>'
+    head_meta = (
+        '<meta property="og:title" content="Ils cachent la vérité">'
+        '<meta property="og:description" content="Urgent : 90% des gens ne savent pas">'
+    )
+    return {
+        "youtube_like_1.5mb": f"<html><head><title>Vidéo - YouTube</title>{script}{head_meta}</head><body>{body}{json_ld}</body></html>",
+        "tiktok_like_jsonld_in_body": f"<html><head><title>TikTok</title>{script}</head><body>{json_ld}{body}</body></html>",
+        "article_small": f"<html><head><title>Article</title>{head_meta}</head><body>{body[:20000]}</body></html>",
+        "no_head_meta_2mb": f"<html><head><title>  Titre\n  seul </title></head><body>{body}{body}</body></html>",
+        "quoted_gt_in_meta": (
+            '<html><head><title>Comparaison</title>'
+            '<meta property="og:description" content="x > y is true, a <b> c">'
+            f"</head><body>{body[:20000]}</body></html>"
+        ),
+    }
+
+
+def save_pages(urls: List[str], directory: Path):
+    import requests
+    from lite import USER_AGENT
+    directory.mkdir(parents=True, exist_ok=True)
+    for url in urls:
+        resp = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=30)
+        resp.raise_for_status()
+        name = re.sub(r"[^A-Za-z0-9]+", "_", url.split("://", 1)[-1])[:80] + ".html"
+        (directory / name).write_text(resp.text, encoding="utf-8")
+        print(f"💾 {url} → {directory / name} ({len(resp.text) / 1024:.0f} KiB)")
+
+
+def time_calls(function, html: str, repeat: int) -> List[float]:
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(html)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark page metadata extraction")
+    parser.add_argument("--pages", nargs="+", help="Saved HTML pages (default: synthetic pages)")
+    parser.add_argument("--save", nargs="+", metavar="URL", help="Download pages into --pages-dir and exit")
+    parser.add_argument("--pages-dir", default=str(DEFAULT_PAGES_DIR))
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.save:
+        save_pages(args.save, Path(args.pages_dir))
+        return
+
+    if args.pages:
+        pages = {Path(path).name: Path(path).read_text(encoding="utf-8", errors="replace") for path in args.pages}
+    else:
+        pages = synthetic_pages()
+
+    print(f"\n{'page':<30} {'KiB':>6} {'read KiB':>9} {'regex p50':>10} {'p95':>7} {'scan p50':>9} {'p95':>7} {'speedup':>8}  same")
+    speedups = []
+    for name, html in pages.items():
+        regex_ms = time_calls(regex_extract_meta, html, args.repeat)
+        parser_ms = time_calls(extract_head_meta, html, args.repeat)
+        speedup = statistics.median(regex_ms) / max(statistics.median(parser_ms), 1e-6)
+        speedups.append(speedup)
+        same = regex_extract_meta(html) == extract_head_meta(html)
+        data = html.encode("utf-8")
+        streamed = extract_meta_from_chunks(data[i:i + 64 * 1024] for i in range(0, len(data), 64 * 1024))
+        print(
+            f"{name[:30]:<30} {len(data) / 1024:>6.0f} {streamed['bytes_read'] / 1024:>9.0f} "
+            f"{statistics.median(regex_ms):>10.2f} {percentile(regex_ms, 0.95):>7.2f} "
+            f"{statistics.median(parser_ms):>9.2f} {percentile(parser_ms, 0.95):>7.2f} {speedup:>7.1f}x  {'✅' if same else '≠'}"
+        )
+        if not same:
+            print(f"   regex: {regex_extract_meta(html)}\n   scan:  {extract_head_meta(html)}")
+    print(f"\nMedian speedup: {statistics.median(speedups):.1f}x (latency in ms, {args.repeat} runs per page)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Report per-worker memory for the gunicorn deployment, with and without preload.
+
+Starts `gunicorn -c gunicorn.conf.py main:app` from api/, waits for /health,
+sends a few warm-up requests, then reads /proc/<pid>/smaps_rollup for the
+master and each worker. PSS (proportional set size) is the number to compare:
+pages shared copy-on-write are split between the processes sharing them.
+
+Usage:
+    python scripts/bench_worker_rss.py --workers 4
+    python scripts/bench_worker_rss.py --workers 4 --modes preload
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+API_DIR = Path(__file__).parent.parent / "api"
+
+
+def read_smaps_rollup(pid: int) -> dict:
+    """RSS / PSS / shared / private memory of a process, in MB (Linux only)."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    mb = lambda kb: round(kb / 1024, 1)
+    return {
+        "rss_mb": mb(fields.get("Rss", 0)),
+        "pss_mb": mb(fields.get("Pss", 0)),
+        "shared_mb": mb(fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)),
+        "private_mb": mb(fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)),
+    }
+
+
+def child_pids(pid: int) -> list:
+    """Direct children of a process."""
+    path = Path(f"/proc/{pid}/task/{pid}/children")
+    if not path.exists():
+        return []
+    return [int(p) for p in path.read_text().split()]
+
+
+def wait_for_health(port: int, timeout: float) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=5) as response:
+                if response.status == 200:
+                    return True
+        except Exception:
+            time.sleep(1)
+    return False
+
+
+def run_mode(preload: bool, workers: int, port: int, warmup: int, timeout: float) -> dict:
+    """Start gunicorn in one mode and measure its processes."""
+    env = dict(os.environ, PRELOAD_MODELS=str(preload).lower(), WEB_CONCURRENCY=str(workers), PORT=str(port))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+        cwd=API_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        if not wait_for_health(port, timeout):
+            raise RuntimeError("server did not become healthy")
+
+        # Warm up workers (requests are spread across them by the kernel)
+        for _ in range(warmup):
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=10).read()
+            except Exception:
+                pass
+        time.sleep(2)
+
+        master = read_smaps_rollup(process.pid)
+        worker_stats = [read_smaps_rollup(pid) for pid in child_pids(process.pid)]
+        total_pss = master["pss_mb"] + sum(w["pss_mb"] for w in worker_stats)
+        return {
+            "mode": "preload" if preload else "per-worker",
+            "workers": len(worker_stats),
+            "master": master,
+            "per_worker": worker_stats,
+            "avg_worker_rss_mb": round(sum(w["rss_mb"] for w in worker_stats) / max(len(worker_stats), 1), 1),
+            "avg_worker_pss_mb": round(sum(w["pss_mb"] for w in worker_stats) / max(len(worker_stats), 1), 1),
+            "total_pss_mb": round(total_pss, 1),
+        }
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker RSS/PSS benchmark")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=300, help="Startup timeout (s)")
+    parser.add_argument("--modes", nargs="+", choices=["preload", "per-worker"], default=["per-worker", "preload"])
+    parser.add_argument("--json", action="store_true", help="Print raw JSON")
+    args = parser.parse_args()
+
+    if not Path("/proc/self/smaps_rollup").exists():
+        print("❌ /proc/<pid>/smaps_rollup not available (Linux >= 4.14 required)")
+        sys.exit(1)
+
+    results = []
+    for mode in args.modes:
+        print(f"🔄 Measuring {mode} with {args.workers} workers...")
+        results.append(run_mode(mode == "preload", args.workers, args.port, args.warmup, args.timeout))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"\n{'mode':<12} {'workers':>7} {'master RSS':>11} {'worker RSS':>11} {'worker PSS':>11} {'total PSS':>10}")
+    for r in results:
+        print(
+            f"{r['mode']:<12} {r['workers']:>7} {r['master']['rss_mb']:>9.0f}MB "
+            f"{r['avg_worker_rss_mb']:>9.0f}MB {r['avg_worker_pss_mb']:>9.0f}MB {r['total_pss_mb']:>8.0f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
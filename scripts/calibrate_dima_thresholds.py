@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Calibrate per-technique DIMA similarity thresholds.
+
+Encodes the annotated examples (data/dima_examples/) and a background corpus
+(fact-check texts plus optional --background files), measures each technique's
+similarity distribution on the background and picks the z-score cutoff that
+best separates its own examples from everything else. Writes thresholds.json
+next to the embedding artifact of each model; the API applies it at query time.
+
+Run after scripts/precompute_dima_embeddings.py (and again when the examples
+or the background corpus change).
+
+Usage:
+    python scripts/calibrate_dima_thresholds.py
+    python scripts/calibrate_dima_thresholds.py --background corpus.txt --background more.jsonl
+"""
+import argparse
+import json
+import sys
+import numpy as np
+from pathlib import Path
+from sentence_transformers import SentenceTransformer
+
+# Add api directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "api"))
+
+from calibration import DEFAULT_Z, calibrate, write_thresholds
+from dima_detector import DIMADetector, EMBEDDING_MODEL_NAME, EMBEDDINGS_ARTIFACT_DIR
+from embedding_store import file_sha256, load_artifact, model_artifact_dir
+from example_index import example_sentences
+
+REPO_ROOT = Path(__file__).parent.parent
+
+
+def load_background(paths) -> list:
+    """Background texts: fact-checks plus .txt (one per line) / .jsonl ("text" field) / .json files."""
+    texts = []
+    factchecks_path = REPO_ROOT / "data" / "factchecks.json"
+    if factchecks_path.exists():
+        with open(factchecks_path, "r", encoding="utf-8") as f:
+            for item in json.load(f):
+                texts.append(f"{item.get('title', '')}. {item.get('text', '')}".strip())
+
+    for path in paths or []:
+        path = Path(path)
+        with open(path, "r", encoding="utf-8") as f:
+            if path.suffix == ".jsonl":
+                texts.extend(json.loads(line).get("text", "") for line in f if line.strip())
+            elif path.suffix == ".json":
+                texts.extend(item.get("text", "") if isinstance(item, dict) else str(item) for item in json.load(f))
+            else:
+                texts.extend(line.strip() for line in f)
+    return [text for text in texts if text]
+
+
+def encode(model, texts, batch_size: int) -> np.ndarray:
+    vectors = model.encode(texts, batch_size=batch_size, convert_to_numpy=True).astype('float32')
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return vectors
+
+
+def main():
+    """Write thresholds.json for each model's embedding artifact."""
+    parser = argparse.ArgumentParser(description="Calibrate per-technique DIMA similarity thresholds")
+    parser.add_argument("--model", action="append", help=f"Encoder model (repeatable, default: {EMBEDDING_MODEL_NAME})")
+    parser.add_argument("--background", action="append", help="Extra background corpus (.txt, .jsonl or .json; repeatable)")
+    parser.add_argument("--default-z", type=float, default=DEFAULT_Z, help="Cutoff for techniques without examples")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--csv", default=str(REPO_ROOT / "docs" / "DIMA_Full_Mapping.csv"))
+    args = parser.parse_args()
+
+    print("🔄 Loading DIMA taxonomy and examples...")
+    detector = DIMADetector(csv_path=args.csv, enable_embeddings=False)
+    if not detector.taxonomy:
+        print(f"❌ No techniques loaded from {args.csv}")
+        sys.exit(1)
+    csv_sha256 = file_sha256(args.csv)
+
+    example_codes, example_texts = example_sentences(detector.examples)
+    background_texts = load_background(args.background)
+    print(f"✅ {len(example_texts)} example sentences ({len(set(example_codes))} techniques), {len(background_texts)} background texts")
+    if not example_texts or not background_texts:
+        print("❌ Calibration needs annotated examples and a background corpus")
+        sys.exit(1)
+
+    for model_name in args.model or [EMBEDDING_MODEL_NAME]:
+        model_name = model_name.removeprefix("sentence-transformers/")
+        artifact_dir = model_artifact_dir(EMBEDDINGS_ARTIFACT_DIR, model_name)
+
+        print(f"\n🔄 Loading sentence-transformers model: {model_name}")
+        model = SentenceTransformer(model_name)
+
+        try:
+            vectors, _, manifest = load_artifact(artifact_dir, detector.get_codes(), model_name, csv_sha256)
+        except Exception as e:
+            print(f"❌ No usable artifact in {artifact_dir} ({e}); run scripts/precompute_dima_embeddings.py first")
+            sys.exit(1)
+
+        print("🔄 Encoding examples and background...")
+        example_vectors = encode(model, example_texts, args.batch_size)
+        background_vectors = encode(model, background_texts, args.batch_size)
+
+        calibration = calibrate(
+            np.asarray(vectors, dtype='float32'),
+            manifest['codes'],
+            example_vectors,
+            example_codes,
+            background_vectors,
+            default_z=args.default_z
+        )
+        write_thresholds(artifact_dir, calibration, model_name, manifest, len(background_texts))
+
+        z_threshold = np.array(calibration['z_threshold'])
+        f1 = np.array([value for value in calibration['f1'] if value is not None])
+        print(f"✅ Saved {artifact_dir / 'thresholds.json'}")
+        print(f"   z cutoffs: min {z_threshold.min():.2f}, median {np.median(z_threshold):.2f}, max {z_threshold.max():.2f}")
+        if len(f1):
+            print(f"   Example F1 ({len(f1)} techniques): mean {f1.mean():.3f}, min {f1.min():.3f}")
+
+    print("\n🎉 Calibration complete!")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,103 +1,96 @@
 #!/usr/bin/env python3
 """
 Precompute DIMA Technique Embeddings
-Generates semantic embeddings for all 130 DIMA techniques using sentence-transformers.
+Builds (or incrementally updates) the embedding artifact of each encoder model.
+
+Only techniques whose text changed since the last build are re-encoded (per-row
+text hashes in the manifest). Each model gets its own artifact directory, so
+several models can be built and compared side by side.
+
+Usage:
+    python scripts/precompute_dima_embeddings.py
+    python scripts/precompute_dima_embeddings.py --model paraphrase-multilingual-MiniLM-L12-v2 --model distiluse-base-multilingual-cased-v2
+    python scripts/precompute_dima_embeddings.py --force --dtype float16
 """
-import csv
+import argparse
+import sys
 import numpy as np
 from pathlib import Path
 from sentence_transformers import SentenceTransformer
 
+# Add api directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "api"))
+
+from dima_detector import DIMADetector, EMBEDDING_MODEL_NAME, EMBEDDINGS_ARTIFACT_DIR, EMBEDDINGS_DTYPE
+from embedding_store import build_artifact, file_sha256, load_artifact, model_artifact_dir
+
+
+def sanity_check(model, artifact_dir: Path, codes, model_name: str, csv_sha256: str):
+    """Print the top-5 techniques for a test query (cosine on normalized vectors)."""
+    vectors, _, manifest = load_artifact(artifact_dir, codes, model_name, csv_sha256)
 
-def main():
-    """Generate and save DIMA technique embeddings."""
-    
-    # Paths
-    project_root = Path(__file__).parent.parent
-    csv_path = project_root / "docs" / "DIMA_Full_Mapping.csv"
-    output_path = project_root / "data" / "dima_embeddings.npy"
-    
-    print("🔄 Loading DIMA taxonomy...")
-    
-    # Load DIMA techniques
-    techniques = []
-    codes = []
-    
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            # Combine multiple fields for richer embeddings
-            # Format: "Name. Semantic features. Example keywords."
-            text = (
-                f"{row['technique_name_fr']}. "
-                f"{row['semantic_features']}. "
-                f"Exemples: {row['example_keywords']}"
-            )
-            
-            techniques.append(text)
-            codes.append(row['dima_code'])
-    
-    print(f"✅ Loaded {len(techniques)} techniques")
-    
-    # Load sentence-transformers model (multilingual)
-    print("\n🔄 Loading sentence-transformers model...")
-    print("   Model: paraphrase-multilingual-MiniLM-L12-v2")
-    print("   This will download ~470MB on first run...")
-    
-    model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-    
-    print("✅ Model loaded")
-    
-    # Generate embeddings
-    print(f"\n🔄 Encoding {len(techniques)} techniques...")
-    embeddings = model.encode(
-        techniques,
-        show_progress_bar=True,
-        batch_size=32,
-        convert_to_numpy=True
-    )
-    
-    print(f"✅ Embeddings generated: shape={embeddings.shape}")
-    print(f"   Dimensions: {embeddings.shape[1]}")
-    print(f"   Memory: ~{embeddings.nbytes / 1024:.1f} KB")
-    
-    # Validate embeddings
-    assert embeddings.shape[0] == 130, f"Expected 130 embeddings, got {embeddings.shape[0]}"
-    assert embeddings.shape[1] == 384, f"Expected 384 dimensions, got {embeddings.shape[1]}"
-    
-    # Save to disk
-    output_path.parent.mkdir(exist_ok=True)
-    np.save(output_path, embeddings)
-    
-    print(f"\n✅ Saved embeddings to: {output_path}")
-    print(f"   File size: {output_path.stat().st_size / 1024:.1f} KB")
-    
-    # Test similarity (sanity check)
-    print("\n🔍 Sanity check: Testing similarity search...")
-    
-    # Test query: "manipulation émotionnelle"
     test_query = "Ce contenu utilise la peur et l'urgence pour manipuler émotionnellement"
-    test_embedding = model.encode([test_query])
-    
-    # Compute cosine similarity
-    from sklearn.metrics.pairwise import cosine_similarity
-    similarities = cosine_similarity(test_embedding, embeddings)[0]
-    
-    # Top 5 most similar
-    top_indices = np.argsort(similarities)[::-1][:5]
-    
+    query = model.encode([test_query], convert_to_numpy=True).astype('float32')[0]
+    query /= np.linalg.norm(query) or 1.0
+
+    similarities = np.asarray(vectors, dtype='float32') @ query
+    top_rows = np.argsort(-similarities)[:5]
+
     print(f"\n   Query: '{test_query}'")
     print("   Top 5 similar techniques:")
-    for i, idx in enumerate(top_indices, 1):
-        print(f"   {i}. {codes[idx]} - Similarity: {similarities[idx]:.3f}")
-    
+    for i, row in enumerate(top_rows, 1):
+        print(f"   {i}. {manifest['codes'][row]} - Similarity: {similarities[row]:.3f}")
+
+
+def main():
+    """Build or update DIMA technique embedding artifacts."""
+    parser = argparse.ArgumentParser(description="Precompute DIMA technique embeddings")
+    parser.add_argument("--model", action="append", help=f"Encoder model (repeatable, default: {EMBEDDING_MODEL_NAME})")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default=EMBEDDINGS_DTYPE)
+    parser.add_argument("--force", action="store_true", help="Re-encode every technique")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--csv", default=str(Path(__file__).parent.parent / "docs" / "DIMA_Full_Mapping.csv"))
+    args = parser.parse_args()
+
+    print("🔄 Loading DIMA taxonomy...")
+
+    # Load DIMA techniques (same loader and text format as the API)
+    detector = DIMADetector(csv_path=args.csv, enable_embeddings=False)
+    if not detector.taxonomy:
+        print(f"❌ No techniques loaded from {args.csv}")
+        sys.exit(1)
+    csv_sha256 = file_sha256(args.csv)
+
+    print(f"✅ Loaded {len(detector.taxonomy)} techniques")
+
+    for model_name in args.model or [EMBEDDING_MODEL_NAME]:
+        model_name = model_name.removeprefix("sentence-transformers/")
+        artifact_dir = model_artifact_dir(EMBEDDINGS_ARTIFACT_DIR, model_name)
+
+        print(f"\n🔄 Loading sentence-transformers model: {model_name}")
+        model = SentenceTransformer(model_name)
+
+        manifest = build_artifact(
+            detector.taxonomy,
+            model,
+            model_name,
+            csv_sha256,
+            artifact_dir=artifact_dir,
+            dtype=args.dtype,
+            force=args.force,
+            batch_size=args.batch_size,
+            show_progress_bar=True
+        )
+
+        print(f"✅ Saved embedding artifact to: {artifact_dir}")
+        print(f"   Build {manifest['build_id']}: {len(manifest['codes'])}x{manifest['dim']} {manifest['dtype']}, "
+              f"{manifest['encoded']} encoded, {len(manifest['codes']) - manifest['encoded']} reused")
+
+        print("\n🔍 Sanity check: Testing similarity search...")
+        sanity_check(model, artifact_dir, detector.get_codes(), model_name, csv_sha256)
+
     print("\n🎉 Precomputation complete!")
-    print(f"\n📝 Next steps:")
-    print(f"   1. Commit: git add {output_path}")
-    print(f"   2. Enhance api/dima_detector.py to load these embeddings")
-    print(f"   3. Deploy to Railway with 2GB RAM")
 
 
 if __name__ == "__main__":
     main()
-
@@ -1,37 +1,32 @@
 #!/usr/bin/env python3
-"""Precompute embeddings for fact-checks."""
+"""Build (or incrementally update) the fact-check vector index."""
 import sys
-import json
 from pathlib import Path
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent / "api"))
 
-from factcheck import load_factcheck_index, get_model
+from factcheck import FactCheckIndex, build_lock, get_model, load_corpus, DEFAULT_INDEX_DIR, INDEX_MODEL_NAME
 
 def main():
-    """Precompute embeddings."""
-    print("Loading fact-check index...")
-    load_factcheck_index()
-    
-    data_file = Path(__file__).parent.parent / "data" / "factchecks.json"
-    
-    with open(data_file, "r") as f:
-        factchecks = json.load(f)
-    
+    """Sync the fact-check index with data/factchecks.json."""
+    factchecks = load_corpus()
     print(f"Loaded {len(factchecks)} fact-checks")
     
     # Get model to force load
-    model = get_model()
+    get_model()
     print("Model loaded successfully")
     
-    # Embed all fact-checks
-    texts = [fc.get("text", fc.get("title", "")) for fc in factchecks]
-    embeddings = model.encode(texts, show_progress_bar=True)
+    # Same model name as the server (EMBEDDING_MODEL), or it would ignore the index
+    index = FactCheckIndex(DEFAULT_INDEX_DIR, INDEX_MODEL_NAME)
+    with build_lock(DEFAULT_INDEX_DIR):
+        index.load()
+
+        # Only new/changed entries are encoded; missing ones are removed
+        stats = index.sync(factchecks)
     
-    print(f"Generated {len(embeddings)} embeddings")
-    print("✓ Embeddings ready for use in API")
+    print(f"Added {stats['added']}, removed {stats['removed']}, total {stats['total']}")
+    print(f"✓ Fact-check index ready in {DEFAULT_INDEX_DIR}")
 
 if __name__ == "__main__":
     main()
-